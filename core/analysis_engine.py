@@ -1,5 +1,7 @@
 import ccxt
 import asyncio
+import time
+from bisect import bisect_left, insort
 import numpy as np
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple, Any
@@ -20,6 +22,25 @@ TRADING_PAIRS = [
     "COMP/USDT", "SNX/USDT", "APT/USDT", "OP/USDT"
 ]
 
+# Stop Loss сигнала от цены уровня: 0.4% (обновлено согласно настройкам)
+SIGNAL_STOP_LOSS_PERCENT = 0.004
+STOP_LOSS_MULTIPLIERS = {
+    'LONG': 1 - SIGNAL_STOP_LOSS_PERCENT,   # Ниже цены уровня
+    'SHORT': 1 + SIGNAL_STOP_LOSS_PERCENT,  # Выше цены уровня
+}
+
+# Толерантность касания уровня в analyze_pair (совпадает с check_level_touch по умолчанию)
+LEVEL_TOUCH_TOLERANCE = 0.005
+
+
+def _is_level_touch_live(current_price: float, level_price: float) -> bool:
+    """
+    Упрощенный вариант check_level_touch для горячего цикла по уровням:
+    фиксированная толерантность, без диспетчеризации по типу сигнала и без отладочного вывода.
+    """
+    return level_price != 0 and abs(current_price - level_price) <= abs(level_price) * LEVEL_TOUCH_TOLERANCE
+
+
 class AnalysisEngine:
     def __init__(self):
         self.exchange = ccxt.binance({
@@ -55,6 +76,12 @@ class AnalysisEngine:
             "max_historical_touches": 8,          # Слишком много касаний = уровень слаб
             "exclude_recent_minutes": 60          # Сколько минут последних данных исключаем при создании уровня
         }
+        
+        # Флаг инициализации БД: init_database() вызывается один раз, а не на каждом уровне
+        self._db_initialized = False
+        
+        # Свечи в виде массивов (structure-of-arrays): (pair, timeframe) -> (отпечаток последней свечи, массивы)
+        self._candle_soa_cache = {}
     
     def _calculate_candles_to_exclude(self, candles: List[Dict], minutes: int = 60) -> int:
         """
@@ -131,6 +158,13 @@ class AnalysisEngine:
                 return 5.0
         return 10.0
     
+    def _ensure_database(self) -> bool:
+        """Инициализирует подключение к БД при первом обращении и запоминает результат."""
+        if not self._db_initialized:
+            from core.database import init_database
+            self._db_initialized = init_database()
+        return self._db_initialized
+    
     def _deactivate_level_in_db(self, pair_symbol: str, level_price: float, price_tolerance: float = 0.005) -> None:
         """Удаляет пробитый/использованный уровень из БД (не храним мертвые уровни)."""
         try:
@@ -326,31 +360,27 @@ class AnalysisEngine:
                 
             except Exception as e:
                 session.rollback()
-                logger.error(f"Ошибка очистки уровней: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Ошибка очистки уровней: %s", e)
                 return {'status': 'error', 'message': str(e)}
             finally:
                 session.close()
                 
         except Exception as e:
-            logger.error(f"Критическая ошибка очистки уровней: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Критическая ошибка очистки уровней: %s", e)
             return {'status': 'error', 'message': str(e)}
 
     def _upsert_level_in_db(self, pair_symbol: str, level: Dict, timeframe: str = '15m', price_tolerance: float = 0.005) -> None:
         """Создает/обновляет активный уровень в БД, чтобы фронтенд видел актуальные уровни."""
         try:
             logger.info(f"🔄 _upsert_level_in_db вызван для {pair_symbol} @ {level.get('price')}")
-            from core.database import init_database, SessionLocal
+            from core import database
             from core.models import TradingPair, Level
 
-            if not init_database():
+            if not self._ensure_database():
                 logger.error(f"❌ Не удалось инициализировать БД для {pair_symbol}")
                 return
 
-            session = SessionLocal()
+            session = database.SessionLocal()
             logger.info(f"✅ Сессия БД создана для {pair_symbol}")
             try:
                 pair = session.query(TradingPair).filter_by(symbol=pair_symbol).first()
@@ -457,15 +487,11 @@ class AnalysisEngine:
                 logger.info(f"✅ DB: upsert уровня {pair_symbol} @ {target.price} ({target.level_type}), ID={target.id}, created_at={target.created_at}")
             except Exception as e:
                 session.rollback()
-                logger.error(f"❌ Не удалось upsert уровня {pair_symbol} @ {level.get('price')}: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("❌ Не удалось upsert уровня %s @ %s: %s", pair_symbol, level.get('price'), e)
             finally:
                 session.close()
         except Exception as e:
-            logger.error(f"❌ Критическая ошибка в _upsert_level_in_db для {pair_symbol}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Критическая ошибка в _upsert_level_in_db для %s: %s", pair_symbol, e)
 
     async def fetch_ohlcv(self, pair: str, timeframe: str, limit: int = 100) -> List[Dict]:
         """
@@ -2220,29 +2246,204 @@ class AnalysisEngine:
             fixed_levels.append(level)
         return fixed_levels
 
-    async def analyze_pair(self, pair: str) -> Dict[str, Any]:
-        """Анализирует одну торговую пару"""
+    def _candles_soa(self, pair: str, timeframe: str, candles: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Возвращает свечи в виде отдельных numpy-массивов ('ts', 'o', 'h', 'l', 'c', 'v').
+        Результат кэшируется по (pair, timeframe), пока не изменится последняя свеча
+        (учитываем close, high, low и volume, так как текущая свеча обновляется
+        внутри интервала: может сдвинуться только тень при том же close).
+        """
+        key = (pair, timeframe)
+        last = candles[-1]
+        fingerprint = (
+            last['timestamp'], last['close'], last['high'], last['low'], last.get('volume'), len(candles)
+        )
+        cached = self._candle_soa_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        
+        n = len(candles)
+        soa = {
+            'ts': np.fromiter((c['timestamp'] for c in candles), dtype=np.int64, count=n),
+            'o': np.fromiter((c['open'] for c in candles), dtype=np.float64, count=n),
+            'h': np.fromiter((c['high'] for c in candles), dtype=np.float64, count=n),
+            'l': np.fromiter((c['low'] for c in candles), dtype=np.float64, count=n),
+            'c': np.fromiter((c['close'] for c in candles), dtype=np.float64, count=n),
+            'v': np.fromiter((c.get('volume') or 0.0 for c in candles), dtype=np.float64, count=n),
+        }
+        self._candle_soa_cache[key] = (fingerprint, soa)
+        return soa
+
+    def _elder_screens_age(self, meta: Dict) -> Optional[float]:
+        """
+        Возраст кэшированной проверки экранов Элдера в секундах.
+        Использует epoch-метку elder_screens_checked_at_ts; ISO-строка разбирается
+        только для уровней, сохраненных до появления этой метки.
+        """
+        checked_ts = meta.get('elder_screens_checked_at_ts')
+        if checked_ts is None:
+            checked_at = meta.get('elder_screens_checked_at')
+            if not checked_at:
+                return None
+            try:
+                checked_ts = datetime.fromisoformat(checked_at.replace('Z', '+00:00')).timestamp()
+            except (TypeError, ValueError, AttributeError):
+                return None
+        return time.time() - checked_ts
+
+    def _find_signal_id_for_level(self, pair: str, level_price: float) -> Optional[int]:
+        """
+        Возвращает ID любого сигнала пары на цене уровня (толерантность 0.1%) или None.
+        Диапазонное условие по level_price использует индекс (pair_id, level_price),
+        поэтому запрос сводится к index seek с LIMIT 1 без сортировки.
+        """
+        from core import database
+        from core.models import Signal, TradingPair
+        if not self._ensure_database():
+            return None
+        
+        # Используем строгую толерантность 0.1% для проверки дубликатов
+        price_tolerance = level_price * 0.001
+        session = database.SessionLocal()
         try:
-            print(f"\n=== АНАЛИЗ ПАРЫ {pair} ===")
+            return session.query(Signal.id).join(
+                TradingPair, TradingPair.id == Signal.pair_id
+            ).filter(
+                TradingPair.symbol == pair,
+                Signal.level_price >= level_price - price_tolerance,
+                Signal.level_price <= level_price + price_tolerance
+            ).limit(1).scalar()
+        finally:
+            session.close()
+
+    def _log_elder_screens_events(self, pair: str, signal_id: int, screens_details: Dict) -> None:
+        """Пишет в журнал сигнала результаты проверок экранов Элдера (одним пакетным INSERT)."""
+        events = []
+        
+        # Логируем Экран 1
+        screen_1 = screens_details.get('screen_1', {})
+        if screen_1.get('passed'):
+            events.append({
+                'message': f"Экран 1 пройден: BTC тренд={screens_details['screen_1']['checks'].get('btc_trend')}, тренд пары={screens_details['screen_1']['checks'].get('pair_trend', {}).get('trend')}",
+                'event_type': 'SCREEN_1_RESULT',
+                'status': 'PASSED',
+                'details': screens_details['screen_1'],
+            })
+        
+        # Логируем Экран 2
+        screen_2 = screens_details.get('screen_2', {})
+        if screen_2.get('passed'):
+            # Логируем отдельно каждую проверку Экран 2
+            # Направление подхода
+            if 'price_approach' in screen_2.get('checks', {}):
+                approach_details = screen_2['checks']['price_approach']
+                events.append({
+                    'message': f"Экран 2: Направление подхода корректно - {approach_details.get('direction', 'N/A')}",
+                    'event_type': 'SCREEN_2_PRICE_APPROACH',
+                    'status': 'PASSED',
+                    'details': approach_details,
+                })
+            
+            # RSI
+            if 'rsi' in screen_2.get('checks', {}):
+                rsi_details = screen_2['checks']['rsi']
+                rsi_value = rsi_details.get('value')
+                if rsi_value is not None:
+                    events.append({
+                        'message': f"Экран 2: RSI={rsi_value:.2f} {'⚠️ предупреждение' if rsi_details.get('warning') else '✅ OK'}",
+                        'event_type': 'SCREEN_2_RSI',
+                        'status': 'WARNING' if rsi_details.get('warning') else 'PASSED',
+                        'details': rsi_details,
+                    })
+            
+            # MACD
+            if 'macd' in screen_2.get('checks', {}):
+                macd_details = screen_2['checks']['macd']
+                events.append({
+                    'message': f"Экран 2: MACD={macd_details.get('macd', 0):.4f}, Signal={macd_details.get('signal', 0):.4f}, Histogram={macd_details.get('histogram', 0):.4f}",
+                    'event_type': 'SCREEN_2_MACD',
+                    'status': 'PASSED',
+                    'details': macd_details,
+                })
+            
+            # Итоговый результат Экран 2
+            events.append({
+                'message': "Экран 2 пройден: все проверки пройдены",
+                'event_type': 'SCREEN_2_RESULT',
+                'status': 'PASSED',
+                'details': screens_details['screen_2'],
+            })
+        else:
+            # Логируем блокировку
+            blocked_reason = screen_2.get('blocked_reason', 'Неизвестная причина')
+            events.append({
+                'message': f"Экран 2 заблокирован: {blocked_reason}",
+                'event_type': 'SCREEN_2_OSCILLATOR_BLOCKED',
+                'status': 'BLOCKED',
+                'details': screens_details.get('screen_2', {}),
+            })
+        
+        try:
+            from core.trading.live_trade_logger import log_signal_events
+            from core import database
+            if not self._ensure_database():
+                return
+            session = database.SessionLocal()
+            try:
+                log_signal_events(session, signal_id, events, commit=True)
+            finally:
+                session.close()
+        except Exception as e:
+            logger.error(f"[{pair}] Ошибка логирования экранов Элдера для сигнала {signal_id}: {e}")
+
+    async def analyze_pair(self, pair: str, candles_15m: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """
+        Анализирует одну торговую пару.
+        candles_15m можно передать заранее загруженными (analyze_all_pairs),
+        чтобы не запрашивать 15m свечи повторно.
+        """
+        try:
+            # Подробный построчный лог уровней строим только при включенном DEBUG
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            logger.debug("=== АНАЛИЗ ПАРЫ %s ===", pair)
+            
+            # Единая метка времени на весь проход анализа пары:
+            # уровни и сигналы, созданные за один проход, получают одинаковое время
+            now_ts = time.time()
+            now_utc_iso = datetime.fromtimestamp(now_ts, tz=timezone.utc).isoformat()
+            now_local_iso = datetime.fromtimestamp(now_ts).isoformat()
             
             # Получаем данные - увеличиваем лимит до 200 свечей
             candles_1h = await self.fetch_ohlcv(pair, '1h', 200)
-            candles_15m = await self.fetch_ohlcv(pair, '15m', 200)
+            if not candles_15m:
+                candles_15m = await self.fetch_ohlcv(pair, '15m', 200)
             if not candles_1h or not candles_15m:
-                print(f"[{pair}] Нет данных для анализа")
+                logger.warning("[%s] Нет данных для анализа", pair)
                 return {'pair': pair, 'status': 'error', 'message': 'Нет данных'}
             
-            print(f"[{pair}] Получено свечей: 1H={len(candles_1h)}, 15M={len(candles_15m)}")
+            logger.debug("[%s] Получено свечей: 1H=%s, 15M=%s", pair, len(candles_1h), len(candles_15m))
             
             trend_1h = self.determine_trend_1h(candles_1h)
-            current_price = candles_15m[-1]['close']
+            # Разбираем тренд один раз на пару: направление (UP/DOWN/SIDEWAYS) и сила (STRONG/WEAK/SIDEWAYS)
+            if '_' in trend_1h:
+                trend_direction, trend_strength = trend_1h.split('_', 1)
+            else:
+                trend_direction = trend_strength = 'UNKNOWN'
+            is_trend_up = trend_direction == 'UP'
+            is_trend_down = trend_direction == 'DOWN'
+            is_trend_sideways = not (is_trend_up or is_trend_down)
+            soa_15m = self._candles_soa(pair, '15m', candles_15m)
+            current_price = float(soa_15m['c'][-1])
+            # Последние 10 свечей для определения пробоя уровня
+            recent_lows = soa_15m['l'][-10:]
+            recent_highs = soa_15m['h'][-10:]
             
             # Вычисляем изменение цены и объем за 24 часа
             price_change_24h = self.calculate_price_change_24h(candles_15m)
             volume_24h = self.calculate_volume_24h(candles_15m)
             
-            print(f"[{pair}] Тренд 1H: {trend_1h}, Текущая цена: {current_price}")
-            print(f"[{pair}] Изменение 24ч: {price_change_24h}%, Объем 24ч: {volume_24h}M")
+            logger.debug("[%s] Тренд 1H: %s, Текущая цена: %s", pair, trend_1h, current_price)
+            logger.debug("[%s] Изменение 24ч: %s%%, Объем 24ч: %sM", pair, price_change_24h, volume_24h)
             
             # ИСКЛЮЧЕНИЕ: при боковом тренде удаляем все существующие уровни
             # Проверяем все варианты бокового тренда: SIDEWAYS_*, UP_SIDEWAYS, DOWN_SIDEWAYS
@@ -2257,7 +2458,7 @@ class AnalysisEngine:
                 is_sideways_trend = True
             
             if is_sideways_trend:
-                print(f"[{pair}] ⚠️ Боковой или неопределенный тренд ({trend_1h}) — расширяем поиск уровней для отскока")
+                logger.debug("[%s] ⚠️ Боковой или неопределенный тренд (%s) — расширяем поиск уровней для отскока", pair, trend_1h)
             
             candles_4h = await self.fetch_ohlcv(pair, '4h', 200)
             
@@ -2268,10 +2469,10 @@ class AnalysisEngine:
             if candles_4h:
                 potential_levels += self.find_potential_levels(pair, candles_4h, trend=trend_1h, timeframe_label='4h', max_levels=2)
             
-            print(f"[{pair}] Найдено потенциальных уровней: {len(potential_levels)} (15m+1h+4h)")
+            logger.debug("[%s] Найдено потенциальных уровней: %s (15m+1h+4h)", pair, len(potential_levels))
             
             # Загружаем активные уровни
-            active_levels = signal_manager.load_active_levels()
+            active_levels = await asyncio.to_thread(signal_manager.load_active_levels)
             pair_levels = active_levels.get(pair, [])
             if not isinstance(pair_levels, list):
                 pair_levels = []
@@ -2279,46 +2480,41 @@ class AnalysisEngine:
             # Исправляем существующие уровни (добавляем недостающие поля)
             pair_levels = self.fix_existing_levels(pair_levels)
             
-            print(f"[{pair}] 📊 Начальное количество уровней: {len(pair_levels)}")
-            for i, level in enumerate(pair_levels):
-                price_diff = abs(current_price - level['price']) / level['price'] * 100
-                hist = level.get('historical_touches', level.get('test_count', 1))
-                live_tests = level.get('live_test_count', max(level.get('test_count', 1) - hist, 0))
-                print(f"[{pair}] Уровень {i+1}: {level['type']} @ {level['price']}, расстояние: {price_diff:.2f}%, historical={hist}, live_tests={live_tests}")
+            logger.debug("[%s] 📊 Начальное количество уровней: %s", pair, len(pair_levels))
+            if debug_enabled:
+                for i, level in enumerate(pair_levels):
+                    price_diff = abs(current_price - level['price']) / level['price'] * 100
+                    hist = level.get('historical_touches', level.get('test_count', 1))
+                    live_tests = level.get('live_test_count', max(level.get('test_count', 1) - hist, 0))
+                    logger.debug("[%s] Уровень %s: %s @ %s, расстояние: %.2f%%, historical=%s, live_tests=%s", pair, i + 1, level['type'], level['price'], price_diff, hist, live_tests)
             
             signals = []
             
             # КЛЮЧЕВОЕ ИЗМЕНЕНИЕ: проверяем пробитые уровни каждые 5 минут (не по возрасту!)
-            print(f"[{pair}] 🔍 Проверка уровней на пробитие (каждые 5 минут)...")
+            logger.debug("[%s] 🔍 Проверка уровней на пробитие (каждые 5 минут)...", pair)
             pair_levels = self.clean_broken_levels(pair, pair_levels, candles_15m, current_price)
             
-            print(f"[{pair}] ✅ Активных уровней после проверки на пробитие: {len(pair_levels)}")
+            logger.debug("[%s] ✅ Активных уровней после проверки на пробитие: %s", pair, len(pair_levels))
             
             # ОПТИМИЗАЦИЯ: Проверяем Elder's Screens для всех уровней (с кэшированием)
             # Это позволяет избежать дублирования проверок и сохранить результаты в метаданные
-            print(f"[{pair}] 🔍 Проверка Elder's Screens для всех уровней...")
+            logger.debug("[%s] 🔍 Проверка Elder's Screens для всех уровней...", pair)
+            levels_to_sync = []  # Уровни с обновленными метаданными - пишем в БД одним вызовом в потоке
             for level in pair_levels:
                 try:
                     # Проверяем, нужно ли обновить Elder's Screens (если старше 5 минут или нет данных)
                     meta = level.get('metadata', {}) or {}
                     elder_screens_data = meta.get('elder_screens')
-                    elder_screens_checked_at = meta.get('elder_screens_checked_at')
                     
                     needs_check = True
-                    if elder_screens_data and elder_screens_checked_at:
-                        try:
-                            from datetime import datetime, timezone
-                            checked_time = datetime.fromisoformat(elder_screens_checked_at.replace('Z', '+00:00'))
-                            time_diff = (datetime.now(checked_time.tzinfo) - checked_time).total_seconds()
-                            if time_diff < 300:  # 5 минут
-                                needs_check = False
-                                # Устанавливаем elder_screens_passed из кэшированных данных
-                                if 'metadata' not in level:
-                                    level['metadata'] = {}
-                                level['metadata']['elder_screens_passed'] = meta.get('elder_screens_passed', False)
-                                print(f"[{pair}] Используем кэшированные Elder's Screens для уровня {level['price']} (passed={level['metadata']['elder_screens_passed']})")
-                        except:
-                            pass
+                    time_diff = self._elder_screens_age(meta) if elder_screens_data else None
+                    if time_diff is not None and time_diff < 300:  # 5 минут
+                        needs_check = False
+                        # Устанавливаем elder_screens_passed из кэшированных данных
+                        if 'metadata' not in level:
+                            level['metadata'] = {}
+                        level['metadata']['elder_screens_passed'] = meta.get('elder_screens_passed', False)
+                        logger.debug("[%s] Используем кэшированные Elder's Screens для уровня %s (passed=%s)", pair, level['price'], level['metadata']['elder_screens_passed'])
                     
                     if needs_check:
                         # Определяем потенциальный тип сигнала
@@ -2339,52 +2535,61 @@ class AnalysisEngine:
                         if 'metadata' not in level:
                             level['metadata'] = {}
                         level['metadata']['elder_screens'] = screens_details
-                        level['metadata']['elder_screens_checked_at'] = datetime.now(timezone.utc).isoformat()
+                        level['metadata']['elder_screens_checked_at'] = now_utc_iso
+                        level['metadata']['elder_screens_checked_at_ts'] = now_ts
                         level['metadata']['elder_screens_passed'] = screens_passed
                         
-                        # Обновляем в БД
-                        self._upsert_level_in_db(pair, level, timeframe=level.get('timeframe', '15m'))
+                        # Обновляем в БД (после цикла)
+                        levels_to_sync.append(level)
                         
-                        print(f"[{pair}] Elder's Screens проверены для уровня {level['price']}: {'✅ ПРОЙДЕН' if screens_passed else '❌ ЗАБЛОКИРОВАН'}")
+                        logger.debug("[%s] Elder's Screens проверены для уровня %s: %s", pair, level['price'], '✅ ПРОЙДЕН' if screens_passed else '❌ ЗАБЛОКИРОВАН')
                 except Exception as e:
                     logger.error(f"[{pair}] Ошибка проверки Elder's Screens для уровня {level.get('price', 'N/A')}: {e}")
             
+            if levels_to_sync:
+                # Последовательно в одном рабочем потоке: не блокируем event loop
+                # и не создаем гонок между upsert'ами близких уровней
+                await asyncio.to_thread(
+                    lambda: [
+                        self._upsert_level_in_db(pair, lvl, timeframe=lvl.get('timeframe', '15m'))
+                        for lvl in levels_to_sync
+                    ]
+                )
+            
             # Проверяем все активные уровни на касание и генерацию сигналов
             for level in pair_levels[:]:  # Итерируемся по копии, чтобы можно было удалять
                 # Определяем потенциальный тип сигнала для проверки касания
                 potential_signal_type = 'LONG' if level['type'] == 'support' else 'SHORT'
                 
-                print(f"[{pair}] Проверяем уровень {level['type']} @ {level['price']} (текущая цена: {current_price}, потенциальный сигнал: {potential_signal_type})")
+                logger.debug("[%s] Проверяем уровень %s @ %s (текущая цена: %s, потенциальный сигнал: %s)", pair, level['type'], level['price'], current_price, potential_signal_type)
                 
                 # Проверяем касание ИЛИ пробой уровня
-                is_touching = self.check_level_touch(current_price, level['price'], signal_type=potential_signal_type)
+                is_touching = _is_level_touch_live(current_price, level['price'])
                 is_breakthrough = False
                 
                 # Для поддержки: пробой = цена была ниже уровня, а теперь выше (LONG сигнал)
                 # Для сопротивления: пробой = цена была выше уровня, а теперь ниже (SHORT сигнал)
                 # Проверяем последние 10 свечей для определения пробоя
-                if level['type'] == 'support' and trend_1h.startswith('UP'):
+                if level['type'] == 'support' and is_trend_up:
                     # Для поддержки в восходящем тренде: проверяем, была ли цена ниже уровня
                     price_above_level = current_price > level['price']
                     if price_above_level:
                         # Проверяем последние свечи - была ли цена ниже уровня
-                        recent_candles = candles_15m[-10:] if len(candles_15m) >= 10 else candles_15m
-                        was_below_level = any(candle['low'] < level['price'] for candle in recent_candles)
+                        was_below_level = bool((recent_lows < level['price']).any())
                         price_diff_percent = ((current_price - level['price']) / level['price']) * 100
                         if was_below_level and price_diff_percent > 0.1:  # Пробой на 0.1% выше уровня
                             is_breakthrough = True
-                            print(f"[{pair}] ПРОБОЙ ПОДДЕРЖКИ! Цена {current_price} пробила уровень {level['price']} снизу вверх (+{price_diff_percent:.2f}%)")
-                elif level['type'] == 'resistance' and trend_1h.startswith('DOWN'):
+                            logger.debug("[%s] ПРОБОЙ ПОДДЕРЖКИ! Цена %s пробила уровень %s снизу вверх (+%.2f%%)", pair, current_price, level['price'], price_diff_percent)
+                elif level['type'] == 'resistance' and is_trend_down:
                     # Для сопротивления в нисходящем тренде: проверяем, была ли цена выше уровня
                     price_below_level = current_price < level['price']
                     if price_below_level:
                         # Проверяем последние свечи - была ли цена выше уровня
-                        recent_candles = candles_15m[-10:] if len(candles_15m) >= 10 else candles_15m
-                        was_above_level = any(candle['high'] > level['price'] for candle in recent_candles)
+                        was_above_level = bool((recent_highs > level['price']).any())
                         price_diff_percent = ((level['price'] - current_price) / level['price']) * 100
                         if was_above_level and price_diff_percent > 0.1:  # Пробой на 0.1% ниже уровня
                             is_breakthrough = True
-                            print(f"[{pair}] ПРОБОЙ СОПРОТИВЛЕНИЯ! Цена {current_price} пробила уровень {level['price']} сверху вниз (-{price_diff_percent:.2f}%)")
+                            logger.debug("[%s] ПРОБОЙ СОПРОТИВЛЕНИЯ! Цена %s пробила уровень %s сверху вниз (-%.2f%%)", pair, current_price, level['price'], price_diff_percent)
                 
                 # ОПТИМИЗАЦИЯ: Проверяем готовые уровни (прошли Elder's Screens) при приближении, не только при касании
                 meta = level.get('metadata', {}) or {}
@@ -2405,10 +2610,10 @@ class AnalysisEngine:
                         level['live_test_count'] = live_tests
                         level['test_count'] = historical_touches + live_tests
                         level['last_test'] = candles_15m[-1]['timestamp']
-                        print(f"[{pair}] КАСАНИЕ! {level['type']} @ {level['price']} → historical={historical_touches}, live={live_tests}")
-                        self._upsert_level_in_db(pair, level, timeframe='15m')
+                        logger.debug("[%s] КАСАНИЕ! %s @ %s → historical=%s, live=%s", pair, level['type'], level['price'], historical_touches, live_tests)
+                        await asyncio.to_thread(self._upsert_level_in_db, pair, level, timeframe='15m')
                     elif ready_for_signal and not is_touching:
-                        print(f"[{pair}] 🎯 ГОТОВЫЙ УРОВЕНЬ приближается! {level['type']} @ {level['price']} (расстояние: {price_distance_pct:.2f}%)")
+                        logger.debug("[%s] 🎯 ГОТОВЫЙ УРОВЕНЬ приближается! %s @ %s (расстояние: %.2f%%)", pair, level['type'], level['price'], price_distance_pct)
                     
                     should_generate_signal = False
                     signal_reason = ""
@@ -2418,36 +2623,16 @@ class AnalysisEngine:
                     if not signal_already_generated:
                         # Проверяем в БД, был ли уже сигнал для этого уровня
                         try:
-                            from core.database import init_database, SessionLocal
-                            from core.models import Signal, TradingPair
-                            if init_database():
-                                session = SessionLocal()
-                                try:
-                                    pair_obj = session.query(TradingPair).filter_by(symbol=pair).first()
-                                    if pair_obj:
-                                        # Используем строгую толерантность 0.1% для проверки дубликатов
-                                        level_price = level['price']
-                                        price_tolerance = level_price * 0.001  # 0.1%
-                                        
-                                        existing_signal = session.query(Signal).filter(
-                                            Signal.pair_id == pair_obj.id,
-                                            abs(Signal.level_price - level_price) < price_tolerance
-                                        ).order_by(Signal.timestamp.desc()).first()
-                                        if existing_signal:
-                                            signal_already_generated = True
-                                            print(f"[{pair}] ⚠️ Сигнал для уровня {level_price} уже существует (ID: {existing_signal.id}, создан: {existing_signal.timestamp}). Пропускаем.")
-                                finally:
-                                    session.close()
+                            existing_signal_id = await asyncio.to_thread(self._find_signal_id_for_level, pair, level['price'])
+                            if existing_signal_id is not None:
+                                signal_already_generated = True
+                                logger.debug("[%s] ⚠️ Сигнал для уровня %s уже существует (ID: %s). Пропускаем.", pair, level['price'], existing_signal_id)
                         except Exception as e:
-                            print(f"[{pair}] Ошибка проверки существующего сигнала: {e}")
+                            logger.warning("[%s] Ошибка проверки существующего сигнала: %s", pair, e)
                     
-                    trend_dir = trend_1h.split('_')[0] if trend_1h else 'UNKNOWN'
-                    is_up = trend_dir == 'UP'
-                    is_down = trend_dir == 'DOWN'
-                    is_sideways = trend_dir not in ('UP', 'DOWN')
-                    condition1 = level['type'] == 'support' and (is_up or is_sideways)
-                    condition2 = level['type'] == 'resistance' and (is_down or is_sideways)
-                    if is_sideways and level.get('historical_touches', 1) < 3:
+                    condition1 = level['type'] == 'support' and (is_trend_up or is_trend_sideways)
+                    condition2 = level['type'] == 'resistance' and (is_trend_down or is_trend_sideways)
+                    if is_trend_sideways and level.get('historical_touches', 1) < 3:
                         if level['type'] == 'support':
                             condition1 = False
                         if level['type'] == 'resistance':
@@ -2475,12 +2660,12 @@ class AnalysisEngine:
                             signal_reason = f"ES: Касание уровня с пройденными Elder's Screens (касание #{live_tests}, расстояние: {price_distance_pct:.2f}%)"
                         # Все остальные случаи (пробой, первое/второе касание без ES) - НЕ генерируем сигналы
                         elif is_touching and too_many_live:
-                            print(f"[{pair}] МЕРТВЫЙ УРОВЕНЬ! Живых касаний={live_tests} (>{self.level_settings['max_live_tests']}), удаляем {level['type']} @ {level['price']}")
+                            logger.info("[%s] МЕРТВЫЙ УРОВЕНЬ! Живых касаний=%s (>%s), удаляем %s @ %s", pair, live_tests, self.level_settings['max_live_tests'], level['type'], level['price'])
                             pair_levels.remove(level)
-                            self._delete_level_from_db(pair, level['price'])
+                            await asyncio.to_thread(self._delete_level_from_db, pair, level['price'])
                             continue
                         else:
-                            print(f"[{pair}] Касание без сигнала: живых касаний={live_tests}, signal_generated={signal_already_generated}, elder_screens_passed={elder_screens_passed}, price_close={is_price_close}")
+                            logger.debug("[%s] Касание без сигнала: живых касаний=%s, signal_generated=%s, elder_screens_passed=%s, price_close=%s", pair, live_tests, signal_already_generated, elder_screens_passed, is_price_close)
                     
                     if should_generate_signal:
                         # ========== ПРИМЕНЕНИЕ ФИЛЬТРОВ ==========
@@ -2497,16 +2682,16 @@ class AnalysisEngine:
                         )
                         
                         if should_block:
-                            print(f"[{pair}] 🚫 БЛОКИРОВКА сигнала: {block_reason}")
+                            logger.debug("[%s] 🚫 БЛОКИРОВКА сигнала: %s", pair, block_reason)
                             continue
                         
                         # Этап 2-3: Проверка приоритета (опционально, для логирования)
                         level_score = level.get('score', 0) or 0
                         priority = self.calculate_signal_priority(trend_1h, level_score, timeframe_label)
                         if priority < -3:
-                            print(f"[{pair}] ⚠️ Низкий приоритет сигнала ({priority}), но не блокируем")
+                            logger.debug("[%s] ⚠️ Низкий приоритет сигнала (%s), но не блокируем", pair, priority)
                         
-                        print(f"[{pair}] {signal_reason}! Генерируем сигнал... (приоритет: {priority})")
+                        logger.debug("[%s] %s! Генерируем сигнал... (приоритет: %s)", pair, signal_reason, priority)
                         
                         # Определяем тип сигнала
                         signal_type = 'LONG' if level['type'] == 'support' else 'SHORT'
@@ -2515,22 +2700,15 @@ class AnalysisEngine:
                         # ОПТИМИЗАЦИЯ: Используем уже проверенные Elder's Screens из метаданных, если они свежие
                         meta = level.get('metadata', {}) or {}
                         elder_screens_data = meta.get('elder_screens')
-                        elder_screens_checked_at = meta.get('elder_screens_checked_at')
                         
                         # Используем кэшированные данные, если они свежие (менее 1 минуты)
                         use_cached = False
-                        if elder_screens_data and elder_screens_checked_at:
-                            try:
-                                from datetime import datetime, timezone
-                                checked_time = datetime.fromisoformat(elder_screens_checked_at.replace('Z', '+00:00'))
-                                time_diff = (datetime.now(checked_time.tzinfo) - checked_time).total_seconds()
-                                if time_diff < 60:  # 1 минута - достаточно свежие данные для генерации сигнала
-                                    use_cached = True
-                                    screens_passed = meta.get('elder_screens_passed', False)
-                                    screens_details = elder_screens_data
-                                    print(f"[{pair}] Используем свежие Elder's Screens из метаданных для генерации сигнала (проверено {time_diff:.0f} сек назад)")
-                            except:
-                                pass
+                        time_diff = self._elder_screens_age(meta) if elder_screens_data else None
+                        if time_diff is not None and time_diff < 60:  # 1 минута - достаточно свежие данные для генерации сигнала
+                            use_cached = True
+                            screens_passed = meta.get('elder_screens_passed', False)
+                            screens_details = elder_screens_data
+                            logger.debug("[%s] Используем свежие Elder's Screens из метаданных для генерации сигнала (проверено %.0f сек назад)", pair, time_diff)
                         
                         if not use_cached:
                             # Проверяем Elder's Screens заново (данные устарели или отсутствуют)
@@ -2548,7 +2726,8 @@ class AnalysisEngine:
                             if 'metadata' not in level:
                                 level['metadata'] = {}
                             level['metadata']['elder_screens'] = screens_details
-                            level['metadata']['elder_screens_checked_at'] = datetime.now(timezone.utc).isoformat()
+                            level['metadata']['elder_screens_checked_at'] = now_utc_iso
+                            level['metadata']['elder_screens_checked_at_ts'] = now_ts
                             level['metadata']['elder_screens_passed'] = screens_passed
                         
                         if not screens_passed:
@@ -2559,18 +2738,14 @@ class AnalysisEngine:
                             elif blocked_screen == 'BLOCKED_SCREEN_2':
                                 blocked_reason = screens_details['screen_2'].get('blocked_reason', 'Экран 2 не пройден')
                             
-                            print(f"[{pair}] ❌ Сигнал {signal_type} @ {level['price']} ЗАБЛОКИРОВАН экранами Элдера: {blocked_reason}")
+                            logger.debug("[%s] ❌ Сигнал %s @ %s ЗАБЛОКИРОВАН экранами Элдера: %s", pair, signal_type, level['price'], blocked_reason)
                             logger.info(f"[{pair}] Сигнал заблокирован: {blocked_reason}, детали: {screens_details}")
                             continue  # Пропускаем генерацию сигнала
                         
-                        print(f"[{pair}] ✅ Сигнал {signal_type} @ {level['price']} прошел все экраны Элдера")
+                        logger.debug("[%s] ✅ Сигнал %s @ %s прошел все экраны Элдера", pair, signal_type, level['price'])
                         
-                        # Рассчитываем Stop Loss на основе цены уровня
-                        stop_loss_percent = 0.004  # 0.4% (обновлено согласно настройкам)
-                        if signal_type == 'LONG':
-                            stop_loss = level['price'] * (1 - stop_loss_percent)  # Ниже цены уровня
-                        else:  # SHORT
-                            stop_loss = level['price'] * (1 + stop_loss_percent)  # Выше цены уровня
+                        # Рассчитываем Stop Loss на основе цены уровня (LONG - ниже уровня, SHORT - выше)
+                        stop_loss = level['price'] * STOP_LOSS_MULTIPLIERS[signal_type]
                         
                         # Создаем простую запись сигнала
                         signal_data = {
@@ -2581,8 +2756,8 @@ class AnalysisEngine:
                             'current_price': current_price,
                             'stop_loss': round(stop_loss, 4),  # Stop Loss с округлением
                             '1h_trend': trend_1h,
-                            'trend_direction': trend_1h.split('_')[0] if '_' in trend_1h else 'UNKNOWN',  # UP/DOWN/SIDEWAYS
-                            'trend_strength': trend_1h.split('_')[1] if '_' in trend_1h else 'UNKNOWN',  # STRONG/WEAK/SIDEWAYS
+                            'trend_direction': trend_direction,  # UP/DOWN/SIDEWAYS
+                            'trend_strength': trend_strength,  # STRONG/WEAK/SIDEWAYS
                             'level_type': level['type'],
                             'test_count': level['test_count'],
                             'timeframe': level.get('timeframe', '15m'),
@@ -2594,135 +2769,37 @@ class AnalysisEngine:
                             'trend_bonus': level.get('trend_bonus'),
                             'trend_context': level.get('trend_context'),
                             'status': 'ACTIVE',
-                            'timestamp': datetime.now().isoformat(),
+                            'timestamp': now_local_iso,
                             'notes': f"Сигнал {signal_type} на уровне {level['type']} @ {level['price']} (тест #{level['test_count']}, тренд: {trend_1h})",
                             'elder_screens_metadata': screens_details  # Сохраняем детали проверок экранов
                         }
                         
-                        print(f"[{pair}] ГЕНЕРИРУЕМ СИГНАЛ {signal_type} на уровне {level['price']}")
-                        signal_saved = signal_manager.save_signal(signal_data)
+                        logger.info("[%s] ГЕНЕРИРУЕМ СИГНАЛ %s на уровне %s", pair, signal_type, level['price'])
+                        signal_id = await asyncio.to_thread(signal_manager.save_signal, signal_data)
                         signals.append(signal_data)
                         
                         # Логируем результаты проверок экранов (после сохранения сигнала)
-                        if signal_saved:
-                            try:
-                                from core.trading.live_trade_logger import log_signal_event
-                                from core.database import init_database, SessionLocal
-                                from core.models import Signal, TradingPair
-                                if init_database():
-                                    session = SessionLocal()
-                                    try:
-                                        # Находим только что сохраненный сигнал
-                                        pair_obj = session.query(TradingPair).filter_by(symbol=pair).first()
-                                        if pair_obj:
-                                            level_price = level['price']
-                                            price_tolerance = level_price * 0.001  # 0.1%
-                                            saved_signal = session.query(Signal).filter(
-                                                Signal.pair_id == pair_obj.id,
-                                                Signal.signal_type == signal_type,
-                                                abs(Signal.level_price - level_price) < price_tolerance
-                                            ).order_by(Signal.timestamp.desc()).first()
-                                            
-                                            if saved_signal:
-                                                # Логируем Экран 1
-                                                screen_1 = screens_details.get('screen_1', {})
-                                                if screen_1.get('passed'):
-                                                    log_signal_event(
-                                                        session, saved_signal.id,
-                                                        f"Экран 1 пройден: BTC тренд={screens_details['screen_1']['checks'].get('btc_trend')}, тренд пары={screens_details['screen_1']['checks'].get('pair_trend', {}).get('trend')}",
-                                                        event_type='SCREEN_1_RESULT',
-                                                        status='PASSED',
-                                                        details=screens_details['screen_1'],
-                                                        commit=False
-                                                    )
-                                                
-                                                # Логируем Экран 2
-                                                screen_2 = screens_details.get('screen_2', {})
-                                                if screen_2.get('passed'):
-                                                    # Логируем отдельно каждую проверку Экран 2
-                                                    # Направление подхода
-                                                    if 'price_approach' in screen_2.get('checks', {}):
-                                                        approach_details = screen_2['checks']['price_approach']
-                                                        log_signal_event(
-                                                            session, saved_signal.id,
-                                                            f"Экран 2: Направление подхода корректно - {approach_details.get('direction', 'N/A')}",
-                                                            event_type='SCREEN_2_PRICE_APPROACH',
-                                                            status='PASSED',
-                                                            details=approach_details,
-                                                            commit=False
-                                                        )
-                                                    
-                                                    # RSI
-                                                    if 'rsi' in screen_2.get('checks', {}):
-                                                        rsi_details = screen_2['checks']['rsi']
-                                                        rsi_value = rsi_details.get('value')
-                                                        if rsi_value is not None:
-                                                            log_signal_event(
-                                                                session, saved_signal.id,
-                                                                f"Экран 2: RSI={rsi_value:.2f} {'⚠️ предупреждение' if rsi_details.get('warning') else '✅ OK'}",
-                                                                event_type='SCREEN_2_RSI',
-                                                                status='WARNING' if rsi_details.get('warning') else 'PASSED',
-                                                                details=rsi_details,
-                                                                commit=False
-                                                            )
-                                                    
-                                                    # MACD
-                                                    if 'macd' in screen_2.get('checks', {}):
-                                                        macd_details = screen_2['checks']['macd']
-                                                        log_signal_event(
-                                                            session, saved_signal.id,
-                                                            f"Экран 2: MACD={macd_details.get('macd', 0):.4f}, Signal={macd_details.get('signal', 0):.4f}, Histogram={macd_details.get('histogram', 0):.4f}",
-                                                            event_type='SCREEN_2_MACD',
-                                                            status='PASSED',
-                                                            details=macd_details,
-                                                            commit=False
-                                                        )
-                                                    
-                                                    # Итоговый результат Экран 2
-                                                    log_signal_event(
-                                                        session, saved_signal.id,
-                                                        f"Экран 2 пройден: все проверки пройдены",
-                                                        event_type='SCREEN_2_RESULT',
-                                                        status='PASSED',
-                                                        details=screens_details['screen_2'],
-                                                        commit=False
-                                                    )
-                                                else:
-                                                    # Логируем блокировку
-                                                    blocked_reason = screen_2.get('blocked_reason', 'Неизвестная причина')
-                                                    log_signal_event(
-                                                        session, saved_signal.id,
-                                                        f"Экран 2 заблокирован: {blocked_reason}",
-                                                        event_type='SCREEN_2_OSCILLATOR_BLOCKED',
-                                                        status='BLOCKED',
-                                                        details=screens_details['screen_2'],
-                                                        commit=False
-                                                    )
-                                                
-                                                session.commit()
-                                    finally:
-                                        session.close()
-                            except Exception as e:
-                                logger.error(f"[{pair}] Ошибка логирования экранов Элдера: {e}")
+                        if signal_id:
+                            await asyncio.to_thread(self._log_elder_screens_events, pair, signal_id, screens_details)
                         
                         # НЕ УДАЛЯЕМ уровень после генерации сигнала - уровень может использоваться для отскока
                         # Помечаем только как использованный
                         level['signal_generated'] = True
-                        level['signal_timestamp'] = datetime.now().isoformat()
+                        level['signal_timestamp'] = now_local_iso
                         # Обновляем в БД
-                        self._upsert_level_in_db(pair, level, timeframe='15m')
-                        print(f"[{pair}] Сигнал сохранен, уровень помечен как использованный (оставляем для возможного отскока)")
+                        await asyncio.to_thread(self._upsert_level_in_db, pair, level, timeframe='15m')
+                        logger.debug("[%s] Сигнал сохранен, уровень помечен как использованный (оставляем для возможного отскока)", pair)
                     else:
-                        print(f"[{pair}] Условия для сигнала не выполнены")
+                        logger.debug("[%s] Условия для сигнала не выполнены", pair)
                             
                 # Пробитые уровни уже удалены в clean_broken_levels, здесь только проверяем касания
             
             # КЛЮЧЕВОЕ ИЗМЕНЕНИЕ: добавляем ВСЕ релевантные уровни из potential_levels (не только один!)
             # Для скальпинга нужно несколько уровней на пару
-            print(f"[{pair}] 🔍 Проверка {len(potential_levels)} потенциальных уровней для добавления...")
+            logger.debug("[%s] 🔍 Проверка %s потенциальных уровней для добавления...", pair, len(potential_levels))
             
             # Загружаем историю сигналов для проверки
-            all_signals = signal_manager.load_recent_signals(limit=1000)
+            all_signals = await asyncio.to_thread(signal_manager.load_recent_signals, limit=1000)
             tested_prices = set()
             for signal in all_signals:
                 if signal.get('pair') == pair:
@@ -2731,284 +2808,162 @@ class AnalysisEngine:
                         tested_prices.add(round(level_price, 3))
             
             added_count = 0
+            # Отсортированные цены активных уровней: поиск ближайшего соседа через bisect
+            # вместо линейного прохода по pair_levels для каждого кандидата
+            prices_sorted = sorted(l['price'] for l in pair_levels)
             for level in potential_levels:
                 # Проверяем, не был ли уровень уже использован для сигнала
                 price_rounded = round(level['price'], 3)
                 if price_rounded in tested_prices:
-                    print(f"[{pair}] Уровень {level['price']} уже использовался для сигнала, пропускаем")
+                    logger.debug("[%s] Уровень %s уже использовался для сигнала, пропускаем", pair, level['price'])
                     continue
                 
                 # Проверяем, не существует ли уже такой уровень (толерантность 0.5%)
-                existing_level = None
-                for l in pair_levels:
-                    price_diff_percent = abs(l['price'] - level['price']) / level['price'] * 100
+                # Достаточно проверить двух соседей по цене слева и справа от точки вставки
+                existing_price = None
+                idx = bisect_left(prices_sorted, level['price'])
+                for neighbour in prices_sorted[max(0, idx - 1):idx + 1]:
+                    price_diff_percent = abs(neighbour - level['price']) / level['price'] * 100
                     if price_diff_percent < 0.5:  # 0.5% толерантность для дубликатов
-                        existing_level = l
-                        print(f"[{pair}] Уровень {level['price']} уже существует (близкий уровень {l['price']}), пропускаем")
+                        existing_price = neighbour
+                        logger.debug("[%s] Уровень %s уже существует (близкий уровень %s), пропускаем", pair, level['price'], neighbour)
                         break
                 
-                if not existing_level:
-                    print(f"[{pair}] ✅ Добавляем новый уровень: {level['type']} @ {level['price']} (score: {level.get('score', 0):.1f}, расстояние: {level.get('distance_percent', 0):.2f}%)")
+                if existing_price is None:
+                    logger.info("[%s] ✅ Добавляем новый уровень: %s @ %s (score: %.1f, расстояние: %.2f%%)", pair, level['type'], level['price'], level.get('score', 0), level.get('distance_percent', 0))
                     pair_levels.append(level)
-                    # Синхронизируем в БД
-                    self._upsert_level_in_db(pair, level, timeframe='15m')
+                    insort(prices_sorted, level['price'])
                     added_count += 1
                     
-                    # ВАЖНО: проверяем касание/пробой СРАЗУ после создания уровня
-                    # Это позволяет генерировать сигналы, если уровень уже касается или пробит
-                    potential_signal_type = 'LONG' if level['type'] == 'support' else 'SHORT'
-                    is_touching_new = self.check_level_touch(current_price, level['price'], signal_type=potential_signal_type)
-                    is_breakthrough_new = False
+                    try:
+                        # ВАЖНО: проверяем касание/пробой СРАЗУ после создания уровня
+                        # Это позволяет генерировать сигналы, если уровень уже касается или пробит
+                        is_touching_new = _is_level_touch_live(current_price, level['price'])
+                        is_breakthrough_new = False
                     
-                    # Проверяем пробой для нового уровня
-                    if level['type'] == 'support' and trend_1h.startswith('UP'):
-                        price_above_level = current_price > level['price']
-                        if price_above_level:
-                            recent_candles = candles_15m[-10:] if len(candles_15m) >= 10 else candles_15m
-                            was_below_level = any(candle['low'] < level['price'] for candle in recent_candles)
-                            price_diff_percent = ((current_price - level['price']) / level['price']) * 100
-                            if was_below_level and price_diff_percent > 0.1:
-                                is_breakthrough_new = True
-                                print(f"[{pair}] НОВЫЙ УРОВЕНЬ ПРОБИТ! Цена {current_price} пробила уровень {level['price']} снизу вверх (+{price_diff_percent:.2f}%)")
-                    elif level['type'] == 'resistance' and trend_1h.startswith('DOWN'):
-                        price_below_level = current_price < level['price']
-                        if price_below_level:
-                            recent_candles = candles_15m[-10:] if len(candles_15m) >= 10 else candles_15m
-                            was_above_level = any(candle['high'] > level['price'] for candle in recent_candles)
-                            price_diff_percent = ((level['price'] - current_price) / level['price']) * 100
-                            if was_above_level and price_diff_percent > 0.1:
-                                is_breakthrough_new = True
-                                print(f"[{pair}] НОВЫЙ УРОВЕНЬ ПРОБИТ! Цена {current_price} пробила уровень {level['price']} сверху вниз (-{price_diff_percent:.2f}%)")
+                        # Проверяем пробой для нового уровня
+                        if level['type'] == 'support' and is_trend_up:
+                            price_above_level = current_price > level['price']
+                            if price_above_level:
+                                was_below_level = bool((recent_lows < level['price']).any())
+                                price_diff_percent = ((current_price - level['price']) / level['price']) * 100
+                                if was_below_level and price_diff_percent > 0.1:
+                                    is_breakthrough_new = True
+                                    logger.debug("[%s] НОВЫЙ УРОВЕНЬ ПРОБИТ! Цена %s пробила уровень %s снизу вверх (+%.2f%%)", pair, current_price, level['price'], price_diff_percent)
+                        elif level['type'] == 'resistance' and is_trend_down:
+                            price_below_level = current_price < level['price']
+                            if price_below_level:
+                                was_above_level = bool((recent_highs > level['price']).any())
+                                price_diff_percent = ((level['price'] - current_price) / level['price']) * 100
+                                if was_above_level and price_diff_percent > 0.1:
+                                    is_breakthrough_new = True
+                                    logger.debug("[%s] НОВЫЙ УРОВЕНЬ ПРОБИТ! Цена %s пробила уровень %s сверху вниз (-%.2f%%)", pair, current_price, level['price'], price_diff_percent)
                     
-                    # Если новый уровень касается или пробит - генерируем сигнал
-                    if (is_touching_new or is_breakthrough_new) and level.get('test_count', 1) == 1:
-                        condition1 = level['type'] == 'support' and trend_1h.startswith('UP')
-                        condition2 = level['type'] == 'resistance' and trend_1h.startswith('DOWN')
+                        # Если новый уровень касается или пробит - генерируем сигнал
+                        if (is_touching_new or is_breakthrough_new) and level.get('test_count', 1) == 1:
+                            condition1 = level['type'] == 'support' and is_trend_up
+                            condition2 = level['type'] == 'resistance' and is_trend_down
                         
-                        if condition1 or condition2:
-                            # Проверяем, был ли уже сигнал для этого уровня
-                            signal_already_generated = False
-                            try:
-                                from core.database import init_database, SessionLocal
-                                from core.models import Signal, TradingPair
-                                if init_database():
-                                    session = SessionLocal()
-                                    try:
-                                        pair_obj = session.query(TradingPair).filter_by(symbol=pair).first()
-                                        if pair_obj:
-                                            # Используем строгую толерантность 0.1% для проверки дубликатов
-                                            level_price = level['price']
-                                            price_tolerance = level_price * 0.001  # 0.1%
-                                            
-                                            existing_signal = session.query(Signal).filter(
-                                                Signal.pair_id == pair_obj.id,
-                                                abs(Signal.level_price - level_price) < price_tolerance
-                                            ).order_by(Signal.timestamp.desc()).first()
-                                            if existing_signal:
-                                                signal_already_generated = True
-                                                print(f"[{pair}] ⚠️ Сигнал для уровня {level_price} уже существует (ID: {existing_signal.id}, создан: {existing_signal.timestamp}). Пропускаем.")
-                                    finally:
-                                        session.close()
-                            except Exception as e:
-                                print(f"[{pair}] Ошибка проверки существующего сигнала для нового уровня: {e}")
-                                import traceback
-                                traceback.print_exc()
+                            if condition1 or condition2:
+                                # Проверяем, был ли уже сигнал для этого уровня
+                                signal_already_generated = False
+                                try:
+                                    existing_signal_id = await asyncio.to_thread(self._find_signal_id_for_level, pair, level['price'])
+                                    if existing_signal_id is not None:
+                                        signal_already_generated = True
+                                        logger.debug("[%s] ⚠️ Сигнал для уровня %s уже существует (ID: %s). Пропускаем.", pair, level['price'], existing_signal_id)
+                                except Exception as e:
+                                    logger.exception("[%s] Ошибка проверки существующего сигнала для нового уровня: %s", pair, e)
                             
-                            if not signal_already_generated:
-                                # Генерируем сигнал для нового уровня
-                                signal_type = 'LONG' if level['type'] == 'support' else 'SHORT'
+                                if not signal_already_generated:
+                                    # Генерируем сигнал для нового уровня
+                                    signal_type = 'LONG' if level['type'] == 'support' else 'SHORT'
                                 
-                                # ========== ПРОВЕРКА ЭКРАНОВ ЭЛДЕРА ==========
-                                # ОПТИМИЗАЦИЯ: Используем уже проверенные Elder's Screens из метаданных, если они свежие
-                                meta = level.get('metadata', {}) or {}
-                                elder_screens_data = meta.get('elder_screens')
-                                elder_screens_checked_at = meta.get('elder_screens_checked_at')
+                                    # ========== ПРОВЕРКА ЭКРАНОВ ЭЛДЕРА ==========
+                                    # ОПТИМИЗАЦИЯ: Используем уже проверенные Elder's Screens из метаданных, если они свежие
+                                    meta = level.get('metadata', {}) or {}
+                                    elder_screens_data = meta.get('elder_screens')
                                 
-                                # Используем кэшированные данные, если они свежие (менее 1 минуты)
-                                use_cached = False
-                                if elder_screens_data and elder_screens_checked_at:
-                                    try:
-                                        from datetime import datetime, timezone
-                                        checked_time = datetime.fromisoformat(elder_screens_checked_at.replace('Z', '+00:00'))
-                                        time_diff = (datetime.now(checked_time.tzinfo) - checked_time).total_seconds()
-                                        if time_diff < 60:  # 1 минута - достаточно свежие данные для генерации сигнала
-                                            use_cached = True
-                                            screens_passed = meta.get('elder_screens_passed', False)
-                                            screens_details = elder_screens_data
-                                            print(f"[{pair}] Используем свежие Elder's Screens из метаданных для нового уровня (проверено {time_diff:.0f} сек назад)")
-                                    except:
-                                        pass
+                                    # Используем кэшированные данные, если они свежие (менее 1 минуты)
+                                    use_cached = False
+                                    time_diff = self._elder_screens_age(meta) if elder_screens_data else None
+                                    if time_diff is not None and time_diff < 60:  # 1 минута - достаточно свежие данные для генерации сигнала
+                                        use_cached = True
+                                        screens_passed = meta.get('elder_screens_passed', False)
+                                        screens_details = elder_screens_data
+                                        logger.debug("[%s] Используем свежие Elder's Screens из метаданных для нового уровня (проверено %.0f сек назад)", pair, time_diff)
                                 
-                                if not use_cached:
-                                    # Проверяем Elder's Screens заново (данные устарели или отсутствуют)
-                                    screens_passed, screens_details = await self.check_elder_screens(
-                                        pair=pair,
-                                        signal_type=signal_type,
-                                        level=level,
-                                        current_price=current_price,
-                                        candles_4h=candles_4h if candles_4h else [],
-                                        candles_1h=candles_1h,
-                                        level_score=level.get('score')
-                                    )
+                                    if not use_cached:
+                                        # Проверяем Elder's Screens заново (данные устарели или отсутствуют)
+                                        screens_passed, screens_details = await self.check_elder_screens(
+                                            pair=pair,
+                                            signal_type=signal_type,
+                                            level=level,
+                                            current_price=current_price,
+                                            candles_4h=candles_4h if candles_4h else [],
+                                            candles_1h=candles_1h,
+                                            level_score=level.get('score')
+                                        )
                                     
-                                    # Обновляем метаданные уровня
-                                    if 'metadata' not in level:
-                                        level['metadata'] = {}
-                                    level['metadata']['elder_screens'] = screens_details
-                                    level['metadata']['elder_screens_checked_at'] = datetime.now(timezone.utc).isoformat()
-                                    level['metadata']['elder_screens_passed'] = screens_passed
+                                        # Обновляем метаданные уровня
+                                        if 'metadata' not in level:
+                                            level['metadata'] = {}
+                                        level['metadata']['elder_screens'] = screens_details
+                                        level['metadata']['elder_screens_checked_at'] = now_utc_iso
+                                        level['metadata']['elder_screens_checked_at_ts'] = now_ts
+                                        level['metadata']['elder_screens_passed'] = screens_passed
                                 
-                                if not screens_passed:
-                                    blocked_screen = screens_details.get('final_decision', 'UNKNOWN')
-                                    blocked_reason = None
-                                    if blocked_screen == 'BLOCKED_SCREEN_1':
-                                        blocked_reason = screens_details['screen_1'].get('blocked_reason', 'Экран 1 не пройден')
-                                    elif blocked_screen == 'BLOCKED_SCREEN_2':
-                                        blocked_reason = screens_details['screen_2'].get('blocked_reason', 'Экран 2 не пройден')
+                                    if not screens_passed:
+                                        blocked_screen = screens_details.get('final_decision', 'UNKNOWN')
+                                        blocked_reason = None
+                                        if blocked_screen == 'BLOCKED_SCREEN_1':
+                                            blocked_reason = screens_details['screen_1'].get('blocked_reason', 'Экран 1 не пройден')
+                                        elif blocked_screen == 'BLOCKED_SCREEN_2':
+                                            blocked_reason = screens_details['screen_2'].get('blocked_reason', 'Экран 2 не пройден')
                                     
-                                    print(f"[{pair}] ❌ Сигнал {signal_type} @ {level['price']} для нового уровня ЗАБЛОКИРОВАН экранами Элдера: {blocked_reason}")
-                                    logger.info(f"[{pair}] Сигнал для нового уровня заблокирован: {blocked_reason}, детали: {screens_details}")
-                                    continue  # Пропускаем генерацию сигнала
+                                        logger.debug("[%s] ❌ Сигнал %s @ %s для нового уровня ЗАБЛОКИРОВАН экранами Элдера: %s", pair, signal_type, level['price'], blocked_reason)
+                                        logger.info(f"[{pair}] Сигнал для нового уровня заблокирован: {blocked_reason}, детали: {screens_details}")
+                                        continue  # Пропускаем генерацию сигнала
                                 
-                                print(f"[{pair}] ✅ Сигнал {signal_type} @ {level['price']} для нового уровня прошел все экраны Элдера")
+                                    logger.debug("[%s] ✅ Сигнал %s @ %s для нового уровня прошел все экраны Элдера", pair, signal_type, level['price'])
                                 
-                                stop_loss_percent = 0.004  # 0.4% (обновлено согласно настройкам)
-                                if signal_type == 'LONG':
-                                    stop_loss = level['price'] * (1 - stop_loss_percent)
-                                else:
-                                    stop_loss = level['price'] * (1 + stop_loss_percent)
+                                    stop_loss = level['price'] * STOP_LOSS_MULTIPLIERS[signal_type]
                                 
-                                signal_data = {
-                                    'pair': pair,
-                                    'signal_type': signal_type,
-                                    'level_price': level['price'],
-                                    'entry_price': level['price'],
-                                    'current_price': current_price,
-                                    'stop_loss': round(stop_loss, 4),
-                                    '1h_trend': trend_1h,
-                                    'trend_direction': trend_1h.split('_')[0] if '_' in trend_1h else 'UNKNOWN',
-                                    'trend_strength': trend_1h.split('_')[1] if '_' in trend_1h else 'UNKNOWN',
-                                    'level_type': level['type'],
-                                    'test_count': 1,
-                                    'status': 'ACTIVE',
-                                    'timestamp': datetime.now().isoformat(),
-                                    'notes': f"Сигнал {signal_type} на новом уровне {level['type']} @ {level['price']} (пробой: {is_breakthrough_new}, касание: {is_touching_new}, тренд: {trend_1h})",
-                                    'elder_screens_metadata': screens_details  # Сохраняем детали проверок экранов
-                                }
+                                    signal_data = {
+                                        'pair': pair,
+                                        'signal_type': signal_type,
+                                        'level_price': level['price'],
+                                        'entry_price': level['price'],
+                                        'current_price': current_price,
+                                        'stop_loss': round(stop_loss, 4),
+                                        '1h_trend': trend_1h,
+                                        'trend_direction': trend_direction,
+                                        'trend_strength': trend_strength,
+                                        'level_type': level['type'],
+                                        'test_count': 1,
+                                        'status': 'ACTIVE',
+                                        'timestamp': now_local_iso,
+                                        'notes': f"Сигнал {signal_type} на новом уровне {level['type']} @ {level['price']} (пробой: {is_breakthrough_new}, касание: {is_touching_new}, тренд: {trend_1h})",
+                                        'elder_screens_metadata': screens_details  # Сохраняем детали проверок экранов
+                                    }
                                 
-                                print(f"[{pair}] ГЕНЕРИРУЕМ СИГНАЛ для нового уровня {signal_type} @ {level['price']}")
-                                signal_saved = signal_manager.save_signal(signal_data)
-                                signals.append(signal_data)
+                                    logger.info("[%s] ГЕНЕРИРУЕМ СИГНАЛ для нового уровня %s @ %s", pair, signal_type, level['price'])
+                                    signal_id = await asyncio.to_thread(signal_manager.save_signal, signal_data)
+                                    signals.append(signal_data)
                                 
-                                # Логируем результаты проверок экранов (после сохранения сигнала)
-                                if signal_saved:
-                                    try:
-                                        from core.trading.live_trade_logger import log_signal_event
-                                        from core.database import init_database, SessionLocal
-                                        from core.models import Signal, TradingPair
-                                        if init_database():
-                                            session = SessionLocal()
-                                            try:
-                                                # Находим только что сохраненный сигнал
-                                                pair_obj = session.query(TradingPair).filter_by(symbol=pair).first()
-                                                if pair_obj:
-                                                    level_price = level['price']
-                                                    price_tolerance = level_price * 0.001  # 0.1%
-                                                    saved_signal = session.query(Signal).filter(
-                                                        Signal.pair_id == pair_obj.id,
-                                                        Signal.signal_type == signal_type,
-                                                        abs(Signal.level_price - level_price) < price_tolerance
-                                                    ).order_by(Signal.timestamp.desc()).first()
-                                                    
-                                                    if saved_signal:
-                                                        # Логируем Экран 1
-                                                        screen_1 = screens_details.get('screen_1', {})
-                                                        if screen_1.get('passed'):
-                                                            log_signal_event(
-                                                                session, saved_signal.id,
-                                                                f"Экран 1 пройден: BTC тренд={screens_details['screen_1']['checks'].get('btc_trend')}, тренд пары={screens_details['screen_1']['checks'].get('pair_trend', {}).get('trend')}",
-                                                                event_type='SCREEN_1_RESULT',
-                                                                status='PASSED',
-                                                                details=screens_details['screen_1'],
-                                                                commit=False
-                                                            )
-                                                        
-                                                        # Логируем Экран 2
-                                                        screen_2 = screens_details.get('screen_2', {})
-                                                        if screen_2.get('passed'):
-                                                            # Логируем отдельно каждую проверку Экран 2
-                                                            # Направление подхода
-                                                            if 'price_approach' in screen_2.get('checks', {}):
-                                                                approach_details = screen_2['checks']['price_approach']
-                                                                log_signal_event(
-                                                                    session, saved_signal.id,
-                                                                    f"Экран 2: Направление подхода корректно - {approach_details.get('direction', 'N/A')}",
-                                                                    event_type='SCREEN_2_PRICE_APPROACH',
-                                                                    status='PASSED',
-                                                                    details=approach_details,
-                                                                    commit=False
-                                                                )
-                                                            
-                                                            # RSI
-                                                            if 'rsi' in screen_2.get('checks', {}):
-                                                                rsi_details = screen_2['checks']['rsi']
-                                                                rsi_value = rsi_details.get('value')
-                                                                if rsi_value is not None:
-                                                                    log_signal_event(
-                                                                        session, saved_signal.id,
-                                                                        f"Экран 2: RSI={rsi_value:.2f} {'⚠️ предупреждение' if rsi_details.get('warning') else '✅ OK'}",
-                                                                        event_type='SCREEN_2_RSI',
-                                                                        status='WARNING' if rsi_details.get('warning') else 'PASSED',
-                                                                        details=rsi_details,
-                                                                        commit=False
-                                                                    )
-                                                            
-                                                            # MACD
-                                                            if 'macd' in screen_2.get('checks', {}):
-                                                                macd_details = screen_2['checks']['macd']
-                                                                log_signal_event(
-                                                                    session, saved_signal.id,
-                                                                    f"Экран 2: MACD={macd_details.get('macd', 0):.4f}, Signal={macd_details.get('signal', 0):.4f}, Histogram={macd_details.get('histogram', 0):.4f}",
-                                                                    event_type='SCREEN_2_MACD',
-                                                                    status='PASSED',
-                                                                    details=macd_details,
-                                                                    commit=False
-                                                                )
-                                                            
-                                                            # Итоговый результат Экран 2
-                                                            log_signal_event(
-                                                                session, saved_signal.id,
-                                                                f"Экран 2 пройден: все проверки пройдены",
-                                                                event_type='SCREEN_2_RESULT',
-                                                                status='PASSED',
-                                                                details=screens_details['screen_2'],
-                                                                commit=False
-                                                            )
-                                                        else:
-                                                            # Логируем блокировку
-                                                            blocked_reason = screen_2.get('blocked_reason', 'Неизвестная причина')
-                                                            log_signal_event(
-                                                                session, saved_signal.id,
-                                                                f"Экран 2 заблокирован: {blocked_reason}",
-                                                                event_type='SCREEN_2_OSCILLATOR_BLOCKED',
-                                                                status='BLOCKED',
-                                                                details=screens_details['screen_2'],
-                                                                commit=False
-                                                            )
-                                                        
-                                                        session.commit()
-                                            finally:
-                                                session.close()
-                                    except Exception as e:
-                                        logger.error(f"[{pair}] Ошибка логирования экранов Элдера для нового уровня: {e}")
+                                    # Логируем результаты проверок экранов (после сохранения сигнала)
+                                    if signal_id:
+                                        await asyncio.to_thread(self._log_elder_screens_events, pair, signal_id, screens_details)
                                 
-                                # НЕ УДАЛЯЕМ уровень после генерации сигнала - уровень может использоваться для отскока
-                                # Помечаем только как использованный
-                                level['signal_generated'] = True
-                                level['signal_timestamp'] = datetime.now().isoformat()
-                                # Обновляем в БД
-                                self._upsert_level_in_db(pair, level, timeframe='15m')
-                                print(f"[{pair}] Сигнал для нового уровня сохранен, уровень помечен как использованный (оставляем для возможного отскока)")
+                                    # НЕ УДАЛЯЕМ уровень после генерации сигнала - уровень может использоваться для отскока
+                                    # Помечаем только как использованный
+                                    level['signal_generated'] = True
+                                    level['signal_timestamp'] = now_local_iso
+                                    logger.debug("[%s] Сигнал для нового уровня сохранен, уровень помечен как использованный (оставляем для возможного отскока)", pair)
+                    finally:
+                        # Синхронизируем новый уровень с БД один раз - после того, как выставлены
+                        # все метаданные (Elder's Screens, signal_generated), в том числе при continue
+                        await asyncio.to_thread(self._upsert_level_in_db, pair, level, timeframe='15m')
             
             # НЕ удаляем уровни с signal_generated=True - они могут использоваться для отскока
             # Уровни остаются активными до пробития
@@ -3017,24 +2972,24 @@ class AnalysisEngine:
             # ВАЖНО: создаем уровень близко к текущей цене, чтобы он был актуальным
             if not pair_levels:
                 try:
-                    print(f"[{pair}] ⚠️ Нет активных уровней, создаем fallback уровень...")
+                    logger.debug("[%s] ⚠️ Нет активных уровней, создаем fallback уровень...", pair)
                     # Ищем локальные экстремумы на последних 40 свечах (более свежие данные)
                     lookback = min(len(candles_15m), 40)
                     window = candles_15m[-lookback:]
                     
-                    if trend_1h.startswith('DOWN'):
+                    if is_trend_down:
                         # Для нисходящего тренда нужен ближайший максимум СВЕРХУ от текущей цены
-                        current_price = candles_15m[-1]['close']
+                        highs = soa_15m['h'][-lookback:]
                         # Берем максимумы выше текущей цены
-                        maxima_above = [(i, c['high']) for i, c in enumerate(window) if c['high'] > current_price]
-                        if maxima_above:
+                        above_idx = np.flatnonzero(highs > current_price)
+                        if above_idx.size:
                             # Берем ближайший максимум сверху
-                            idx, high = min(maxima_above, key=lambda x: abs(x[1] - current_price))
-                            src = window[idx]
+                            idx = int(above_idx[np.argmin(highs[above_idx] - current_price)])
                         else:
                             # Если нет выше, берем максимальный high из окна
-                            idx, high = max(enumerate([c['high'] for c in window]), key=lambda x: x[1])
-                            src = window[idx]
+                            idx = int(np.argmax(highs))
+                        high = highs[idx]
+                        src = window[idx]
                         
                         fallback = {
                             'pair': pair,
@@ -3044,25 +2999,25 @@ class AnalysisEngine:
                             'volume': src.get('volume', 0),
                             'candle_length': src.get('high', 0) - src.get('low', 0),
                             'test_count': 1,
-                            'created_at': datetime.now(timezone.utc).isoformat(),
+                            'created_at': now_utc_iso,
                             'source': 'fallback_resistance',
                             'signal_generated': False,
                             'trend_context': trend_1h
                         }
-                        print(f"[{pair}] ✅ Fallback уровень создан: resistance @ {fallback['price']} (текущая цена: {current_price})")
+                        logger.debug("[%s] ✅ Fallback уровень создан: resistance @ %s (текущая цена: %s)", pair, fallback['price'], current_price)
                     else:
                         # Для восходящего тренда нужен ближайший минимум СНИЗУ от текущей цены
-                        current_price = candles_15m[-1]['close']
+                        lows = soa_15m['l'][-lookback:]
                         # Берем минимумы ниже текущей цены
-                        minima_below = [(i, c['low']) for i, c in enumerate(window) if c['low'] < current_price]
-                        if minima_below:
+                        below_idx = np.flatnonzero(lows < current_price)
+                        if below_idx.size:
                             # Берем ближайший минимум снизу
-                            idx, low = min(minima_below, key=lambda x: abs(x[1] - current_price))
-                            src = window[idx]
+                            idx = int(below_idx[np.argmin(current_price - lows[below_idx])])
                         else:
                             # Если нет ниже, берем минимальный low из окна
-                            idx, low = min(enumerate([c['low'] for c in window]), key=lambda x: x[1])
-                            src = window[idx]
+                            idx = int(np.argmin(lows))
+                        low = lows[idx]
+                        src = window[idx]
                         
                         fallback = {
                             'pair': pair,
@@ -3072,27 +3027,25 @@ class AnalysisEngine:
                             'volume': src.get('volume', 0),
                             'candle_length': src.get('high', 0) - src.get('low', 0),
                             'test_count': 1,
-                            'created_at': datetime.now(timezone.utc).isoformat(),
+                            'created_at': now_utc_iso,
                             'source': 'fallback_support',
                             'signal_generated': False,
                             'trend_context': trend_1h
                         }
-                        print(f"[{pair}] ✅ Fallback уровень создан: support @ {fallback['price']} (текущая цена: {current_price})")
+                        logger.debug("[%s] ✅ Fallback уровень создан: support @ %s (текущая цена: %s)", pair, fallback['price'], current_price)
                     
                     pair_levels.append(fallback)
-                    self._upsert_level_in_db(pair, fallback, timeframe='15m')
-                    print(f"[{pair}] ✅ Fallback уровень добавлен и сохранен в БД: {fallback['type']} @ {fallback['price']}")
+                    await asyncio.to_thread(self._upsert_level_in_db, pair, fallback, timeframe='15m')
+                    logger.info("[%s] ✅ Fallback уровень добавлен и сохранен в БД: %s @ %s", pair, fallback['type'], fallback['price'])
                 except Exception as e:
-                    print(f"[{pair}] ❌ Ошибка добавления fallback уровня: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[%s] ❌ Ошибка добавления fallback уровня: %s", pair, e)
             
             # Сохраняем исправленные уровни обратно в файл
             active_levels[pair] = pair_levels
-            signal_manager.save_active_levels(active_levels)
+            await asyncio.to_thread(signal_manager.save_active_levels, active_levels)
             
-            print(f"[{pair}] ИТОГО: активных уровней: {len(pair_levels)}, сигналов: {len(signals)}")
-            print(f"=== КОНЕЦ АНАЛИЗА {pair} ===\n")
+            logger.debug("[%s] ИТОГО: активных уровней: %s, сигналов: %s", pair, len(pair_levels), len(signals))
+            logger.debug("=== КОНЕЦ АНАЛИЗА %s ===", pair)
             
             return {
                 'pair': pair,
@@ -3108,7 +3061,6 @@ class AnalysisEngine:
             
         except Exception as e:
             logger.error(f"Ошибка анализа {pair}: {e}")
-            print(f"[{pair}] ОШИБКА: {e}")
             return {'pair': pair, 'status': 'error', 'message': str(e)}
     
     async def analyze_all_pairs(self) -> Dict[str, Any]:
@@ -3122,11 +3074,23 @@ class AnalysisEngine:
         active_levels = signal_manager.load_active_levels()
         total_levels_before = sum(len(levels) for levels in active_levels.values())
         
+        # Загружаем 15m свечи всех пар параллельно и один раз:
+        # те же данные используются и для очистки, и в analyze_pair
+        fetched = await asyncio.gather(
+            *(self.fetch_ohlcv(pair, '15m', 200) for pair in TRADING_PAIRS),
+            return_exceptions=True
+        )
+        candles_cache = {
+            pair: candles
+            for pair, candles in zip(TRADING_PAIRS, fetched)
+            if isinstance(candles, list) and candles
+        }
+        
         for pair in TRADING_PAIRS:
             if pair in active_levels and active_levels[pair]:
                 try:
-                    # Получаем данные для проверки уровней
-                    candles_15m = await self.fetch_ohlcv(pair, '15m', 50)
+                    # Для проверки уровней достаточно последних 50 свечей
+                    candles_15m = candles_cache.get(pair, [])[-50:]
                     if candles_15m:
                         current_price = candles_15m[-1]['close']
                         pair_levels = active_levels[pair]
@@ -3149,7 +3113,7 @@ class AnalysisEngine:
         # Анализируем пары
         for pair in TRADING_PAIRS:
             try:
-                result = await self.analyze_pair(pair)
+                result = await self.analyze_pair(pair, candles_15m=candles_cache.get(pair))
                 analysis_results[pair] = result
                 if result.get('status') == 'success':
                     successful_pairs += 1
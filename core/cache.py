@@ -3,34 +3,108 @@
 """
 
 import json
+import time
+import threading
+import uuid
+from fnmatch import fnmatchcase
+import orjson
+import lz4.frame
 import redis
-from typing import Optional, Any
+from redis.utils import HIREDIS_AVAILABLE
+from cachetools import TTLCache
+from typing import Optional, Any, Dict, Iterable, List, Tuple
 from datetime import timedelta
 import logging
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Глобальное подключение к Redis
+# orjson: numpy-скаляры/массивы и нестроковые ключи словарей сериализуются без default
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Сериализаторы привязаны на уровне модуля: без поиска атрибутов orjson в горячем пути
+_dumps = orjson.dumps
+_loads = orjson.loads
+
+# Значения длиннее порога сжимаются LZ4; первый байт помечает сжатые данные
+# (JSON и обычные строки с байта 0x02 не начинаются)
+COMPRESS_MIN_BYTES = 1024
+LZ4_MAGIC = b'\x02'
+
+# Размер страницы SCAN и пачки UNLINK в clear_pattern
+CLEAR_PATTERN_BATCH = 500
+
+# Блокировка перезаполнения ключа в get_or_set: только один воркер вызывает callback
+REFILL_LOCK_TTL = 5  # секунд
+REFILL_WAIT_INTERVAL = 0.05  # секунд между проверками, пока ключ перезаполняет другой воркер
+# Снятие блокировки только ее владельцем: ключ удаляется, если в нем все еще наш токен
+# (блокировка могла истечь по TTL и достаться другому воркеру)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# L1-кэш в памяти процесса перед Redis (для Cache.get(..., local=True)).
+# Хранит сырые байты из Redis; TTL короткий, т.к. записи/удаления из других
+# процессов его не инвалидируют - устаревание ограничено LOCAL_CACHE_TTL
+LOCAL_CACHE_MAXSIZE = 10000
+LOCAL_CACHE_TTL = 5  # секунд
+_local_cache: TTLCache = TTLCache(maxsize=LOCAL_CACHE_MAXSIZE, ttl=LOCAL_CACHE_TTL)
+_local_cache_lock = threading.Lock()
+
+
+def _local_invalidate(*keys: str) -> None:
+    """Удаляет ключи из L1-кэша процесса"""
+    with _local_cache_lock:
+        for key in keys:
+            _local_cache.pop(key, None)
+
+
+def _local_invalidate_pattern(pattern: str) -> None:
+    """Удаляет из L1-кэша ключи, подходящие под glob-паттерн Redis"""
+    with _local_cache_lock:
+        for key in [k for k in _local_cache if fnmatchcase(k, pattern)]:
+            _local_cache.pop(key, None)
+
+
+# Глобальное подключение к Redis: один пул соединений на процесс
+redis_pool: Optional[redis.BlockingConnectionPool] = None
 redis_client: Optional[redis.Redis] = None
 
 
-def init_redis():
-    """Инициализирует подключение к Redis"""
-    global redis_client
+def _get_pool() -> redis.BlockingConnectionPool:
+    """Создает (один раз) пул соединений Redis"""
+    global redis_pool
     
-    try:
-        redis_client = redis.Redis(
+    if redis_pool is None:
+        # redis-py сам выбирает C-парсер протокола, если установлен hiredis
+        if not HIREDIS_AVAILABLE:
+            logger.warning("hiredis не установлен: Redis-ответы разбираются медленным Python-парсером")
+        redis_pool = redis.BlockingConnectionPool(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             password=settings.REDIS_PASSWORD,
             db=settings.REDIS_DB,
-            decode_responses=True,  # Автоматическая декодировка строк
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=5,  # Ожидание свободного соединения при исчерпании пула
+            decode_responses=False,  # Значения бинарные (LZ4), декодируются в Cache._deserialize
             socket_connect_timeout=5,
             socket_timeout=5,
+            socket_keepalive=True,
             retry_on_timeout=True,
             health_check_interval=30
         )
+    return redis_pool
+
+
+def init_redis():
+    """Инициализирует подключение к Redis (пул соединений переиспользуется между вызовами)"""
+    global redis_client
+    
+    try:
+        redis_client = redis.Redis(connection_pool=_get_pool())
         
         # Проверка подключения
         redis_client.ping()
@@ -55,9 +129,52 @@ class Cache:
     """Класс для работы с кэшем"""
     
     @staticmethod
-    def get(key: str) -> Optional[Any]:
-        """Получает значение из кэша"""
+    def _serialize(value: Any) -> bytes:
+        """
+        Сериализует значение в байты для Redis
+        
+        Строки пишутся как UTF-8, остальное - JSON (orjson). Данные длиннее
+        COMPRESS_MIN_BYTES сжимаются LZ4 и помечаются префиксом LZ4_MAGIC.
+        """
+        if isinstance(value, str):
+            data = value.encode('utf-8')
+        else:
+            try:
+                data = _dumps(value, option=ORJSON_OPTIONS)
+            except TypeError:
+                # Нестандартные типы (Decimal, set, ...) - через str, как раньше с json.dumps
+                data = _dumps(value, default=str, option=ORJSON_OPTIONS)
+        if len(data) > COMPRESS_MIN_BYTES:
+            return LZ4_MAGIC + lz4.frame.compress(data)
+        return data
+    
+    @staticmethod
+    def _deserialize(value: bytes) -> Any:
+        """Распаковывает LZ4 и парсит JSON; не-JSON значения возвращает строкой"""
+        if value[:1] == LZ4_MAGIC:
+            value = lz4.frame.decompress(value[1:])
         try:
+            return _loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return value.decode('utf-8', errors='replace')
+    
+    @staticmethod
+    def get(key: str, local: bool = False) -> Optional[Any]:
+        """
+        Получает значение из кэша
+        
+        Args:
+            key: Ключ
+            local: Сначала смотреть в L1-кэш процесса (до LOCAL_CACHE_TTL устаревания).
+                   Только для горячих read-only ключей (дашборды, графики), не для флагов
+        """
+        try:
+            if local:
+                with _local_cache_lock:
+                    value = _local_cache.get(key)
+                if value is not None:
+                    return Cache._deserialize(value)
+            
             client = get_redis()
             if client is None:
                 return None
@@ -66,16 +183,42 @@ class Cache:
             if value is None:
                 return None
             
-            # Пытаемся распарсить JSON
-            try:
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                return value
+            if local:
+                with _local_cache_lock:
+                    _local_cache[key] = value
+            
+            return Cache._deserialize(value)
                 
         except Exception as e:
             logger.error(f"Ошибка получения из кэша {key}: {e}")
             return None
     
+    @staticmethod
+    def mget(keys: List[str]) -> Dict[str, Any]:
+        """
+        Получает несколько значений из кэша за один запрос (MGET)
+        
+        Returns:
+            Словарь {ключ: значение} только для найденных ключей
+        """
+        if not keys:
+            return {}
+        try:
+            client = get_redis()
+            if client is None:
+                return {}
+            
+            values = client.mget(keys)
+            return {
+                key: Cache._deserialize(value)
+                for key, value in zip(keys, values)
+                if value is not None
+            }
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетного получения из кэша ({len(keys)} ключей): {e}")
+            return {}
+    
     @staticmethod
     def set(key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Устанавливает значение в кэш"""
@@ -84,18 +227,51 @@ class Cache:
             if client is None:
                 return False
             
-            # Сериализуем в JSON если это не строка
-            if not isinstance(value, str):
-                value = json.dumps(value, default=str)
-            
             ttl = ttl or settings.CACHE_TTL
-            client.setex(key, ttl, value)
+            client.setex(key, ttl, Cache._serialize(value))
+            _local_invalidate(key)
             return True
             
         except Exception as e:
             logger.error(f"Ошибка установки в кэш {key}: {e}")
             return False
     
+    @staticmethod
+    def mset(mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """
+        Устанавливает несколько значений с общим TTL за один запрос
+        
+        MSET не поддерживает TTL, поэтому используется pipeline из SETEX (см. set_many).
+        """
+        return Cache.set_many((key, value, ttl) for key, value in mapping.items())
+    
+    @staticmethod
+    def set_many(items: Iterable[Tuple[str, Any, Optional[int]]]) -> bool:
+        """
+        Устанавливает несколько значений за один запрос (pipeline из SETEX)
+        
+        Args:
+            items: Тройки (ключ, значение, ttl); ttl=None - settings.CACHE_TTL
+        """
+        items = list(items)
+        if not items:
+            return True
+        try:
+            client = get_redis()
+            if client is None:
+                return False
+            
+            with client.pipeline(transaction=False) as pipe:
+                for key, value, ttl in items:
+                    pipe.setex(key, ttl or settings.CACHE_TTL, Cache._serialize(value))
+                pipe.execute()
+            _local_invalidate(*(key for key, _, _ in items))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетной установки в кэш ({len(items)} ключей): {e}")
+            return False
+    
     @staticmethod
     def delete(key: str) -> bool:
         """Удаляет ключ из кэша"""
@@ -105,6 +281,7 @@ class Cache:
                 return False
             
             client.delete(key)
+            _local_invalidate(key)
             return True
             
         except Exception as e:
@@ -127,16 +304,28 @@ class Cache:
     
     @staticmethod
     def clear_pattern(pattern: str) -> int:
-        """Удаляет все ключи по паттерну"""
+        """
+        Удаляет все ключи по паттерну
+        
+        Ключи обходятся через SCAN (без блокировки Redis, в отличие от KEYS)
+        и удаляются неблокирующим UNLINK пачками по CLEAR_PATTERN_BATCH.
+        """
         try:
             client = get_redis()
             if client is None:
                 return 0
             
-            keys = client.keys(pattern)
-            if keys:
-                return client.delete(*keys)
-            return 0
+            deleted = 0
+            batch = []
+            for key in client.scan_iter(match=pattern, count=CLEAR_PATTERN_BATCH):
+                batch.append(key)
+                if len(batch) >= CLEAR_PATTERN_BATCH:
+                    deleted += client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                deleted += client.unlink(*batch)
+            _local_invalidate_pattern(pattern)
+            return deleted
             
         except Exception as e:
             logger.error(f"Ошибка очистки по паттерну {pattern}: {e}")
@@ -144,15 +333,55 @@ class Cache:
     
     @staticmethod
     def get_or_set(key: str, callback, ttl: Optional[int] = None):
-        """Получает значение из кэша или устанавливает через callback"""
+        """
+        Получает значение из кэша или устанавливает через callback
+
+        При промахе callback вызывает только воркер, захвативший lock:{key}
+        (SET NX EX); остальные ждут появления значения до REFILL_LOCK_TTL.
+        Значение записывается через SET NX, чтобы не затереть более свежую запись.
+        """
         value = Cache.get(key)
         if value is not None:
             return value
         
-        # Если нет в кэше, вызываем callback
-        value = callback()
-        Cache.set(key, value, ttl)
-        return value
+        client = get_redis()
+        if client is None:
+            return callback()
+        
+        lock_key = f"lock:{key}"
+        lock_token = uuid.uuid4().hex
+        # acquired - блокировка действительно наша; wait - другой воркер уже перезаполняет ключ.
+        # Если SET не удался, callback все равно вызывается, но чужую блокировку не трогаем
+        acquired = False
+        try:
+            acquired = bool(client.set(lock_key, lock_token, ex=REFILL_LOCK_TTL, nx=True))
+            wait = not acquired
+        except Exception as e:
+            logger.error(f"Ошибка захвата блокировки {lock_key}: {e}")
+            wait = False
+        
+        if wait:
+            # Ключ уже перезаполняет другой воркер - ждем его результат
+            deadline = time.monotonic() + REFILL_LOCK_TTL
+            while time.monotonic() < deadline:
+                time.sleep(REFILL_WAIT_INTERVAL)
+                value = Cache.get(key)
+                if value is not None:
+                    return value
+        
+        try:
+            value = callback()
+            try:
+                client.set(key, Cache._serialize(value), ex=ttl or settings.CACHE_TTL, nx=True)
+            except Exception as e:
+                logger.error(f"Ошибка установки в кэш {key}: {e}")
+            return value
+        finally:
+            if acquired:
+                try:
+                    client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+                except Exception as e:
+                    logger.error(f"Ошибка снятия блокировки {lock_key}: {e}")
 
 
 # Глобальный экземпляр кэша
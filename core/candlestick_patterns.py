@@ -4,7 +4,11 @@
 """
 
 import logging
-from typing import List, Dict, Optional, Tuple
+import sys
+import numpy as np
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Dict, Optional, Tuple
 from datetime import datetime, timezone
 from sqlalchemy.orm import Session
 from core.models import CandlestickPattern
@@ -12,507 +16,387 @@ from core.models import CandlestickPattern
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class Pattern:
+    """Обнаруженный свечной паттерн"""
+    pattern_type: str
+    direction: str
+    reliability: float
+    candles_indices: Tuple[int, ...]
+    timestamp: datetime
+    price: float
+    pattern_zone: str
+
+
+# Описание паттерна: (pattern_type, direction, reliability, pattern_zone, количество свечей)
+PatternSpec = Tuple[str, str, float, str, int]
+
+
+def _candles_to_arrays(candles: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Переводит список свечей в массивы open/high/low/close (float64)"""
+    n = len(candles)
+    o = np.fromiter((candle['open'] for candle in candles), dtype=np.float64, count=n)
+    h = np.fromiter((candle['high'] for candle in candles), dtype=np.float64, count=n)
+    l = np.fromiter((candle['low'] for candle in candles), dtype=np.float64, count=n)
+    c = np.fromiter((candle['close'] for candle in candles), dtype=np.float64, count=n)
+    return o, h, l, c
+
+
+def _candle_features(o: np.ndarray, h: np.ndarray, l: np.ndarray,
+                     c: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Размер тела, верхняя тень, нижняя тень и диапазон - считаются один раз за проход"""
+    body_size = np.abs(c - o)
+    upper_shadow = h - np.maximum(o, c)
+    lower_shadow = np.minimum(o, c) - l
+    total_range = h - l
+    return body_size, upper_shadow, lower_shadow, total_range
+
+
+# ========== Векторные маски 1-свечных паттернов ==========
+
+def doji_mask(body_size: np.ndarray, total_range: np.ndarray) -> np.ndarray:
+    """Доджи: тело меньше 5% от общего диапазона"""
+    has_range = total_range != 0
+    body_ratio = body_size / np.where(has_range, total_range, 1.0)
+    return has_range & (body_ratio < 0.05)
+
+
+def hammer_masks(body_size: np.ndarray, upper_shadow: np.ndarray, lower_shadow: np.ndarray,
+                 total_range: np.ndarray, h: np.ndarray, l: np.ndarray,
+                 c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Молот и перевернутый молот за один проход
+
+    Молот: длинная нижняя тень, маленькая верхняя, тело в верхней части диапазона.
+    Перевернутый молот: зеркально - длинная верхняя тень, тело в нижней части.
+    Условия на тени у них симметричны, поэтому общие члены считаются один раз.
+
+    Returns:
+        (маска молота, маска перевернутого молота)
+    """
+    has_range = total_range != 0
+    long_shadow = body_size * 2
+    short_shadow = body_size * 0.5
+    body_offset = total_range * 0.3
+    hammer = (has_range &
+              (lower_shadow >= long_shadow) &
+              (upper_shadow <= short_shadow) &
+              (c > l + body_offset))
+    inverted_hammer = (has_range &
+                       (upper_shadow >= long_shadow) &
+                       (lower_shadow <= short_shadow) &
+                       (c < h - body_offset))
+    return hammer, inverted_hammer
+
+
+# ========== Векторные маски 2-свечных паттернов ==========
+# Аргументы с префиксом p - предыдущая свеча (срез [:-1]), без префикса - текущая (срез [1:])
+
+def bullish_engulfing_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Бычье поглощение: медвежья свеча, затем бычья, полностью поглощающая первую"""
+    return (pc < po) & (c > o) & (o < pc) & (c > po)
+
+
+def bearish_engulfing_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Медвежье поглощение: бычья свеча, затем медвежья, полностью поглощающая первую"""
+    return (pc > po) & (c < o) & (o > pc) & (c < po)
+
+
+def piercing_pattern_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Проникающая линия: открытие ниже минимума первой, закрытие выше середины её тела"""
+    prev_midpoint = (po + pc) / 2
+    return (pc < po) & (c > o) & (o < pl) & (c > prev_midpoint) & (c < po)
+
+
+def dark_cloud_cover_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Темная накрывающая туча: открытие выше максимума первой, закрытие ниже середины её тела"""
+    prev_midpoint = (po + pc) / 2
+    return (pc > po) & (c < o) & (o > ph) & (c < prev_midpoint) & (c > pc)
+
+
+def bullish_harami_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Бычья харами: маленькая бычья свеча внутри большой медвежьей"""
+    return ((pc < po) & (c > o) &
+            (o > pc) & (c < po) & (h < ph) & (l > pl))
+
+
+def bearish_harami_mask(po, ph, pl, pc, o, h, l, c) -> np.ndarray:
+    """Медвежья харами: маленькая медвежья свеча внутри большой бычьей"""
+    return ((pc > po) & (c < o) &
+            (o < pc) & (c > po) & (h < ph) & (l > pl))
+
+
+# ========== Векторные маски 3-свечных паттернов ==========
+# Суффикс 0 - первая свеча (срез [:-2]), 1 - вторая ([1:-1]), 2 - третья ([2:]).
+# Тела и направления свечей считаются один раз по всему массиву и передаются срезами
+
+def morning_star_mask(c0, midpoint0, body0, body1, h1, c2, bearish0, bullish2) -> np.ndarray:
+    """Утренняя звезда: медвежья свеча, маленькая свеча с гэпом вниз, бычья свеча"""
+    return (bearish0 & bullish2 &
+            (body1 < body0 * 0.3) &
+            (h1 < c0) &
+            (c2 > midpoint0))
+
+
+def evening_star_mask(c0, midpoint0, body0, body1, l1, c2, bullish0, bearish2) -> np.ndarray:
+    """Вечерняя звезда: бычья свеча, маленькая свеча с гэпом вверх, медвежья свеча"""
+    return (bullish0 & bearish2 &
+            (body1 < body0 * 0.3) &
+            (l1 > c0) &
+            (c2 < midpoint0))
+
+
+def three_white_soldiers_mask(o0, c0, o1, c1, o2, c2, bullish0, bullish1, bullish2) -> np.ndarray:
+    """Три белых солдата: три бычьи свечи с растущими открытиями и закрытиями"""
+    return (bullish0 & bullish1 & bullish2 &
+            (c1 > c0) & (c2 > c1) &
+            (o1 >= o0) & (o2 >= o1))
+
+
+def three_black_crows_mask(o0, c0, o1, c1, o2, c2, bearish0, bearish1, bearish2) -> np.ndarray:
+    """Три ворона: три медвежьи свечи с падающими открытиями и закрытиями"""
+    return (bearish0 & bearish1 & bearish2 &
+            (c1 < c0) & (c2 < c1) &
+            (o1 <= o0) & (o2 <= o1))
+
+
+# Типы паттернов, направления и зоны - общие интернированные строки для всех записей
+DOJI = sys.intern('doji')
+HAMMER = sys.intern('hammer')
+INVERTED_HAMMER = sys.intern('inverted_hammer')
+SHOOTING_STAR = sys.intern('shooting_star')
+HANGING_MAN = sys.intern('hanging_man')
+BULLISH_ENGULFING = sys.intern('bullish_engulfing')
+BEARISH_ENGULFING = sys.intern('bearish_engulfing')
+PIERCING_PATTERN = sys.intern('piercing_pattern')
+DARK_CLOUD_COVER = sys.intern('dark_cloud_cover')
+BULLISH_HARAMI = sys.intern('bullish_harami')
+BEARISH_HARAMI = sys.intern('bearish_harami')
+MORNING_STAR = sys.intern('morning_star')
+EVENING_STAR = sys.intern('evening_star')
+THREE_WHITE_SOLDIERS = sys.intern('three_white_soldiers')
+THREE_BLACK_CROWS = sys.intern('three_black_crows')
+
+BULLISH = sys.intern('bullish')
+BEARISH = sys.intern('bearish')
+NEUTRAL = sys.intern('neutral')
+
+SUPPORT = sys.intern('support')
+RESISTANCE = sys.intern('resistance')
+REVERSAL = sys.intern('reversal')
+TREND_CONTINUATION = sys.intern('trend_continuation')
+
+# Все паттерны в порядке выдачи внутри одной свечи: id паттерна = индекс в кортеже
+PATTERN_SPECS: Tuple[PatternSpec, ...] = (
+    # 1-свечные
+    (DOJI, NEUTRAL, 0.6, REVERSAL, 1),
+    (HAMMER, BULLISH, 0.7, SUPPORT, 1),
+    (INVERTED_HAMMER, BULLISH, 0.65, SUPPORT, 1),
+    (SHOOTING_STAR, BEARISH, 0.7, RESISTANCE, 1),
+    (HANGING_MAN, BEARISH, 0.65, RESISTANCE, 1),
+    # 2-свечные
+    (BULLISH_ENGULFING, BULLISH, 0.75, SUPPORT, 2),
+    (BEARISH_ENGULFING, BEARISH, 0.75, RESISTANCE, 2),
+    (PIERCING_PATTERN, BULLISH, 0.7, SUPPORT, 2),
+    (DARK_CLOUD_COVER, BEARISH, 0.7, RESISTANCE, 2),
+    (BULLISH_HARAMI, BULLISH, 0.6, SUPPORT, 2),
+    (BEARISH_HARAMI, BEARISH, 0.6, RESISTANCE, 2),
+    # 3-свечные
+    (MORNING_STAR, BULLISH, 0.8, SUPPORT, 3),
+    (EVENING_STAR, BEARISH, 0.8, RESISTANCE, 3),
+    (THREE_WHITE_SOLDIERS, BULLISH, 0.75, TREND_CONTINUATION, 3),
+    (THREE_BLACK_CROWS, BEARISH, 0.75, TREND_CONTINUATION, 3),
+)
+
+
+def _single_candle_masks(h: np.ndarray, l: np.ndarray, c: np.ndarray, body_size: np.ndarray,
+                         upper_shadow: np.ndarray, lower_shadow: np.ndarray,
+                         total_range: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Маски 1-свечных паттернов (длина n)"""
+    hammer, inverted_hammer = hammer_masks(body_size, upper_shadow, lower_shadow, total_range, h, l, c)
+    # Падающая звезда и висельник геометрически совпадают с перевернутым молотом
+    # и молотом (отличается только контекст тренда), поэтому маски переиспользуются
+    return (
+        doji_mask(body_size, total_range),
+        hammer,
+        inverted_hammer,
+        inverted_hammer,
+        hammer,
+    )
+
+
+def _two_candle_masks(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Маски 2-свечных паттернов (длина n - 1, индекс по второй свече)"""
+    pairs = (o[:-1], h[:-1], l[:-1], c[:-1], o[1:], h[1:], l[1:], c[1:])
+    return (
+        bullish_engulfing_mask(*pairs),
+        bearish_engulfing_mask(*pairs),
+        piercing_pattern_mask(*pairs),
+        dark_cloud_cover_mask(*pairs),
+        bullish_harami_mask(*pairs),
+        bearish_harami_mask(*pairs),
+    )
+
+
+def _three_candle_masks(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray,
+                        body_size: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Маски 3-свечных паттернов (длина n - 2, индекс по третьей свече)"""
+    bullish = c > o
+    bearish = c < o
+    o0, o1, o2 = o[:-2], o[1:-1], o[2:]
+    c0, c1, c2 = c[:-2], c[1:-1], c[2:]
+    body0, body1 = body_size[:-2], body_size[1:-1]
+    bullish0, bullish1, bullish2 = bullish[:-2], bullish[1:-1], bullish[2:]
+    bearish0, bearish1, bearish2 = bearish[:-2], bearish[1:-1], bearish[2:]
+    midpoint0 = (o0 + c0) / 2
+    return (
+        morning_star_mask(c0, midpoint0, body0, body1, h[1:-1], c2, bearish0, bullish2),
+        evening_star_mask(c0, midpoint0, body0, body1, l[1:-1], c2, bullish0, bearish2),
+        three_white_soldiers_mask(o0, c0, o1, c1, o2, c2, bullish0, bullish1, bullish2),
+        three_black_crows_mask(o0, c0, o1, c1, o2, c2, bearish0, bearish1, bearish2),
+    )
+
+
+# Бит паттерна в упакованной маске: бит i <-> PATTERN_SPECS[i]
+PATTERN_BITS = np.array([1 << pattern_id for pattern_id in range(len(PATTERN_SPECS))], dtype=np.uint16)
+
+
+def detect_pattern_bits(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Полный проход детекции по массивам свечей (n >= 3)
+
+    Returns:
+        Массив uint16 длиной n: бит i у свечи idx выставлен, если на ней
+        заканчивается паттерн PATTERN_SPECS[i]. Свечи 0 и 1 всегда 0 -
+        анализ начинается с индекса 2 (для 3-свечных паттернов)
+    """
+    n = o.shape[0]
+    body_size, upper_shadow, lower_shadow, total_range = _candle_features(o, h, l, c)
+    masks = (_single_candle_masks(h, l, c, body_size, upper_shadow, lower_shadow, total_range) +
+             _two_candle_masks(o, h, l, c) +
+             _three_candle_masks(o, h, l, c, body_size))
+    packed = np.zeros(n, dtype=np.uint16)
+    analyzed = packed[2:]
+    for bit, mask in zip(PATTERN_BITS, masks):
+        # Выравниваем маску по индексу последней свечи паттерна
+        analyzed[mask[-(n - 2):]] |= bit
+    return packed
+
+
+def detect_pattern_hits(o: np.ndarray, h: np.ndarray, l: np.ndarray,
+                        c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Полный проход детекции с раскрытием битовой маски
+
+    Returns:
+        (индексы последней свечи паттерна, id паттернов в PATTERN_SPECS),
+        упорядоченные по индексу свечи, а внутри свечи - по id
+    """
+    packed = detect_pattern_bits(o, h, l, c)
+    bars = np.flatnonzero(packed)
+    bar_positions, pattern_ids = np.nonzero(packed[bars, None] & PATTERN_BITS)
+    return bars[bar_positions], pattern_ids
+
+
+def _make_pattern(pattern_id: int, idx: int, timestamp: datetime, price: float) -> Pattern:
+    """Строит запись Pattern для паттерна PATTERN_SPECS[pattern_id], заканчивающегося на свече idx"""
+    pattern_type, direction, reliability, pattern_zone, span = PATTERN_SPECS[pattern_id]
+    # Постоянные поля берутся из шаблона PATTERN_SPECS, переменные - со свечи;
+    # аргументы позиционные (порядок полей Pattern): без kwargs на каждую запись
+    return Pattern(pattern_type, direction, reliability,
+                   tuple(range(idx - span + 1, idx + 1)),
+                   timestamp, price, pattern_zone)
+
+
 class PatternDetector:
     """Класс для детекции паттернов свечного анализа"""
-    
+
     # Минимальное количество свечей для анализа
     MIN_CANDLES_FOR_PATTERN = 3
-    
+
     def __init__(self):
         pass
-    
-    def detect_patterns(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Dict]:
+
+    def detect_patterns(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Pattern]:
         """
         Детектирует все паттерны в массиве свечей
-        
+
+        Свечи один раз переводятся в массивы open/high/low/close, весь проход
+        детекции выполняет detect_pattern_hits, а записи Pattern строятся только
+        для найденных паттернов.
+
         Args:
             candles: Список свечей в формате [{'timestamp': int, 'open': float, 'high': float, 'low': float, 'close': float, 'volume': float}, ...]
             symbol: Символ пары (например, 'BTC/USDT')
             timeframe: Таймфрейм ('1m', '5m', '15m', '1h', '4h')
-        
+
         Returns:
-            Список обнаруженных паттернов в формате:
-            [{
-                'pattern_type': str,
-                'direction': str,
-                'reliability': float,
-                'candles_indices': List[int],
-                'timestamp': datetime,
-                'price': float,
-                'pattern_zone': str
-            }, ...]
+            Список обнаруженных паттернов (Pattern) по возрастанию индекса свечи
         """
         if len(candles) < self.MIN_CANDLES_FOR_PATTERN:
             return []
-        
-        patterns = []
-        
-        # Проходим по свечам, начиная с индекса 2 (для 3-свечных паттернов)
-        for i in range(2, len(candles)):
-            # 1-свечные паттерны
-            patterns.extend(self._detect_single_candle_patterns(candles, i, symbol, timeframe))
-            
-            # 2-свечные паттерны
-            if i >= 1:
-                patterns.extend(self._detect_two_candle_patterns(candles, i, symbol, timeframe))
-            
-            # 3-свечные паттерны
-            if i >= 2:
-                patterns.extend(self._detect_three_candle_patterns(candles, i, symbol, timeframe))
-        
-        return patterns
-    
-    def _detect_single_candle_patterns(self, candles: List[Dict], idx: int, symbol: str, timeframe: str) -> List[Dict]:
-        """Детектирует 1-свечные паттерны"""
-        patterns = []
-        candle = candles[idx]
-        
-        # Доджи
-        doji = self._is_doji(candle)
-        if doji:
-            patterns.append({
-                'pattern_type': 'doji',
-                'direction': 'neutral',
-                'reliability': 0.6,
-                'candles_indices': [idx],
-                'timestamp': datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': candle['close'],
-                'pattern_zone': 'reversal' if idx > 0 else 'neutral'
-            })
-        
-        # Молот (Hammer) - бычий разворот
-        hammer = self._is_hammer(candle)
-        if hammer:
-            patterns.append({
-                'pattern_type': 'hammer',
-                'direction': 'bullish',
-                'reliability': 0.7,
-                'candles_indices': [idx],
-                'timestamp': datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Перевернутый молот (Inverted Hammer) - бычий разворот
-        inverted_hammer = self._is_inverted_hammer(candle)
-        if inverted_hammer:
-            patterns.append({
-                'pattern_type': 'inverted_hammer',
-                'direction': 'bullish',
-                'reliability': 0.65,
-                'candles_indices': [idx],
-                'timestamp': datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Падающая звезда (Shooting Star) - медвежий разворот
-        shooting_star = self._is_shooting_star(candle)
-        if shooting_star:
-            patterns.append({
-                'pattern_type': 'shooting_star',
-                'direction': 'bearish',
-                'reliability': 0.7,
-                'candles_indices': [idx],
-                'timestamp': datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        # Висельник (Hanging Man) - медвежий разворот
-        hanging_man = self._is_hanging_man(candle)
-        if hanging_man:
-            patterns.append({
-                'pattern_type': 'hanging_man',
-                'direction': 'bearish',
-                'reliability': 0.65,
-                'candles_indices': [idx],
-                'timestamp': datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        return patterns
-    
-    def _detect_two_candle_patterns(self, candles: List[Dict], idx: int, symbol: str, timeframe: str) -> List[Dict]:
-        """Детектирует 2-свечные паттерны"""
-        patterns = []
-        prev_candle = candles[idx - 1]
-        curr_candle = candles[idx]
-        
-        # Бычье поглощение (Bullish Engulfing)
-        bullish_engulfing = self._is_bullish_engulfing(prev_candle, curr_candle)
-        if bullish_engulfing:
-            patterns.append({
-                'pattern_type': 'bullish_engulfing',
-                'direction': 'bullish',
-                'reliability': 0.75,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Медвежье поглощение (Bearish Engulfing)
-        bearish_engulfing = self._is_bearish_engulfing(prev_candle, curr_candle)
-        if bearish_engulfing:
-            patterns.append({
-                'pattern_type': 'bearish_engulfing',
-                'direction': 'bearish',
-                'reliability': 0.75,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        # Проникающая линия (Piercing Pattern) - бычий разворот
-        piercing = self._is_piercing_pattern(prev_candle, curr_candle)
-        if piercing:
-            patterns.append({
-                'pattern_type': 'piercing_pattern',
-                'direction': 'bullish',
-                'reliability': 0.7,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Темная накрывающая туча (Dark Cloud Cover) - медвежий разворот
-        dark_cloud = self._is_dark_cloud_cover(prev_candle, curr_candle)
-        if dark_cloud:
-            patterns.append({
-                'pattern_type': 'dark_cloud_cover',
-                'direction': 'bearish',
-                'reliability': 0.7,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        # Бычья харами (Bullish Harami)
-        bullish_harami = self._is_bullish_harami(prev_candle, curr_candle)
-        if bullish_harami:
-            patterns.append({
-                'pattern_type': 'bullish_harami',
-                'direction': 'bullish',
-                'reliability': 0.6,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Медвежья харами (Bearish Harami)
-        bearish_harami = self._is_bearish_harami(prev_candle, curr_candle)
-        if bearish_harami:
-            patterns.append({
-                'pattern_type': 'bearish_harami',
-                'direction': 'bearish',
-                'reliability': 0.6,
-                'candles_indices': [idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(curr_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': curr_candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        return patterns
-    
-    def _detect_three_candle_patterns(self, candles: List[Dict], idx: int, symbol: str, timeframe: str) -> List[Dict]:
-        """Детектирует 3-свечные паттерны"""
+
+        bar_indices, pattern_ids = detect_pattern_hits(*_candles_to_arrays(candles))
+
         patterns = []
-        first_candle = candles[idx - 2]
-        second_candle = candles[idx - 1]
-        third_candle = candles[idx]
-        
-        # Утренняя звезда (Morning Star) - бычий разворот
-        morning_star = self._is_morning_star(first_candle, second_candle, third_candle)
-        if morning_star:
-            patterns.append({
-                'pattern_type': 'morning_star',
-                'direction': 'bullish',
-                'reliability': 0.8,
-                'candles_indices': [idx - 2, idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(third_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': third_candle['close'],
-                'pattern_zone': 'support'
-            })
-        
-        # Вечерняя звезда (Evening Star) - медвежий разворот
-        evening_star = self._is_evening_star(first_candle, second_candle, third_candle)
-        if evening_star:
-            patterns.append({
-                'pattern_type': 'evening_star',
-                'direction': 'bearish',
-                'reliability': 0.8,
-                'candles_indices': [idx - 2, idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(third_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': third_candle['close'],
-                'pattern_zone': 'resistance'
-            })
-        
-        # Три белых солдата (Three White Soldiers) - продолжение бычьего тренда
-        three_white_soldiers = self._is_three_white_soldiers(first_candle, second_candle, third_candle)
-        if three_white_soldiers:
-            patterns.append({
-                'pattern_type': 'three_white_soldiers',
-                'direction': 'bullish',
-                'reliability': 0.75,
-                'candles_indices': [idx - 2, idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(third_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': third_candle['close'],
-                'pattern_zone': 'trend_continuation'
-            })
-        
-        # Три ворона (Three Black Crows) - продолжение медвежьего тренда
-        three_black_crows = self._is_three_black_crows(first_candle, second_candle, third_candle)
-        if three_black_crows:
-            patterns.append({
-                'pattern_type': 'three_black_crows',
-                'direction': 'bearish',
-                'reliability': 0.75,
-                'candles_indices': [idx - 2, idx - 1, idx],
-                'timestamp': datetime.fromtimestamp(third_candle['timestamp'] / 1000, tz=timezone.utc),
-                'price': third_candle['close'],
-                'pattern_zone': 'trend_continuation'
-            })
-        
+        last_idx = -1
+        for idx, pattern_id in zip(bar_indices.tolist(), pattern_ids.tolist()):
+            # Попадания отсортированы по свече: время и цену считаем один раз на свечу
+            if idx != last_idx:
+                candle = candles[idx]
+                timestamp = datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc)
+                price = candle['close']
+                last_idx = idx
+            patterns.append(_make_pattern(pattern_id, idx, timestamp, price))
+
         return patterns
-    
-    # ========== Вспомогательные методы для определения паттернов ==========
-    
-    def _get_body_size(self, candle: Dict) -> float:
-        """Возвращает размер тела свечи (open - close)"""
-        return abs(candle['close'] - candle['open'])
-    
-    def _get_upper_shadow(self, candle: Dict) -> float:
-        """Возвращает размер верхней тени"""
-        return candle['high'] - max(candle['open'], candle['close'])
-    
-    def _get_lower_shadow(self, candle: Dict) -> float:
-        """Возвращает размер нижней тени"""
-        return min(candle['open'], candle['close']) - candle['low']
-    
-    def _get_total_range(self, candle: Dict) -> float:
-        """Возвращает общий диапазон свечи (high - low)"""
-        return candle['high'] - candle['low']
-    
-    def _is_bullish(self, candle: Dict) -> bool:
-        """Проверяет, является ли свеча бычьей"""
-        return candle['close'] > candle['open']
-    
-    def _is_bearish(self, candle: Dict) -> bool:
-        """Проверяет, является ли свеча медвежьей"""
-        return candle['close'] < candle['open']
-    
-    # ========== 1-свечные паттерны ==========
-    
-    def _is_doji(self, candle: Dict) -> bool:
-        """Доджи: очень маленькое тело, тени примерно равны"""
-        body_size = self._get_body_size(candle)
-        total_range = self._get_total_range(candle)
-        if total_range == 0:
-            return False
-        
-        # Тело должно быть меньше 5% от общего диапазона
-        body_ratio = body_size / total_range
-        return body_ratio < 0.05
-    
-    def _is_hammer(self, candle: Dict) -> bool:
-        """Молот: маленькое тело вверху, длинная нижняя тень, маленькая верхняя тень"""
-        body_size = self._get_body_size(candle)
-        lower_shadow = self._get_lower_shadow(candle)
-        upper_shadow = self._get_upper_shadow(candle)
-        total_range = self._get_total_range(candle)
-        
-        if total_range == 0:
-            return False
-        
-        # Нижняя тень должна быть минимум в 2 раза больше тела
-        # Верхняя тень должна быть маленькой (меньше тела)
-        # Тело должно быть в верхней половине диапазона
-        return (lower_shadow >= body_size * 2 and 
-                upper_shadow <= body_size * 0.5 and
-                candle['close'] > candle['low'] + total_range * 0.3)
-    
-    def _is_inverted_hammer(self, candle: Dict) -> bool:
-        """Перевернутый молот: маленькое тело внизу, длинная верхняя тень, маленькая нижняя тень"""
-        body_size = self._get_body_size(candle)
-        lower_shadow = self._get_lower_shadow(candle)
-        upper_shadow = self._get_upper_shadow(candle)
-        total_range = self._get_total_range(candle)
-        
-        if total_range == 0:
-            return False
-        
-        # Верхняя тень должна быть минимум в 2 раза больше тела
-        # Нижняя тень должна быть маленькой
-        # Тело должно быть в нижней половине диапазона
-        return (upper_shadow >= body_size * 2 and 
-                lower_shadow <= body_size * 0.5 and
-                candle['close'] < candle['high'] - total_range * 0.3)
-    
-    def _is_shooting_star(self, candle: Dict) -> bool:
-        """Падающая звезда: маленькое тело внизу, длинная верхняя тень, маленькая нижняя тень"""
-        body_size = self._get_body_size(candle)
-        lower_shadow = self._get_lower_shadow(candle)
-        upper_shadow = self._get_upper_shadow(candle)
-        total_range = self._get_total_range(candle)
-        
-        if total_range == 0:
-            return False
-        
-        # Верхняя тень должна быть минимум в 2 раза больше тела
-        # Нижняя тень должна быть маленькой
-        # Тело должно быть в нижней половине диапазона
-        # Свеча должна быть медвежьей или нейтральной
-        return (upper_shadow >= body_size * 2 and 
-                lower_shadow <= body_size * 0.5 and
-                candle['close'] < candle['high'] - total_range * 0.3)
-    
-    def _is_hanging_man(self, candle: Dict) -> bool:
-        """Висельник: похож на молот, но появляется после восходящего тренда"""
-        # Похож на молот, но контекст важен (нужно проверять предыдущие свечи)
-        body_size = self._get_body_size(candle)
-        lower_shadow = self._get_lower_shadow(candle)
-        upper_shadow = self._get_upper_shadow(candle)
-        total_range = self._get_total_range(candle)
-        
-        if total_range == 0:
-            return False
-        
-        # Те же условия, что и у молота
-        return (lower_shadow >= body_size * 2 and 
-                upper_shadow <= body_size * 0.5 and
-                candle['close'] > candle['low'] + total_range * 0.3)
-    
-    # ========== 2-свечные паттерны ==========
-    
-    def _is_bullish_engulfing(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Бычье поглощение: первая свеча медвежья, вторая бычья и полностью поглощает первую"""
-        if not (self._is_bearish(prev_candle) and self._is_bullish(curr_candle)):
-            return False
-        
-        # Вторая свеча должна полностью поглотить первую
-        return (curr_candle['open'] < prev_candle['close'] and
-                curr_candle['close'] > prev_candle['open'])
-    
-    def _is_bearish_engulfing(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Медвежье поглощение: первая свеча бычья, вторая медвежья и полностью поглощает первую"""
-        if not (self._is_bullish(prev_candle) and self._is_bearish(curr_candle)):
-            return False
-        
-        # Вторая свеча должна полностью поглотить первую
-        return (curr_candle['open'] > prev_candle['close'] and
-                curr_candle['close'] < prev_candle['open'])
-    
-    def _is_piercing_pattern(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Проникающая линия: первая медвежья, вторая бычья, открывается ниже минимума первой, закрывается выше середины первой"""
-        if not (self._is_bearish(prev_candle) and self._is_bullish(curr_candle)):
-            return False
-        
-        prev_midpoint = (prev_candle['open'] + prev_candle['close']) / 2
-        
-        return (curr_candle['open'] < prev_candle['low'] and
-                curr_candle['close'] > prev_midpoint and
-                curr_candle['close'] < prev_candle['open'])
-    
-    def _is_dark_cloud_cover(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Темная накрывающая туча: первая бычья, вторая медвежья, открывается выше максимума первой, закрывается ниже середины первой"""
-        if not (self._is_bullish(prev_candle) and self._is_bearish(curr_candle)):
-            return False
-        
-        prev_midpoint = (prev_candle['open'] + prev_candle['close']) / 2
-        
-        return (curr_candle['open'] > prev_candle['high'] and
-                curr_candle['close'] < prev_midpoint and
-                curr_candle['close'] > prev_candle['close'])
-    
-    def _is_bullish_harami(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Бычья харами: первая большая медвежья, вторая маленькая бычья внутри первой"""
-        if not (self._is_bearish(prev_candle) and self._is_bullish(curr_candle)):
-            return False
-        
-        # Вторая свеча должна быть внутри первой
-        return (curr_candle['open'] > prev_candle['close'] and
-                curr_candle['close'] < prev_candle['open'] and
-                curr_candle['high'] < prev_candle['high'] and
-                curr_candle['low'] > prev_candle['low'])
-    
-    def _is_bearish_harami(self, prev_candle: Dict, curr_candle: Dict) -> bool:
-        """Медвежья харами: первая большая бычья, вторая маленькая медвежья внутри первой"""
-        if not (self._is_bullish(prev_candle) and self._is_bearish(curr_candle)):
-            return False
-        
-        # Вторая свеча должна быть внутри первой
-        return (curr_candle['open'] < prev_candle['close'] and
-                curr_candle['close'] > prev_candle['open'] and
-                curr_candle['high'] < prev_candle['high'] and
-                curr_candle['low'] > prev_candle['low'])
-    
-    # ========== 3-свечные паттерны ==========
-    
-    def _is_morning_star(self, first: Dict, second: Dict, third: Dict) -> bool:
-        """Утренняя звезда: медвежья свеча, маленькая свеча с гэпом вниз, бычья свеча"""
-        if not (self._is_bearish(first) and self._is_bullish(third)):
-            return False
-        
-        # Вторая свеча должна быть маленькой (звезда)
-        second_body = self._get_body_size(second)
-        first_body = self._get_body_size(first)
-        
-        # Вторая свеча должна быть ниже первой (гэп вниз)
-        # Третья свеча должна закрыться выше середины первой
-        first_midpoint = (first['open'] + first['close']) / 2
-        
-        return (second_body < first_body * 0.3 and
-                second['high'] < first['close'] and
-                third['close'] > first_midpoint)
-    
-    def _is_evening_star(self, first: Dict, second: Dict, third: Dict) -> bool:
-        """Вечерняя звезда: бычья свеча, маленькая свеча с гэпом вверх, медвежья свеча"""
-        if not (self._is_bullish(first) and self._is_bearish(third)):
-            return False
-        
-        # Вторая свеча должна быть маленькой (звезда)
-        second_body = self._get_body_size(second)
-        first_body = self._get_body_size(first)
-        
-        # Вторая свеча должна быть выше первой (гэп вверх)
-        # Третья свеча должна закрыться ниже середины первой
-        first_midpoint = (first['open'] + first['close']) / 2
-        
-        return (second_body < first_body * 0.3 and
-                second['low'] > first['close'] and
-                third['close'] < first_midpoint)
-    
-    def _is_three_white_soldiers(self, first: Dict, second: Dict, third: Dict) -> bool:
-        """Три белых солдата: три последовательные бычьи свечи с растущими закрытиями"""
-        if not (self._is_bullish(first) and self._is_bullish(second) and self._is_bullish(third)):
-            return False
-        
-        # Каждая следующая свеча должна закрываться выше предыдущей
-        # Каждая следующая должна открываться внутри тела предыдущей или выше
-        return (second['close'] > first['close'] and
-                third['close'] > second['close'] and
-                second['open'] >= first['open'] and
-                third['open'] >= second['open'])
-    
-    def _is_three_black_crows(self, first: Dict, second: Dict, third: Dict) -> bool:
-        """Три ворона: три последовательные медвежьи свечи с падающими закрытиями"""
-        if not (self._is_bearish(first) and self._is_bearish(second) and self._is_bearish(third)):
-            return False
-        
-        # Каждая следующая свеча должна закрываться ниже предыдущей
-        # Каждая следующая должна открываться внутри тела предыдущей или ниже
-        return (second['close'] < first['close'] and
-                third['close'] < second['close'] and
-                second['open'] <= first['open'] and
-                third['open'] <= second['open'])
+
+
+class IncrementalDetector:
+    """
+    Потоковая детекция паттернов для live-свечей
+
+    Хранит только последние MIN_CANDLES_FOR_PATTERN свечей: на каждую новую свечу
+    проверяются лишь паттерны, которые на ней заканчиваются - O(1) вместо
+    повторного прохода detect_patterns по всей истории. Результат совпадает
+    с detect_patterns по тем же свечам (индексы - порядковый номер свечи в потоке).
+    """
+
+    WINDOW_SIZE = PatternDetector.MIN_CANDLES_FOR_PATTERN
+
+    def __init__(self):
+        self._window: Deque[Dict] = deque(maxlen=self.WINDOW_SIZE)
+        self._candles_seen = 0
+
+    def on_candle(self, candle: Dict) -> List[Pattern]:
+        """
+        Добавляет свечу в поток и возвращает паттерны, заканчивающиеся на ней
+
+        Свеча с тем же timestamp, что и последняя, считается обновлением
+        текущей (незакрытой) свечи и заменяет её.
+        """
+        if self._window and self._window[-1]['timestamp'] == candle['timestamp']:
+            self._window[-1] = candle
+        else:
+            self._window.append(candle)
+            self._candles_seen += 1
+
+        if len(self._window) < self.WINDOW_SIZE:
+            return []
+
+        bits = int(detect_pattern_bits(*_candles_to_arrays(self._window))[-1])
+        if not bits:
+            return []
+
+        idx = self._candles_seen - 1
+        timestamp = datetime.fromtimestamp(candle['timestamp'] / 1000, tz=timezone.utc)
+        price = candle['close']
+        return [
+            _make_pattern(pattern_id, idx, timestamp, price)
+            for pattern_id, bit in enumerate(PATTERN_BITS.tolist())
+            if bits & bit
+        ]
 
 
 # Глобальный экземпляр детектора
 pattern_detector = PatternDetector()
-
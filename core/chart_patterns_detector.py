@@ -3,21 +3,547 @@
 Детектирует крупные формации на графике: флаги, треугольники, голова и плечи и т.д.
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter, mul
+from types import MappingProxyType
 import logging
 
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
 logger = logging.getLogger(__name__)
 
+MIN_VALID_TIMESTAMP = 946684800  # 2000-01-01 00:00:00 UTC
+MAX_DATETIME_TIMESTAMP = 253402300800  # 10000-01-01 00:00:00 UTC - предел datetime
+
+
+@lru_cache(maxsize=8192)
+def _utc_datetime(seconds: float) -> datetime:
+    """
+    datetime в UTC по проверенному timestamp в секундах
+
+    datetime неизменяем, поэтому объекты общие для всех вызовов: повторные детекции
+    по той же паре пересекаются по свечам почти полностью.
+    """
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def _between(indices: np.ndarray, prices: np.ndarray, left: int, right: int, lowest: bool) -> Optional[int]:
+    """
+    Позиция самого низкого (lowest=True) или самого высокого экстремума
+    строго между индексами свечей left и right
+
+    indices отсортированы по возрастанию, поэтому диапазон находится бинарным поиском.
+    При равных ценах возвращается первый экстремум. None - если между ними ничего нет.
+    """
+    lo = int(np.searchsorted(indices, left, side='right'))
+    hi = int(np.searchsorted(indices, right, side='left'))
+    if lo >= hi:
+        return None
+    window = prices[lo:hi]
+    return lo + int(window.argmin() if lowest else window.argmax())
+
+
+def _gap_lowest(bounds: List[int], indices: List[int], prices: List[float]) -> List[Optional[int]]:
+    """
+    Позиции самых низких экстремумов строго между соседними bounds[g] и bounds[g + 1]
+
+    Промежутки идут подряд и не пересекаются, поэтому все они обходятся одним
+    проходом двумя указателями - O(len(bounds) + len(indices)). Семантика та же,
+    что у _between: при равных ценах первый экстремум, None - если промежуток пуст.
+    """
+    result = []
+    n = len(indices)
+    t = 0
+    for g in range(len(bounds) - 1):
+        left, right = bounds[g], bounds[g + 1]
+        while t < n and indices[t] <= left:
+            t += 1
+        best = None
+        while t < n and indices[t] < right:
+            if best is None or prices[t] < prices[best]:
+                best = t
+            t += 1
+        result.append(best)
+    return result
+
+
+def _prefix_lowest(prices: np.ndarray) -> np.ndarray:
+    """
+    pos[k] - позиция самого низкого из prices[0..k] (при равных ценах - первого)
+
+    Новый минимум засекается строгим сравнением с минимумом до него, а позиция
+    последнего такого минимума протягивается вперед накопленным максимумом.
+    """
+    if len(prices) == 0:
+        return np.zeros(0, dtype=np.intp)
+    new_low = np.empty(len(prices), dtype=bool)
+    new_low[0] = True
+    new_low[1:] = prices[1:] < np.minimum.accumulate(prices)[:-1]
+    return np.maximum.accumulate(np.where(new_low, np.arange(len(prices)), 0))
+
+
+def _sparse_table(values: np.ndarray, reduce: np.ufunc) -> List[np.ndarray]:
+    """
+    Разреженная таблица для запросов минимума/максимума на отрезке за O(1)
+
+    table[k][i] = reduce(values[i:i + 2**k]), reduce - np.minimum или np.maximum.
+    """
+    table = [values]
+    step = 1
+    while 2 * step <= len(values):
+        prev = table[-1]
+        table.append(reduce(prev[:-step], prev[step:]))
+        step *= 2
+    return table
+
+
+def _range_reduce(table: List[np.ndarray], reduce: np.ufunc, lo: int, hi: int) -> float:
+    """reduce(values[lo:hi]) по разреженной таблице (отрезок непустой)"""
+    k = (hi - lo).bit_length() - 1
+    row = table[k]
+    return float(reduce(row[lo], row[hi - (1 << k)]))
+
+
+def _linreg(x: Sequence[float], y: Sequence[float]) -> Tuple[float, float]:
+    """
+    Линейная регрессия y = slope * x + intercept
+
+    Суммы накапливаются слева направо, как в исходном linear_regression:
+    векторные sum/dot складывают в другом порядке, и для горизонтальной линии
+    наклон выходит порядка 1e-14 вместо точного 0.0, а по знаку наклона
+    выбирается тип фигуры. Точек в линиях не больше десятка.
+    """
+    n = len(x)
+    sum_x = sum(x)
+    sum_y = sum(y)
+    sum_xy = sum(map(mul, x, y))
+    sum_x2 = sum(xi ** 2 for xi in x)
+    
+    denominator = n * sum_x2 - sum_x ** 2
+    if abs(denominator) < 1e-10:
+        return 0.0, sum_y / n if n > 0 else 0.0
+    
+    slope = (n * sum_xy - sum_x * sum_y) / denominator
+    intercept = (sum_y - slope * sum_x) / n
+    
+    return slope, intercept
+
+
+def _flagpole_candidates(closes: np.ndarray, first: int, pole: int, min_change: float) -> np.ndarray:
+    """
+    Индексы i в [first, len - pole), для которых |close[i + pole] / close[i] - 1| >= min_change
+
+    Изменение цены за флагшток считается одним векторным выражением для всех i.
+    """
+    n = len(closes)
+    if n - pole <= first:
+        return np.empty(0, dtype=np.int64)
+    start = closes[first:n - pole]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = (closes[first + pole:] - start) / start
+    return np.flatnonzero(np.abs(changes) >= min_change) + first
+
+
+def _suffix_linreg(x: List[float], y: List[float], max_points: int) -> List[Tuple[float, float]]:
+    """
+    Регрессии по суффиксам: fits[k] = (slope, intercept) для последних k точек
+
+    Каждый суффикс считается заново через _linreg по своему срезу - с теми же
+    суммами, что linear_regression по этим точкам. Наращивать суммы по одной
+    точке справа нельзя: другой порядок сложения дает ненулевой наклон
+    горизонтальной линии и меняет тип треугольника. Точек не больше 12.
+    """
+    fits = [(0.0, 0.0)] * min(max_points + 1, 2)
+    for n in range(2, max_points + 1):
+        fits.append(_linreg(x[-n:], y[-n:]))
+    return fits
+
+
+# Типы треугольников: (pattern_type, direction, pattern_category); 0 - не треугольник
+_TRIANGLE_KINDS = (
+    None,
+    ('ascending_triangle', 'bullish', 'continuation'),
+    ('descending_triangle', 'bearish', 'continuation'),
+    ('symmetrical_triangle', 'neutral', 'consolidation'),
+)
+
+
+def _triangle_kind_table() -> np.ndarray:
+    """
+    Таблица типа треугольника по состояниям наклонов (сопротивление, поддержка)
+
+    Состояние наклона: знак * (1, если линия горизонтальна в пределах допуска, иначе 2),
+    т.е. -2 - падает, -1/1 - горизонтальна с отрицательным/положительным наклоном,
+    0 - ровно горизонтальна, 2 - растет. Индекс в таблице - состояние + 2.
+    """
+    table = np.zeros((5, 5), dtype=np.intp)
+    for res_state in range(-2, 3):
+        for sup_state in range(-2, 3):
+            # Восходящий треугольник: горизонтальное сопротивление, восходящая поддержка
+            if abs(res_state) < 2 and sup_state > 0:
+                kind = 1
+            # Нисходящий треугольник: горизонтальная поддержка, нисходящее сопротивление
+            elif abs(sup_state) < 2 and res_state < 0:
+                kind = 2
+            # Симметричный треугольник: обе линии сходятся
+            elif res_state < 0 and sup_state > 0:
+                kind = 3
+            else:
+                kind = 0
+            table[res_state + 2, sup_state + 2] = kind
+    return table
+
+
+_TRIANGLE_KIND = _triangle_kind_table()
+
+# Направление прямоугольника по коду тренда до него
+_RECTANGLE_DIRECTIONS = ('bearish', 'neutral', 'bullish')
+
+# Прямоугольники, прошедшие проверки: одна запись на фигуру вместо словаря.
+# Все числа - float64/int, чтобы значения в словарях совпадали с поштучным расчетом
+RECTANGLE_DTYPE = np.dtype([
+    ('triple', np.intp),  # номер первого пика тройки
+    ('start_idx', np.intp),
+    ('end_idx', np.intp),
+    ('direction', np.int8),  # индекс в _RECTANGLE_DIRECTIONS
+    ('reliability', np.float64),
+    ('support', np.float64),
+    ('resistance', np.float64),
+    ('target', np.float64),
+    ('height_pct', np.float64),
+    ('resistance_slope', np.float64),
+    ('support_slope', np.float64),
+    ('trough1', np.intp),  # номера впадин среди экстремумов
+    ('trough2', np.intp),
+    ('trough3', np.intp),
+])
+
+
+def _triangle_scores(touches_resistance, touches_support, height_pct: np.ndarray,
+                     width: np.ndarray, convergence_ratio: np.ndarray) -> np.ndarray:
+    """
+    Score комбинаций линий треугольника (для выбора лучшего)
+
+    Больше касаний = лучше, больше высота = лучше, оптимальная ширина = лучше.
+    Слагаемые складываются в фиксированном порядке, поэтому score монотонен
+    по числу касаний и для оценок сверху/снизу можно подставлять границы.
+    """
+    score = touches_resistance * 0.15
+    score = score + touches_support * 0.15
+    score = score + np.minimum(height_pct * 10, 0.3)  # Максимум 0.3 за высоту
+    
+    # Оптимальная ширина (обновлено под новые минимальные требования)
+    # Предпочитаем треугольники шириной 50-150 свечей
+    score = score + np.where(
+        (50 <= width) & (width <= 150), 0.2,
+        np.where(((40 <= width) & (width < 50)) | ((150 < width) & (width <= 200)), 0.1, 0.0)
+    )
+    
+    # Бонус за хорошую сходимость (более чем в 2 раза)
+    return score + np.where(convergence_ratio < 0.5, 0.2, 0.0)
+
+
+# Поля свечи в порядке колонок CandleSeries
+_CANDLE_FIELDS = itemgetter('time', 'open', 'high', 'low', 'close')
+
+
+@dataclass(slots=True)
+class CandleSeries:
+    """Свечи в колоночном виде: параллельные массивы float64 одинаковой длины"""
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    @classmethod
+    def from_dicts(cls, candles: List[Dict]) -> 'CandleSeries':
+        """Строит колонки из списка свечей-словарей за один проход"""
+        # Значения идут потоком прямо в буфер float64, без промежуточного списка кортежей
+        values = chain.from_iterable(map(_CANDLE_FIELDS, candles))
+        rows = np.fromiter(values, dtype=np.float64, count=5 * len(candles))
+        return cls(*np.ascontiguousarray(rows.reshape(len(candles), 5).T))
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+
+@dataclass(slots=True)
+class Extrema:
+    """Строгие экстремумы ряда: индексы свечей и цены пиков (high) и впадин (low)"""
+    peak_idx: np.ndarray
+    peak_price: np.ndarray
+    trough_idx: np.ndarray
+    trough_price: np.ndarray
+    # Записи-словари для публичного API, строятся по запросу
+    records: Optional[Tuple[List[Dict], List[Dict]]] = None
+
+
+def _strict_extrema_masks(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    lookback: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Маски строгих экстремумов в окне [i - lookback, i + lookback]
+
+    Пик - свеча, high которой строго больше high всех соседей в окне,
+    впадина - свеча, low которой строго меньше low всех соседей.
+    Маски имеют длину len(highs), края (первые/последние lookback свечей) - False.
+    """
+    n = len(highs)
+    if lookback < 1:
+        # Пустое окно: каждая свеча - экстремум
+        return np.ones(n, dtype=bool), np.ones(n, dtype=bool)
+    is_peak = np.zeros(n, dtype=bool)
+    is_trough = np.zeros(n, dtype=bool)
+    if n < 2 * lookback + 1:
+        return is_peak, is_trough
+
+    # Соседи слева и справа считаются отдельно, чтобы центр не участвовал в сравнении
+    high_windows = sliding_window_view(highs, lookback)
+    low_windows = sliding_window_view(lows, lookback)
+    high_side_max = high_windows.max(axis=1)
+    low_side_min = low_windows.min(axis=1)
+
+    center = slice(lookback, n - lookback)
+    left = slice(0, n - 2 * lookback)
+    right = slice(lookback + 1, n - lookback + 1)
+
+    is_peak[center] = (highs[center] > high_side_max[left]) & (highs[center] > high_side_max[right])
+    is_trough[center] = (lows[center] < low_side_min[left]) & (lows[center] < low_side_min[right])
+    return is_peak, is_trough
+
+
+@dataclass(slots=True)
+class _Ctx:
+    """Производные массивы одного списка свечей, общие для всех детекторов"""
+    candles: List[Dict]
+    series: CandleSeries
+    # Строгие экстремумы относительно соседних свечей (консолидация флагов и вымпелов)
+    is_peak1: np.ndarray
+    is_trough1: np.ndarray
+    # Префиксные суммы масок: число экстремумов в [a, b) = cum[b] - cum[a]
+    peak1_cum: np.ndarray
+    trough1_cum: np.ndarray
+    # datetime свечей, конвертируются по запросу (None - еще не запрашивалась)
+    times_dt: List[Optional[datetime]]
+    # timestamp свечей в секундах, если все они прошли проверку (иначе None)
+    times_s: Optional[List[float]]
+    # Экстремумы по размеру окна (локальные и swing-экстремумы с одинаковым окном совпадают)
+    extrema: Dict[int, Extrema] = field(default_factory=dict)
+    # Разреженные таблицы min/max по low (строятся при первом запросе)
+    lows_min: Optional[List[np.ndarray]] = None
+    lows_max: Optional[List[np.ndarray]] = None
+
+    @classmethod
+    def build(cls, candles: List[Dict]) -> '_Ctx':
+        """Строит колонки и маски соседних экстремумов; остальное заполняется по запросу"""
+        series = CandleSeries.from_dicts(candles)
+        is_peak1, is_trough1 = _strict_extrema_masks(series.high, series.low, 1)
+        peak1_cum = np.concatenate(([0], np.cumsum(is_peak1)))
+        trough1_cum = np.concatenate(([0], np.cumsum(is_trough1)))
+        
+        # Проверка и приведение миллисекунд к секундам - теми же правилами, что в
+        # _safe_timestamp_to_datetime, но одним проходом по колонке
+        times = series.time
+        seconds = np.where(times > 1e10, times / 1000, times)
+        times_s = None
+        if np.all(times >= MIN_VALID_TIMESTAMP) and np.all(seconds < MAX_DATETIME_TIMESTAMP):
+            times_s = seconds.tolist()
+        
+        return cls(
+            candles, series, is_peak1, is_trough1, peak1_cum, trough1_cum,
+            [None] * len(candles), times_s
+        )
+
+    def matches(self, candles: List[Dict]) -> bool:
+        """
+        Построен ли контекст по этому же списку свечей в его текущем состоянии
+
+        Помимо identity и длины сверяется последняя свеча: список, обновленный
+        на месте (закрылась текущая свеча, окно сдвинулось), не должен получать
+        закэшированные экстремумы старых данных.
+        """
+        if self.candles is not candles or len(self.series) != len(candles):
+            return False
+        if not candles:
+            return True
+        last = candles[-1]
+        return (
+            self.series.time[-1] == last['time']
+            and self.series.close[-1] == last['close']
+            and self.series.high[-1] == last['high']
+            and self.series.low[-1] == last['low']
+        )
+
+
+def _refine_extrema(values: np.ndarray, candidates: np.ndarray, lookback: int, maximum: bool) -> np.ndarray:
+    """
+    Отбирает из кандидатов строгие экстремумы окна [i - lookback, i + lookback]
+
+    Кандидаты - строгие экстремумы относительно соседних свечей: любой строгий
+    экстремум более широкого окна является и им, поэтому окно проверяется только
+    для них (тот же прием, что в scipy.signal.find_peaks - сначала локальные
+    максимумы, затем фильтр по окрестности).
+    """
+    n = len(values)
+    if lookback < 1:
+        return np.arange(n)
+    idx = np.flatnonzero(candidates)
+    idx = idx[(idx >= lookback) & (idx < n - lookback)]
+    if lookback <= 1 or not len(idx):
+        return idx
+
+    windows = sliding_window_view(values, 2 * lookback + 1)[idx - lookback]
+    neighbours = np.delete(windows, lookback, axis=1)
+    if maximum:
+        keep = values[idx] > neighbours.max(axis=1)
+    else:
+        keep = values[idx] < neighbours.min(axis=1)
+    return idx[keep]
+
 
 class ChartPatternDetector:
     """Детектор ценовых фигур на основе уровней поддержки/сопротивления"""
     
+    # Минимальные требования для треугольника (по таймфреймам)
+    TRIANGLE_MIN_CANDLES = MappingProxyType({
+        '15m': 200,  # ~2 дня
+        '1h': 200,   # ~8 дней
+        '4h': 150    # ~25 дней
+    })
+    # Используем swing-экстремумы вместо локальных
+    TRIANGLE_SWING_PERIOD = MappingProxyType({
+        '15m': 7,
+        '1h': 5,
+        '4h': 4
+    })
+    # Минимальная ширина треугольника (в свечах)
+    # Согласно классической литературе по техническому анализу:
+    # - Треугольники должны формироваться минимум на 20-30 свечах
+    # - Для более надежных треугольников рекомендуется 50-100 свечей
+    # - Увеличиваем минимальную ширину для более значимых фигур
+    TRIANGLE_MIN_WIDTH = MappingProxyType({
+        '15m': 60,   # ~1.5 дня (увеличено с 40)
+        '1h': 50,    # ~2 дня (увеличено с 30)
+        '4h': 30     # ~5 дней (увеличено с 20)
+    })
+    
+    # Те же бонусы надежности, что в _calculate_reliability, в виде ступеней для
+    # np.searchsorted: bonus[k], где k - число пройденных порогов.
+    # Тип порогов совпадает с типом входных массивов (float64 и intp индексов
+    # свечей), поэтому searchsorted не приводит типы при каждом вызове
+    # Высота: > 2% -> +0.1, > 3% -> +0.2
+    RELIABILITY_HEIGHT_STEPS = np.array([0.02, 0.03], dtype=np.float64)
+    RELIABILITY_HEIGHT_BONUS = np.array([0.0, 0.1, 0.2], dtype=np.float64)
+    # Симметрия: < 0.005 -> +0.15, < 0.01 -> +0.1
+    RELIABILITY_SYMMETRY_STEPS = np.array([0.005, 0.01], dtype=np.float64)
+    RELIABILITY_SYMMETRY_BONUS = np.array([0.15, 0.1, 0.0], dtype=np.float64)
+    # Ширина: 30-100 свечей -> +0.15, 20-29 и 101-150 -> +0.1
+    RELIABILITY_WIDTH_STEPS = np.array([20, 30, 101, 151], dtype=np.intp)
+    RELIABILITY_WIDTH_BONUS = np.array([0.0, 0.1, 0.15, 0.1, 0.0], dtype=np.float64)
+    
     def __init__(self):
         self.min_pattern_candles = 20  # Минимум свечей для фигуры
         self.max_pattern_candles = 200  # Максимум свечей
         self.tolerance = 0.002  # 0.2% толерантность для уровней
         self.min_pattern_height_pct = 0.01  # Минимум 1% высоты фигуры
+        # Контекст последнего списка свечей (колонки, маски, экстремумы)
+        self._ctx: Optional[_Ctx] = None
+    
+    def _get_ctx(self, candles: List[Dict]) -> _Ctx:
+        """
+        Возвращает контекст для списка свечей
+
+        В detect_all_patterns контекст строится один раз и переиспользуется
+        всеми детекторами; при прямом вызове детекторов подряд на одном списке
+        свечей он тоже переиспользуется, пока список не изменился.
+        """
+        ctx = self._ctx
+        if ctx is None or not ctx.matches(candles):
+            ctx = self._ctx = _Ctx.build(candles)
+        return ctx
+    
+    def _candle_datetime(self, candles: List[Dict], i: int) -> datetime:
+        """
+        datetime свечи i в UTC
+
+        Каждый timestamp конвертируется не более одного раза на список свечей:
+        фигуры разных детекторов многократно ссылаются на одни и те же свечи.
+        Если вся колонка времени уже проверена при построении контекста,
+        остается только сама конвертация; иначе - проверка по одной свече.
+        """
+        ctx = self._get_ctx(candles)
+        dt = ctx.times_dt[i]
+        if dt is None:
+            if ctx.times_s is not None:
+                dt = _utc_datetime(ctx.times_s[i])
+            else:
+                dt = self._safe_timestamp_to_datetime(candles[i]['time'])
+            ctx.times_dt[i] = dt
+        return dt
+    
+    def _find_extrema(self, candles: List[Dict], lookback: int) -> Extrema:
+        """Строгие экстремумы в окне lookback в колоночном виде (кэшируются по окну)"""
+        ctx = self._get_ctx(candles)
+        extrema = ctx.extrema.get(lookback)
+        if extrema is not None:
+            return extrema
+        
+        series = ctx.series
+        peak_idx = _refine_extrema(series.high, ctx.is_peak1, lookback, maximum=True)
+        trough_idx = _refine_extrema(series.low, ctx.is_trough1, lookback, maximum=False)
+        extrema = Extrema(peak_idx, series.high[peak_idx], trough_idx, series.low[trough_idx])
+        ctx.extrema[lookback] = extrema
+        return extrema
+    
+    @staticmethod
+    def _consolidation_candidates(ctx: _Ctx) -> np.ndarray:
+        """
+        Начала флагштоков (флаги и вымпелы), после которых возможна консолидация
+
+        Флагшток - 20 свечей с движением >= 2%, консолидация - следующие до 30 свечей
+        (минимум 5), внутри которой нужно минимум 2 пика и 2 впадины относительно
+        соседних свечей. Число экстремумов в окне считается по префиксным суммам
+        сразу для всех кандидатов, поэтому окна без шансов отсеиваются до цикла.
+        """
+        n = len(ctx.series)
+        starts = _flagpole_candidates(ctx.series.close, 10, 20, 0.02)
+        window_start = starts + 21
+        window_end = np.minimum(window_start + 30, n - 1)
+        
+        # Крайние свечи окна не проверяются - у них нет соседа внутри окна
+        inner_lo = np.minimum(window_start + 1, n)
+        inner_hi = np.clip(window_end, 0, n)
+        peaks = ctx.peak1_cum[inner_hi] - ctx.peak1_cum[inner_lo]
+        troughs = ctx.trough1_cum[inner_hi] - ctx.trough1_cum[inner_lo]
+        
+        keep = (window_end - window_start >= 5) & (peaks >= 2) & (troughs >= 2)
+        return starts[keep]
+    
+    @staticmethod
+    def _peak_record(candles: List[Dict], i: int) -> Dict:
+        """Запись пика в формате публичного API"""
+        return {'index': i, 'time': candles[i]['time'], 'price': candles[i]['high'], 'candle': candles[i]}
+    
+    @staticmethod
+    def _trough_record(candles: List[Dict], i: int) -> Dict:
+        """Запись впадины в формате публичного API"""
+        return {'index': i, 'time': candles[i]['time'], 'price': candles[i]['low'], 'candle': candles[i]}
+    
+    def _extrema_records(self, candles: List[Dict], extrema: Extrema) -> Tuple[List[Dict], List[Dict]]:
+        """Записи-словари пиков и впадин (строятся один раз на экстремумы)"""
+        if extrema.records is None:
+            peaks = [self._peak_record(candles, i) for i in extrema.peak_idx.tolist()]
+            troughs = [self._trough_record(candles, i) for i in extrema.trough_idx.tolist()]
+            extrema.records = (peaks, troughs)
+        return extrema.records
     
     def _safe_timestamp_to_datetime(self, timestamp: float) -> datetime:
         """
@@ -41,7 +567,6 @@ class ChartPatternDetector:
             raise ValueError(f"Некорректный timestamp: {timestamp} (должен быть > 0)")
         
         # Проверяем, что timestamp не слишком старый (до 2000 года считается некорректным)
-        MIN_VALID_TIMESTAMP = 946684800  # 2000-01-01 00:00:00 UTC
         if timestamp < MIN_VALID_TIMESTAMP:
             raise ValueError(f"Некорректный timestamp: {timestamp} (слишком старый, до 2000 года)")
         
@@ -77,6 +602,15 @@ class ChartPatternDetector:
         patterns = []
         
         try:
+            # Колонки, маски и экстремумы строятся один раз и переиспользуются всеми детекторами.
+            # Здесь же проверяются входные данные: отсутствующие поля дают KeyError при построении
+            # колонок, некорректные timestamp отсекаются сразу, а не внутри отдельного детектора.
+            self._ctx = _Ctx.build(candles)
+            times = self._ctx.series.time
+            if not np.all(times >= MIN_VALID_TIMESTAMP):
+                bad = int(np.flatnonzero(~(times >= MIN_VALID_TIMESTAMP))[0])
+                raise ValueError(f"Некорректный timestamp свечи {bad}: {candles[bad]['time']}")
+            
             # 1. Разворотные фигуры
             patterns.extend(self.detect_head_and_shoulders(candles, symbol, timeframe))
             patterns.extend(self.detect_double_top(candles, symbol, timeframe))
@@ -93,7 +627,9 @@ class ChartPatternDetector:
             patterns.extend(self.detect_rectangles(candles, symbol, timeframe))
             
         except Exception as e:
-            logger.error(f"Ошибка детекции фигур для {symbol} {timeframe}: {e}", exc_info=True)
+            logger.error("Ошибка детекции фигур для %s %s: %s", symbol, timeframe, e, exc_info=True)
+        finally:
+            self._ctx = None
         
         # Убеждаемся, что каждая фигура имеет symbol и timeframe
         for pattern in patterns:
@@ -115,41 +651,7 @@ class ChartPatternDetector:
         Returns:
             (peaks, troughs) - списки пиков и впадин
         """
-        peaks = []
-        troughs = []
-        
-        for i in range(lookback, len(candles) - lookback):
-            # Проверка на локальный максимум
-            is_peak = True
-            for j in range(i - lookback, i + lookback + 1):
-                if j != i and candles[j]['high'] >= candles[i]['high']:
-                    is_peak = False
-                    break
-            
-            if is_peak:
-                peaks.append({
-                    'index': i,
-                    'time': candles[i]['time'],
-                    'price': candles[i]['high'],
-                    'candle': candles[i]
-                })
-            
-            # Проверка на локальный минимум
-            is_trough = True
-            for j in range(i - lookback, i + lookback + 1):
-                if j != i and candles[j]['low'] <= candles[i]['low']:
-                    is_trough = False
-                    break
-            
-            if is_trough:
-                troughs.append({
-                    'index': i,
-                    'time': candles[i]['time'],
-                    'price': candles[i]['low'],
-                    'candle': candles[i]
-                })
-        
-        return peaks, troughs
+        return self._extrema_records(candles, self._find_extrema(candles, lookback))
     
     def find_swing_extrema(self, candles: List[Dict], swing_period: int = 7) -> Tuple[List[Dict], List[Dict]]:
         """
@@ -164,41 +666,7 @@ class ChartPatternDetector:
         Returns:
             (swing_highs, swing_lows) - списки swing-пиков и swing-впадин
         """
-        swing_highs = []
-        swing_lows = []
-        
-        for i in range(swing_period, len(candles) - swing_period):
-            # Проверка на swing-high
-            is_swing_high = True
-            for j in range(i - swing_period, i + swing_period + 1):
-                if j != i and candles[j]['high'] >= candles[i]['high']:
-                    is_swing_high = False
-                    break
-            
-            if is_swing_high:
-                swing_highs.append({
-                    'index': i,
-                    'time': candles[i]['time'],
-                    'price': candles[i]['high'],
-                    'candle': candles[i]
-                })
-            
-            # Проверка на swing-low
-            is_swing_low = True
-            for j in range(i - swing_period, i + swing_period + 1):
-                if j != i and candles[j]['low'] <= candles[i]['low']:
-                    is_swing_low = False
-                    break
-            
-            if is_swing_low:
-                swing_lows.append({
-                    'index': i,
-                    'time': candles[i]['time'],
-                    'price': candles[i]['low'],
-                    'candle': candles[i]
-                })
-        
-        return swing_highs, swing_lows
+        return self._extrema_records(candles, self._find_extrema(candles, swing_period))
     
     def linear_regression(self, points: List[Dict]) -> Tuple[float, float]:
         """
@@ -214,20 +682,7 @@ class ChartPatternDetector:
         if len(points) < 2:
             return 0.0, 0.0
         
-        n = len(points)
-        sum_x = sum(p['index'] for p in points)
-        sum_y = sum(p['price'] for p in points)
-        sum_xy = sum(p['index'] * p['price'] for p in points)
-        sum_x2 = sum(p['index'] ** 2 for p in points)
-        
-        denominator = n * sum_x2 - sum_x ** 2
-        if abs(denominator) < 1e-10:
-            return 0.0, sum_y / n if n > 0 else 0.0
-        
-        slope = (n * sum_xy - sum_x * sum_y) / denominator
-        intercept = (sum_y - slope * sum_x) / n
-        
-        return slope, intercept
+        return _linreg([p['index'] for p in points], [p['price'] for p in points])
     
     def detect_head_and_shoulders(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Dict]:
         """
@@ -241,228 +696,239 @@ class ChartPatternDetector:
         5. Вычислить целевую цену
         """
         patterns = []
-        
-        try:
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(peaks) < 3:
-                return patterns
-            
-            # Ищем три последовательных пика
-            for i in range(len(peaks) - 2):
-                left_shoulder = peaks[i]
-                head = peaks[i + 1]
-                right_shoulder = peaks[i + 2]
-                
-                # Проверка условий Head and Shoulders
-                head_price = head['price']
-                left_price = left_shoulder['price']
-                right_price = right_shoulder['price']
-                
-                # Голова должна быть выше обоих плеч
-                if head_price <= left_price or head_price <= right_price:
-                    continue
-                
-                # Плечи должны быть примерно на одном уровне (разница < 2%)
-                shoulder_diff = abs(left_price - right_price) / head_price
-                if shoulder_diff > 0.02:
-                    continue
-                
-                # Найти линию шеи (минимумы между пиками)
-                neckline_candles = candles[left_shoulder['index']:right_shoulder['index'] + 1]
-                if not neckline_candles:
-                    continue
-                
-                neckline_low = min(c['low'] for c in neckline_candles)
-                neckline_high = max(c['low'] for c in neckline_candles)
-                
-                # Линия шеи должна быть относительно горизонтальной
-                if (neckline_high - neckline_low) / neckline_low > 0.01:
-                    continue
-                
-                neckline = (neckline_low + neckline_high) / 2
-                
-                # Вычислить целевую цену
-                pattern_height = head_price - neckline
-                target_price = neckline - pattern_height
-                
-                # Проверка минимальной высоты фигуры
-                pattern_height_pct = pattern_height / head_price
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                # Вычислить надежность
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    shoulder_diff,
-                    len(candles[left_shoulder['index']:right_shoulder['index']])
-                )
-                
-                patterns.append({
-                    'pattern_type': 'head_and_shoulders',
-                    'pattern_category': 'reversal',
-                    'direction': 'bearish',
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(left_shoulder['time']),
-                    'end_time': self._safe_timestamp_to_datetime(right_shoulder['time']),
-                    'support_level': neckline,
-                    'resistance_level': head_price,
-                    'neckline': neckline,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': right_shoulder['index'] - left_shoulder['index'],
-                    'candles_count': right_shoulder['index'] - left_shoulder['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'left_shoulder': left_shoulder,
-                        'head': head,
-                        'right_shoulder': right_shoulder,
-                        'neckline': neckline
-                    }
-                })
-        
-        except Exception as e:
-            logger.error(f"Ошибка детекции Head and Shoulders для {symbol}: {e}", exc_info=True)
+        min_height = self.min_pattern_height_pct
+        
+        extrema = self._find_extrema(candles, lookback=5)
+        peak_idx = extrema.peak_idx.tolist()
+        peak_price = extrema.peak_price.tolist()
+        
+        if len(peak_idx) < 3:
+            return patterns
+        
+        # Дешевые условия проверяются сразу для всех троек последовательных пиков:
+        # голова выше обоих плеч, плечи примерно на одном уровне (разница < 2%)
+        prices = extrema.peak_price
+        left, head, right = prices[:-2], prices[1:-1], prices[2:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shoulder_diffs = np.abs(left - right) / head
+        candidates = (head > left) & (head > right) & ~(shoulder_diffs > 0.02)
+        
+        # Ранний отсев по оценке высоты сверху (до построения линии шеи).
+        # Линия шеи - середина [min, max] low между плечами. Для горизонтальной шеи
+        # min >= max / 1.01, а max не меньше low любой из трех пиковых свечей, поэтому
+        # neckline >= L * (1 + 1/1.01) / 2, где L - наибольший low среди трех пиковых свечей.
+        # Если даже при такой шее высота меньше минимальной - фигура будет отвергнута
+        # в любом случае (по шее или по высоте). Запас 1e-9 защищает от ошибок округления.
+        ctx = self._get_ctx(candles)
+        peak_lows = ctx.series.low[extrema.peak_idx]
+        neckline_floor = np.maximum(np.maximum(peak_lows[:-2], peak_lows[1:-1]), peak_lows[2:])
+        neckline_floor *= (1 + 1 / 1.01) / 2 * (1 - 1e-9)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_height_pct = (head - neckline_floor) / head
+        candidates &= ~(max_height_pct < min_height)
+        
+        candidates = np.flatnonzero(candidates)
+        if not len(candidates):
+            return patterns
+        
+        # Минимум/максимум low на отрезке между плечами - за O(1) на тройку пиков
+        if ctx.lows_min is None:
+            ctx.lows_min = _sparse_table(ctx.series.low, np.minimum)
+            ctx.lows_max = _sparse_table(ctx.series.low, np.maximum)
+        lows_min = ctx.lows_min
+        lows_max = ctx.lows_max
+        
+        for i in candidates.tolist():
+            left_index = peak_idx[i]
+            right_index = peak_idx[i + 2]
+            head_price = peak_price[i + 1]
+            shoulder_diff = abs(peak_price[i] - peak_price[i + 2]) / head_price
+            
+            # Найти линию шеи (минимумы между пиками)
+            neck_lo = left_index
+            neck_hi = right_index + 1
+            if neck_hi <= neck_lo:
+                continue
+            
+            neckline_low = _range_reduce(lows_min, np.minimum, neck_lo, neck_hi)
+            neckline_high = _range_reduce(lows_max, np.maximum, neck_lo, neck_hi)
+            
+            # Линия шеи должна быть относительно горизонтальной
+            if (neckline_high - neckline_low) / neckline_low > 0.01:
+                continue
+            
+            neckline = (neckline_low + neckline_high) / 2
+            
+            # Вычислить целевую цену
+            pattern_height = head_price - neckline
+            target_price = neckline - pattern_height
+            
+            # Проверка минимальной высоты фигуры
+            pattern_height_pct = pattern_height / head_price
+            if pattern_height_pct < min_height:
+                continue
+            
+            # Вычислить надежность
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                shoulder_diff,
+                right_index - left_index
+            )
+            
+            patterns.append({
+                'pattern_type': 'head_and_shoulders',
+                'pattern_category': 'reversal',
+                'direction': 'bearish',
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, left_index),
+                'end_time': self._candle_datetime(candles, right_index),
+                'support_level': neckline,
+                'resistance_level': head_price,
+                'neckline': neckline,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': right_index - left_index,
+                'candles_count': right_index - left_index + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'left_shoulder': self._peak_record(candles, left_index),
+                    'head': self._peak_record(candles, peak_idx[i + 1]),
+                    'right_shoulder': self._peak_record(candles, right_index),
+                    'neckline': neckline
+                }
+            })
         
         return patterns
     
     def detect_double_top(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Dict]:
         """Детектирует фигуру 'Двойная вершина'"""
         patterns = []
+        min_height = self.min_pattern_height_pct
         
-        try:
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(peaks) < 2:
-                return patterns
-            
-            # Ищем две вершины примерно на одном уровне
-            for i in range(len(peaks) - 1):
-                peak1 = peaks[i]
-                peak2 = peaks[i + 1]
-                
-                # Проверка уровня вершин (разница < 1%)
-                price_diff = abs(peak1['price'] - peak2['price']) / peak1['price']
-                if price_diff > 0.01:
-                    continue
-                
-                # Найти минимум между вершинами (линия шеи)
-                trough_between = None
-                for trough in troughs:
-                    if peak1['index'] < trough['index'] < peak2['index']:
-                        if trough_between is None or trough['price'] < trough_between['price']:
-                            trough_between = trough
-                
-                if not trough_between:
-                    continue
-                
-                neckline = trough_between['price']
-                
-                # Вычислить целевую цену
-                pattern_height = peak1['price'] - neckline
-                target_price = neckline - pattern_height
-                
-                # Проверка минимальной высоты
-                pattern_height_pct = pattern_height / peak1['price']
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                reliability = self._calculate_reliability(pattern_height_pct, price_diff, peak2['index'] - peak1['index'])
-                
-                patterns.append({
-                    'pattern_type': 'double_top',
-                    'pattern_category': 'reversal',
-                    'direction': 'bearish',
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(peak1['time']),
-                    'end_time': self._safe_timestamp_to_datetime(peak2['time']),
-                    'support_level': neckline,
-                    'resistance_level': peak1['price'],
-                    'neckline': neckline,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': peak2['index'] - peak1['index'],
-                    'candles_count': peak2['index'] - peak1['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'peak1': peak1,
-                        'peak2': peak2,
-                        'trough': trough_between
-                    }
-                })
+        extrema = self._find_extrema(candles, lookback=5)
+        peak_idx = extrema.peak_idx.tolist()
+        peak_price = extrema.peak_price.tolist()
         
-        except Exception as e:
-            logger.error(f"Ошибка детекции Double Top для {symbol}: {e}", exc_info=True)
+        if len(peak_idx) < 2:
+            return patterns
+        
+        # Ищем две вершины примерно на одном уровне
+        for i in range(len(peak_idx) - 1):
+            index1 = peak_idx[i]
+            index2 = peak_idx[i + 1]
+            price1 = peak_price[i]
+            
+            # Проверка уровня вершин (разница < 1%)
+            price_diff = abs(price1 - peak_price[i + 1]) / price1
+            if price_diff > 0.01:
+                continue
+            
+            # Найти минимум между вершинами (линия шеи)
+            pos = _between(extrema.trough_idx, extrema.trough_price, index1, index2, lowest=True)
+            if pos is None:
+                continue
+            
+            trough_index = int(extrema.trough_idx[pos])
+            neckline = float(extrema.trough_price[pos])
+            
+            # Вычислить целевую цену
+            pattern_height = price1 - neckline
+            target_price = neckline - pattern_height
+            
+            # Проверка минимальной высоты
+            pattern_height_pct = pattern_height / price1
+            if pattern_height_pct < min_height:
+                continue
+            
+            reliability = self._calculate_reliability(pattern_height_pct, price_diff, index2 - index1)
+            
+            patterns.append({
+                'pattern_type': 'double_top',
+                'pattern_category': 'reversal',
+                'direction': 'bearish',
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, index1),
+                'end_time': self._candle_datetime(candles, index2),
+                'support_level': neckline,
+                'resistance_level': price1,
+                'neckline': neckline,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': index2 - index1,
+                'candles_count': index2 - index1 + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'peak1': self._peak_record(candles, index1),
+                    'peak2': self._peak_record(candles, index2),
+                    'trough': self._trough_record(candles, trough_index)
+                }
+            })
         
         return patterns
     
     def detect_double_bottom(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Dict]:
         """Детектирует фигуру 'Двойное дно'"""
         patterns = []
+        min_height = self.min_pattern_height_pct
         
-        try:
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(troughs) < 2:
-                return patterns
-            
-            # Ищем два минимума примерно на одном уровне
-            for i in range(len(troughs) - 1):
-                trough1 = troughs[i]
-                trough2 = troughs[i + 1]
-                
-                # Проверка уровня минимумов (разница < 1%)
-                price_diff = abs(trough1['price'] - trough2['price']) / trough1['price']
-                if price_diff > 0.01:
-                    continue
-                
-                # Найти максимум между минимумами (линия шеи)
-                peak_between = None
-                for peak in peaks:
-                    if trough1['index'] < peak['index'] < trough2['index']:
-                        if peak_between is None or peak['price'] > peak_between['price']:
-                            peak_between = peak
-                
-                if not peak_between:
-                    continue
-                
-                neckline = peak_between['price']
-                
-                # Вычислить целевую цену
-                pattern_height = neckline - trough1['price']
-                target_price = neckline + pattern_height
-                
-                # Проверка минимальной высоты
-                pattern_height_pct = pattern_height / trough1['price']
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                reliability = self._calculate_reliability(pattern_height_pct, price_diff, trough2['index'] - trough1['index'])
-                
-                patterns.append({
-                    'pattern_type': 'double_bottom',
-                    'pattern_category': 'reversal',
-                    'direction': 'bullish',
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(trough1['time']),
-                    'end_time': self._safe_timestamp_to_datetime(trough2['time']),
-                    'support_level': trough1['price'],
-                    'resistance_level': neckline,
-                    'neckline': neckline,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': trough2['index'] - trough1['index'],
-                    'candles_count': trough2['index'] - trough1['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'trough1': trough1,
-                        'trough2': trough2,
-                        'peak': peak_between
-                    }
-                })
+        extrema = self._find_extrema(candles, lookback=5)
+        trough_idx = extrema.trough_idx.tolist()
+        trough_price = extrema.trough_price.tolist()
         
-        except Exception as e:
-            logger.error(f"Ошибка детекции Double Bottom для {symbol}: {e}", exc_info=True)
+        if len(trough_idx) < 2:
+            return patterns
+        
+        # Ищем два минимума примерно на одном уровне
+        for i in range(len(trough_idx) - 1):
+            index1 = trough_idx[i]
+            index2 = trough_idx[i + 1]
+            price1 = trough_price[i]
+            
+            # Проверка уровня минимумов (разница < 1%)
+            price_diff = abs(price1 - trough_price[i + 1]) / price1
+            if price_diff > 0.01:
+                continue
+            
+            # Найти максимум между минимумами (линия шеи)
+            pos = _between(extrema.peak_idx, extrema.peak_price, index1, index2, lowest=False)
+            if pos is None:
+                continue
+            
+            peak_index = int(extrema.peak_idx[pos])
+            neckline = float(extrema.peak_price[pos])
+            
+            # Вычислить целевую цену
+            pattern_height = neckline - price1
+            target_price = neckline + pattern_height
+            
+            # Проверка минимальной высоты
+            pattern_height_pct = pattern_height / price1
+            if pattern_height_pct < min_height:
+                continue
+            
+            reliability = self._calculate_reliability(pattern_height_pct, price_diff, index2 - index1)
+            
+            patterns.append({
+                'pattern_type': 'double_bottom',
+                'pattern_category': 'reversal',
+                'direction': 'bullish',
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, index1),
+                'end_time': self._candle_datetime(candles, index2),
+                'support_level': price1,
+                'resistance_level': neckline,
+                'neckline': neckline,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': index2 - index1,
+                'candles_count': index2 - index1 + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'trough1': self._trough_record(candles, index1),
+                    'trough2': self._trough_record(candles, index2),
+                    'peak': self._peak_record(candles, peak_index)
+                }
+            })
         
         return patterns
     
@@ -477,112 +943,91 @@ class ChartPatternDetector:
         4. Определить направление: если флагшток вверх → пробой вверх
         """
         patterns = []
-        
-        try:
-            if len(candles) < 30:
-                return patterns
-            
-            # Ищем резкие движения (флагштоки)
-            for i in range(10, len(candles) - 20):
-                # Проверяем движение вверх (бычий флаг)
-                flagpole_start = i
-                flagpole_end = min(i + 20, len(candles) - 1)
-                
-                # Вычисляем изменение цены за флагшток
-                start_price = candles[flagpole_start]['close']
-                end_price = candles[flagpole_end]['close']
-                price_change = (end_price - start_price) / start_price
-                
-                # Флагшток должен быть минимум 2%
-                if abs(price_change) < 0.02:
-                    continue
-                
-                direction = 'bullish' if price_change > 0 else 'bearish'
-                
-                # Ищем консолидацию после флагштока (флаг)
-                consolidation_start = flagpole_end + 1
-                consolidation_end = min(consolidation_start + 30, len(candles) - 1)
-                
-                if consolidation_end - consolidation_start < 5:
-                    continue
-                
-                # Получаем свечи консолидации
-                consolidation_candles = candles[consolidation_start:consolidation_end + 1]
-                
-                # Находим локальные максимумы и минимумы в консолидации
-                consolidation_peaks = []
-                consolidation_troughs = []
-                
-                for j in range(1, len(consolidation_candles) - 1):
-                    if consolidation_candles[j]['high'] > consolidation_candles[j-1]['high'] and \
-                       consolidation_candles[j]['high'] > consolidation_candles[j+1]['high']:
-                        consolidation_peaks.append({
-                            'index': consolidation_start + j,
-                            'price': consolidation_candles[j]['high']
-                        })
-                    if consolidation_candles[j]['low'] < consolidation_candles[j-1]['low'] and \
-                       consolidation_candles[j]['low'] < consolidation_candles[j+1]['low']:
-                        consolidation_troughs.append({
-                            'index': consolidation_start + j,
-                            'price': consolidation_candles[j]['low']
-                        })
-                
-                # Нужно минимум 2 пика и 2 впадины для параллельных линий
-                if len(consolidation_peaks) < 2 or len(consolidation_troughs) < 2:
-                    continue
-                
-                # Проверяем параллельность линий (разница наклона < 0.5%)
-                # Вычисляем средние уровни поддержки и сопротивления
-                avg_resistance = sum(p['price'] for p in consolidation_peaks) / len(consolidation_peaks)
-                avg_support = sum(t['price'] for t in consolidation_troughs) / len(consolidation_troughs)
-                
-                # Проверяем, что линии примерно параллельны (вариация < 1%)
-                resistance_variance = max(p['price'] for p in consolidation_peaks) - min(p['price'] for p in consolidation_peaks)
-                support_variance = max(t['price'] for t in consolidation_troughs) - min(t['price'] for t in consolidation_troughs)
-                
-                if resistance_variance / avg_resistance > 0.01 or support_variance / avg_support > 0.01:
-                    continue
-                
-                # Вычисляем целевую цену (высота флагштока)
-                flagpole_height = abs(end_price - start_price)
-                target_price = avg_resistance + flagpole_height if direction == 'bullish' else avg_support - flagpole_height
-                
-                pattern_height_pct = (avg_resistance - avg_support) / avg_support
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    max(resistance_variance / avg_resistance, support_variance / avg_support),
-                    consolidation_end - consolidation_start
-                )
-                
-                patterns.append({
-                    'pattern_type': 'flag',
-                    'pattern_category': 'continuation',
-                    'direction': direction,
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(candles[flagpole_start]['time']),
-                    'end_time': self._safe_timestamp_to_datetime(candles[consolidation_end]['time']),
-                    'support_level': avg_support,
-                    'resistance_level': avg_resistance,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': consolidation_end - consolidation_start,
-                    'candles_count': consolidation_end - flagpole_start + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'flagpole_start': flagpole_start,
-                        'flagpole_end': flagpole_end,
-                        'consolidation_start': consolidation_start,
-                        'consolidation_end': consolidation_end,
-                        'peaks': consolidation_peaks,
-                        'troughs': consolidation_troughs
-                    }
-                })
-        
-        except Exception as e:
-            logger.error(f"Ошибка детекции Flag для {symbol}: {e}", exc_info=True)
+        min_height = self.min_pattern_height_pct
+        
+        if len(candles) < 30:
+            return patterns
+        
+        # Строгие локальные экстремумы относительно соседних свечей - один раз на весь ряд
+        ctx = self._get_ctx(candles)
+        series = ctx.series
+        closes = series.close
+        is_peak, is_trough = ctx.is_peak1, ctx.is_trough1
+        
+        # Ищем резкие движения (флагштоки), после которых возможна консолидация
+        for i in self._consolidation_candidates(ctx).tolist():
+            # Проверяем движение вверх (бычий флаг)
+            flagpole_start = i
+            flagpole_end = min(i + 20, len(candles) - 1)
+            
+            # Вычисляем изменение цены за флагшток
+            start_price = float(closes[flagpole_start])
+            end_price = float(closes[flagpole_end])
+            price_change = (end_price - start_price) / start_price
+            
+            direction = 'bullish' if price_change > 0 else 'bearish'
+            
+            # Ищем консолидацию после флагштока (флаг)
+            consolidation_start = flagpole_end + 1
+            consolidation_end = min(consolidation_start + 30, len(candles) - 1)
+            
+            # Находим локальные максимумы и минимумы внутри консолидации
+            # (длина окна и наличие минимум 2 пиков и 2 впадин уже проверены при отборе кандидатов)
+            inner = slice(consolidation_start + 1, consolidation_end)
+            peak_idx = np.flatnonzero(is_peak[inner]) + inner.start
+            trough_idx = np.flatnonzero(is_trough[inner]) + inner.start
+            
+            # Проверяем параллельность линий (разница наклона < 0.5%)
+            # Вычисляем средние уровни поддержки и сопротивления
+            peak_prices = series.high[peak_idx]
+            trough_prices = series.low[trough_idx]
+            avg_resistance = float(peak_prices.mean())
+            avg_support = float(trough_prices.mean())
+            
+            # Проверяем, что линии примерно параллельны (вариация < 1%)
+            resistance_variance = float(np.ptp(peak_prices))
+            support_variance = float(np.ptp(trough_prices))
+            
+            if resistance_variance / avg_resistance > 0.01 or support_variance / avg_support > 0.01:
+                continue
+            
+            # Вычисляем целевую цену (высота флагштока)
+            flagpole_height = abs(end_price - start_price)
+            target_price = avg_resistance + flagpole_height if direction == 'bullish' else avg_support - flagpole_height
+            
+            pattern_height_pct = (avg_resistance - avg_support) / avg_support
+            if pattern_height_pct < min_height:
+                continue
+            
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                max(resistance_variance / avg_resistance, support_variance / avg_support),
+                consolidation_end - consolidation_start
+            )
+            
+            patterns.append({
+                'pattern_type': 'flag',
+                'pattern_category': 'continuation',
+                'direction': direction,
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, flagpole_start),
+                'end_time': self._candle_datetime(candles, consolidation_end),
+                'support_level': avg_support,
+                'resistance_level': avg_resistance,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': consolidation_end - consolidation_start,
+                'candles_count': consolidation_end - flagpole_start + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'flagpole_start': flagpole_start,
+                    'flagpole_end': flagpole_end,
+                    'consolidation_start': consolidation_start,
+                    'consolidation_end': consolidation_end,
+                    'peaks': [{'index': j, 'price': candles[j]['high']} for j in peak_idx.tolist()],
+                    'troughs': [{'index': j, 'price': candles[j]['low']} for j in trough_idx.tolist()]
+                }
+            })
         
         return patterns
     
@@ -597,117 +1042,94 @@ class ChartPatternDetector:
         4. Определить направление: если флагшток вверх → пробой вверх
         """
         patterns = []
+        min_height = self.min_pattern_height_pct
         
-        try:
-            if len(candles) < 30:
-                return patterns
-            
-            # Ищем резкие движения (флагштоки)
-            for i in range(10, len(candles) - 20):
-                # Проверяем движение вверх (бычий вымпел)
-                flagpole_start = i
-                flagpole_end = min(i + 20, len(candles) - 1)
-                
-                # Вычисляем изменение цены за флагшток
-                start_price = candles[flagpole_start]['close']
-                end_price = candles[flagpole_end]['close']
-                price_change = (end_price - start_price) / start_price
-                
-                # Флагшток должен быть минимум 2%
-                if abs(price_change) < 0.02:
-                    continue
-                
-                direction = 'bullish' if price_change > 0 else 'bearish'
-                
-                # Ищем симметричный треугольник после флагштока (вымпел)
-                pennant_start = flagpole_end + 1
-                pennant_end = min(pennant_start + 30, len(candles) - 1)
-                
-                if pennant_end - pennant_start < 5:
-                    continue
-                
-                # Получаем свечи вымпела
-                pennant_candles = candles[pennant_start:pennant_end + 1]
-                
-                # Находим локальные максимумы и минимумы в вымпеле
-                pennant_peaks = []
-                pennant_troughs = []
-                
-                for j in range(1, len(pennant_candles) - 1):
-                    if pennant_candles[j]['high'] > pennant_candles[j-1]['high'] and \
-                       pennant_candles[j]['high'] > pennant_candles[j+1]['high']:
-                        pennant_peaks.append({
-                            'index': pennant_start + j,
-                            'price': pennant_candles[j]['high']
-                        })
-                    if pennant_candles[j]['low'] < pennant_candles[j-1]['low'] and \
-                       pennant_candles[j]['low'] < pennant_candles[j+1]['low']:
-                        pennant_troughs.append({
-                            'index': pennant_start + j,
-                            'price': pennant_candles[j]['low']
-                        })
-                
-                # Нужно минимум 2 пика и 2 впадины для треугольника
-                if len(pennant_peaks) < 2 or len(pennant_troughs) < 2:
-                    continue
-                
-                # Проверяем сходимость линий (треугольник)
-                # Первый и последний пики/впадины должны сходиться
-                first_peak = pennant_peaks[0]['price']
-                last_peak = pennant_peaks[-1]['price']
-                first_trough = pennant_troughs[0]['price']
-                last_trough = pennant_troughs[-1]['price']
-                
-                # Линии должны сходиться (первый пик > последнего, первый минимум < последнего)
-                if first_peak <= last_peak or first_trough >= last_trough:
-                    continue
-                
-                # Вычисляем средние уровни
-                avg_resistance = (first_peak + last_peak) / 2
-                avg_support = (first_trough + last_trough) / 2
-                
-                # Вычисляем целевую цену (высота флагштока)
-                flagpole_height = abs(end_price - start_price)
-                target_price = avg_resistance + flagpole_height if direction == 'bullish' else avg_support - flagpole_height
-                
-                pattern_height_pct = (avg_resistance - avg_support) / avg_support
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                # Симметричность треугольника (разница сходимости)
-                convergence_diff = abs((first_peak - last_peak) - (last_trough - first_trough)) / avg_support
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    convergence_diff,
-                    pennant_end - pennant_start
-                )
-                
-                patterns.append({
-                    'pattern_type': 'pennant',
-                    'pattern_category': 'continuation',
-                    'direction': direction,
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(candles[flagpole_start]['time']),
-                    'end_time': self._safe_timestamp_to_datetime(candles[pennant_end]['time']),
-                    'support_level': avg_support,
-                    'resistance_level': avg_resistance,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': pennant_end - pennant_start,
-                    'candles_count': pennant_end - flagpole_start + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'flagpole_start': flagpole_start,
-                        'flagpole_end': flagpole_end,
-                        'pennant_start': pennant_start,
-                        'pennant_end': pennant_end,
-                        'peaks': pennant_peaks,
-                        'troughs': pennant_troughs
-                    }
-                })
+        if len(candles) < 30:
+            return patterns
         
-        except Exception as e:
-            logger.error(f"Ошибка детекции Pennant для {symbol}: {e}", exc_info=True)
+        # Строгие локальные экстремумы относительно соседних свечей - один раз на весь ряд
+        ctx = self._get_ctx(candles)
+        closes, highs, lows = ctx.series.close, ctx.series.high, ctx.series.low
+        is_peak, is_trough = ctx.is_peak1, ctx.is_trough1
+        
+        # Ищем резкие движения (флагштоки), после которых возможна консолидация
+        for i in self._consolidation_candidates(ctx).tolist():
+            # Проверяем движение вверх (бычий вымпел)
+            flagpole_start = i
+            flagpole_end = min(i + 20, len(candles) - 1)
+            
+            # Вычисляем изменение цены за флагшток
+            start_price = float(closes[flagpole_start])
+            end_price = float(closes[flagpole_end])
+            price_change = (end_price - start_price) / start_price
+            
+            direction = 'bullish' if price_change > 0 else 'bearish'
+            
+            # Ищем симметричный треугольник после флагштока (вымпел)
+            pennant_start = flagpole_end + 1
+            pennant_end = min(pennant_start + 30, len(candles) - 1)
+            
+            # Находим локальные максимумы и минимумы в вымпеле
+            # (длина окна и наличие минимум 2 пиков и 2 впадин уже проверены при отборе кандидатов)
+            # (записи точек для pattern_data строятся только для найденного вымпела)
+            inner = slice(pennant_start + 1, pennant_end)
+            peak_idx = np.flatnonzero(is_peak[inner]) + inner.start
+            trough_idx = np.flatnonzero(is_trough[inner]) + inner.start
+            
+            # Проверяем сходимость линий (треугольник)
+            # Первый и последний пики/впадины должны сходиться
+            first_peak = float(highs[peak_idx[0]])
+            last_peak = float(highs[peak_idx[-1]])
+            first_trough = float(lows[trough_idx[0]])
+            last_trough = float(lows[trough_idx[-1]])
+            
+            # Линии должны сходиться (первый пик > последнего, первый минимум < последнего)
+            if first_peak <= last_peak or first_trough >= last_trough:
+                continue
+            
+            # Вычисляем средние уровни
+            avg_resistance = (first_peak + last_peak) / 2
+            avg_support = (first_trough + last_trough) / 2
+            
+            # Вычисляем целевую цену (высота флагштока)
+            flagpole_height = abs(end_price - start_price)
+            target_price = avg_resistance + flagpole_height if direction == 'bullish' else avg_support - flagpole_height
+            
+            pattern_height_pct = (avg_resistance - avg_support) / avg_support
+            if pattern_height_pct < min_height:
+                continue
+            
+            # Симметричность треугольника (разница сходимости)
+            convergence_diff = abs((first_peak - last_peak) - (last_trough - first_trough)) / avg_support
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                convergence_diff,
+                pennant_end - pennant_start
+            )
+            
+            patterns.append({
+                'pattern_type': 'pennant',
+                'pattern_category': 'continuation',
+                'direction': direction,
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, flagpole_start),
+                'end_time': self._candle_datetime(candles, pennant_end),
+                'support_level': avg_support,
+                'resistance_level': avg_resistance,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': pennant_end - pennant_start,
+                'candles_count': pennant_end - flagpole_start + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'flagpole_start': flagpole_start,
+                    'flagpole_end': flagpole_end,
+                    'pennant_start': pennant_start,
+                    'pennant_end': pennant_end,
+                    'peaks': [{'index': j, 'price': candles[j]['high']} for j in peak_idx.tolist()],
+                    'troughs': [{'index': j, 'price': candles[j]['low']} for j in trough_idx.tolist()]
+                }
+            })
         
         return patterns
     
@@ -721,100 +1143,122 @@ class ChartPatternDetector:
         3. Определить направление канала (восходящий, нисходящий, горизонтальный)
         """
         patterns = []
+        min_height = self.min_pattern_height_pct
         
-        try:
-            if len(candles) < 30:
-                return patterns
-            
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(peaks) < 3 or len(troughs) < 3:
-                return patterns
-            
-            # Ищем последовательные пики и впадины для построения канала
-            for i in range(len(peaks) - 2):
-                peak1 = peaks[i]
-                peak2 = peaks[i + 1]
-                peak3 = peaks[i + 2]
-                
-                # Находим соответствующие впадины между пиками
-                trough1 = None
-                trough2 = None
-                
-                for trough in troughs:
-                    if peak1['index'] < trough['index'] < peak2['index']:
-                        if trough1 is None or trough['price'] < trough1['price']:
-                            trough1 = trough
-                    if peak2['index'] < trough['index'] < peak3['index']:
-                        if trough2 is None or trough['price'] < trough2['price']:
-                            trough2 = trough
-                
-                if not trough1 or not trough2:
-                    continue
-                
-                # Вычисляем наклоны линий поддержки и сопротивления
-                # Линия сопротивления: через peak1 и peak2
-                resistance_slope = (peak2['price'] - peak1['price']) / (peak2['index'] - peak1['index'])
-                # Линия поддержки: через trough1 и trough2
-                support_slope = (trough2['price'] - trough1['price']) / (trough2['index'] - trough1['index'])
-                
-                # Проверяем параллельность (разница наклонов < 0.1% от цены)
-                slope_diff = abs(resistance_slope - support_slope)
-                avg_price = (peak1['price'] + trough1['price']) / 2
-                
-                if slope_diff / avg_price > 0.001:
-                    continue
-                
-                # Определяем направление канала
-                if resistance_slope > 0.0001:
-                    direction = 'bullish'
-                elif resistance_slope < -0.0001:
-                    direction = 'bearish'
-                else:
-                    direction = 'neutral'
-                
-                # Вычисляем средние уровни
-                avg_resistance = (peak1['price'] + peak2['price'] + peak3['price']) / 3
-                avg_support = (trough1['price'] + trough2['price']) / 2
-                
-                # Вычисляем целевую цену (высота канала)
-                channel_height = avg_resistance - avg_support
-                target_price = avg_resistance + channel_height if direction == 'bullish' else avg_support - channel_height
-                
-                pattern_height_pct = channel_height / avg_support
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    slope_diff / avg_price,
-                    peak3['index'] - peak1['index']
-                )
-                
-                patterns.append({
-                    'pattern_type': 'channel',
-                    'pattern_category': 'continuation',
-                    'direction': direction,
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(candles[peak1['index']]['time']),
-                    'end_time': self._safe_timestamp_to_datetime(candles[peak3['index']]['time']),
-                    'support_level': avg_support,
-                    'resistance_level': avg_resistance,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': peak3['index'] - peak1['index'],
-                    'candles_count': peak3['index'] - peak1['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'peaks': [peak1, peak2, peak3],
-                        'troughs': [trough1, trough2],
-                        'resistance_slope': resistance_slope,
-                        'support_slope': support_slope
-                    }
-                })
+        if len(candles) < 30:
+            return patterns
         
-        except Exception as e:
-            logger.error(f"Ошибка детекции Channel для {symbol}: {e}", exc_info=True)
+        extrema = self._find_extrema(candles, lookback=5)
+        peak_idx = extrema.peak_idx.tolist()
+        peak_price = extrema.peak_price.tolist()
+        trough_idx, trough_price = extrema.trough_idx, extrema.trough_price
+        
+        if len(peak_idx) < 3 or len(trough_idx) < 3:
+            return patterns
+        
+        trough_idx_list = trough_idx.tolist()
+        trough_price_list = trough_price.tolist()
+        
+        # Наклоны между соседними пиками - индексы экстремумов строго возрастают,
+        # поэтому деления на ноль нет
+        resistance_slopes = (np.diff(extrema.peak_price) / np.diff(extrema.peak_idx)).tolist()
+        
+        # Самая низкая впадина в каждом промежутке между соседними пиками - каждый
+        # промежуток нужен двум тройкам пиков, поэтому считаются один раз заранее
+        gap_troughs = _gap_lowest(peak_idx, trough_idx_list, trough_price_list)
+        
+        # Прошедшие проверки тройки пиков; словари фигур строятся после цикла
+        found = []
+        
+        # Ищем последовательные пики и впадины для построения канала
+        for i in range(len(peak_idx) - 2):
+            peak1_idx, peak2_idx, peak3_idx = peak_idx[i:i + 3]
+            peak1_price, peak2_price, peak3_price = peak_price[i:i + 3]
+            
+            # Находим соответствующие впадины между пиками (самые низкие в каждом промежутке)
+            pos1 = gap_troughs[i]
+            if pos1 is None:
+                continue
+            pos2 = gap_troughs[i + 1]
+            if pos2 is None:
+                continue
+            trough1_price = trough_price_list[pos1]
+            trough2_price = trough_price_list[pos2]
+            
+            # Вычисляем наклоны линий поддержки и сопротивления
+            # Линия сопротивления: через peak1 и peak2
+            resistance_slope = resistance_slopes[i]
+            # Линия поддержки: через trough1 и trough2
+            support_slope = (trough2_price - trough1_price) / (trough_idx_list[pos2] - trough_idx_list[pos1])
+            
+            # Проверяем параллельность (разница наклонов < 0.1% от цены)
+            slope_diff = abs(resistance_slope - support_slope)
+            avg_price = (peak1_price + trough1_price) / 2
+            
+            if slope_diff / avg_price > 0.001:
+                continue
+            
+            # Определяем направление канала
+            if resistance_slope > 0.0001:
+                direction = 'bullish'
+            elif resistance_slope < -0.0001:
+                direction = 'bearish'
+            else:
+                direction = 'neutral'
+            
+            # Вычисляем средние уровни
+            avg_resistance = (peak1_price + peak2_price + peak3_price) / 3
+            avg_support = (trough1_price + trough2_price) / 2
+            
+            # Вычисляем целевую цену (высота канала)
+            channel_height = avg_resistance - avg_support
+            target_price = avg_resistance + channel_height if direction == 'bullish' else avg_support - channel_height
+            
+            pattern_height_pct = channel_height / avg_support
+            if pattern_height_pct < min_height:
+                continue
+            
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                slope_diff / avg_price,
+                peak3_idx - peak1_idx
+            )
+            
+            found.append((
+                i, pos1, pos2, direction, reliability, avg_support, avg_resistance,
+                target_price, pattern_height_pct, resistance_slope, support_slope,
+            ))
+        
+        if not found:
+            return patterns
+        
+        peaks, troughs = self._extrema_records(candles, extrema)
+        for (
+            i, pos1, pos2, direction, reliability, avg_support, avg_resistance,
+            target_price, pattern_height_pct, resistance_slope, support_slope,
+        ) in found:
+            start_idx, end_idx = peak_idx[i], peak_idx[i + 2]
+            patterns.append({
+                'pattern_type': 'channel',
+                'pattern_category': 'continuation',
+                'direction': direction,
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, start_idx),
+                'end_time': self._candle_datetime(candles, end_idx),
+                'support_level': avg_support,
+                'resistance_level': avg_resistance,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': end_idx - start_idx,
+                'candles_count': end_idx - start_idx + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'peaks': peaks[i:i + 3],
+                    'troughs': [troughs[pos1], troughs[pos2]],
+                    'resistance_slope': resistance_slope,
+                    'support_slope': support_slope
+                }
+            })
         
         return patterns
     
@@ -837,269 +1281,246 @@ class ChartPatternDetector:
             Список треугольников (обычно 0-1, максимум 1 лучший)
         """
         patterns = []
-        
-        try:
-            last_index = len(candles) - 1
-            if last_index < 0:
-                return patterns
+        min_height = self.min_pattern_height_pct
+        
+        last_index = len(candles) - 1
+        if last_index < 0:
+            return patterns
+        
+        last_close = float(self._get_ctx(candles).series.close[last_index])
+        
+        # Минимальные требования для треугольника
+        min_candles = self.TRIANGLE_MIN_CANDLES.get(timeframe, 200)
+        
+        if len(candles) < min_candles:
+            return patterns
+        
+        # Используем swing-экстремумы вместо локальных
+        swing_period = self.TRIANGLE_SWING_PERIOD.get(timeframe, 7)
+        
+        # Swing-экстремумы в колоночном виде; записи-словари нужны только для итоговой фигуры
+        swings = self._find_extrema(candles, swing_period)
+        swing_high_idx = swings.peak_idx.tolist()
+        swing_low_idx = swings.trough_idx.tolist()
+        
+        # Нужно минимум 4 swing-high и 4 swing-low для построения треугольника
+        if len(swing_high_idx) < 4 or len(swing_low_idx) < 4:
+            return patterns
+        
+        # Минимальная ширина треугольника (в свечах)
+        min_width = self.TRIANGLE_MIN_WIDTH.get(timeframe, 50)
+        
+        # Ищем лучший треугольник: пробуем разные комбинации swing-экстремумов
+        
+        # Берем последние N swing-high и swing-low для анализа
+        # Увеличиваем количество проверяемых экстремумов для более широких треугольников
+        # Начинаем с самых последних и идем назад
+        max_swings_to_check = min(12, len(swing_high_idx), len(swing_low_idx))  # Увеличено с 8 до 12
+        
+        # Линии тренда по последним k swing-точкам для всех k - один проход на каждую сторону
+        res_fits = _suffix_linreg(swing_high_idx, swings.peak_price.tolist(), max_swings_to_check)
+        sup_fits = _suffix_linreg(swing_low_idx, swings.trough_price.tolist(), max_swings_to_check)
+        
+        # Все комбинации оцениваются сразу сеткой: строка - число точек линии
+        # сопротивления (num_res_points), столбец - линии поддержки (num_sup_points).
+        # Поэлементные операции те же, что у скалярного перебора, поэтому значения совпадают.
+        num_points = np.arange(3, max_swings_to_check + 1)
+        res_slope, res_intercept = np.array([res_fits[k] for k in num_points.tolist()]).T[:, :, None]
+        sup_slope, sup_intercept = np.array([sup_fits[k] for k in num_points.tolist()]).T[:, None, :]
+        
+        # Правая граница одна для всех комбинаций - последние swing-точки не меняются,
+        # левая - самая ранняя из первых точек обеих линий
+        end_idx = max(swing_high_idx[-1], swing_low_idx[-1])
+        start_idx = np.minimum(swings.peak_idx[-num_points][:, None], swings.trough_idx[-num_points][None, :])
+        width = end_idx - start_idx
+        
+        # Вычисляем значения линий на границах
+        res_start = res_slope * start_idx + res_intercept
+        res_end = res_slope * end_idx + res_intercept
+        sup_start = sup_slope * start_idx + sup_intercept
+        sup_end = sup_slope * end_idx + sup_intercept
+        
+        # Проверяем сходимость: расстояние между линиями должно уменьшаться
+        distance_start = res_start - sup_start
+        distance_end = res_end - sup_end
+        
+        # Отбракованные комбинации (нулевые расстояния и т.п.) отсекаются маской ниже
+        with np.errstate(divide='ignore', invalid='ignore'):
+            convergence_ratio = distance_end / distance_start
+            avg_price = (res_start + sup_start) / 2
+            price_tolerance = avg_price * 0.001  # 0.1% толерантность для горизонтальности
             
-            last_close = float(candles[last_index]['close'])
+            # Определяем тип треугольника по знакам наклонов и их горизонтальности
+            res_state = np.sign(res_slope) * np.where(np.abs(res_slope) < price_tolerance, 1, 2)
+            sup_state = np.sign(sup_slope) * np.where(np.abs(sup_slope) < price_tolerance, 1, 2)
+            kind = _TRIANGLE_KIND[res_state.astype(np.intp) + 2, sup_state.astype(np.intp) + 2]
             
-            # Минимальные требования для треугольника
-            min_candles_map = {
-                '15m': 200,  # ~2 дня
-                '1h': 200,   # ~8 дней
-                '4h': 150    # ~25 дней
-            }
-            min_candles = min_candles_map.get(timeframe, 200)
+            # Вычисляем характеристики треугольника
+            pattern_height_pct = distance_start / avg_price
+        
+        valid = (
+            (width >= min_width)  # минимальная ширина
+            & (distance_start > 0) & (distance_end > 0)
+            & (convergence_ratio < 0.8)  # линии сходятся минимум на 20%
+            & (kind > 0)
+            & (pattern_height_pct >= min_height)
+        )
+        rows, cols = np.nonzero(valid)
+        
+        if rows.size:
+            start_v = start_idx[rows, cols]
+            height_v = pattern_height_pct[rows, cols]
+            ratio_v = convergence_ratio[rows, cols]
+            width_v = width[rows, cols]
             
-            if len(candles) < min_candles:
-                return patterns
+            # Отсечение по границам score: снизу - без касаний, сверху - касаются все
+            # swing-точки диапазона. Комбинация, чья верхняя граница меньше лучшей нижней,
+            # не может выиграть (и сравняться с победителем), касания для нее не считаются.
+            res_in_range = len(swing_high_idx) - np.searchsorted(swings.peak_idx, start_v, side='left')
+            sup_in_range = len(swing_low_idx) - np.searchsorted(swings.trough_idx, start_v, side='left')
+            lower = _triangle_scores(0, 0, height_v, width_v, ratio_v)
+            upper = _triangle_scores(res_in_range, sup_in_range, height_v, width_v, ratio_v)
+            keep = np.flatnonzero(upper >= lower.max())
+            rows, cols = rows[keep], cols[keep]
+            start_v, height_v, ratio_v, width_v = start_v[keep], height_v[keep], ratio_v[keep], width_v[keep]
             
-            # Используем swing-экстремумы вместо локальных
-            swing_period_map = {
-                '15m': 7,
-                '1h': 5,
-                '4h': 4
-            }
-            swing_period = swing_period_map.get(timeframe, 7)
-            
-            swing_highs, swing_lows = self.find_swing_extrema(candles, swing_period=swing_period)
-            
-            # Нужно минимум 4 swing-high и 4 swing-low для построения треугольника
-            if len(swing_highs) < 4 or len(swing_lows) < 4:
-                return patterns
-            
-            # Минимальная ширина треугольника (в свечах)
-            # Согласно классической литературе по техническому анализу:
-            # - Треугольники должны формироваться минимум на 20-30 свечах
-            # - Для более надежных треугольников рекомендуется 50-100 свечей
-            # - Увеличиваем минимальную ширину для более значимых фигур
-            min_width_map = {
-                '15m': 60,   # ~1.5 дня (увеличено с 40)
-                '1h': 50,    # ~2 дня (увеличено с 30)
-                '4h': 30     # ~5 дней (увеличено с 20)
+            # Подсчитываем количество касаний линий (для скоринга)
+            touch_tolerance = avg_price[rows, cols][:, None] * 0.005  # 0.5% толерантность для касания
+            
+            # Swing-точки внутри [start_idx, end_idx]: правая граница не меньше последних
+            # swing-точек, поэтому достаточно условия на левую
+            line_values = res_slope[rows] * swings.peak_idx + res_intercept[rows]
+            touches_resistance = np.count_nonzero(
+                (swings.peak_idx >= start_v[:, None]) & (np.abs(swings.peak_price - line_values) < touch_tolerance),
+                axis=1
+            )
+            line_values = sup_slope[0, cols, None] * swings.trough_idx + sup_intercept[0, cols, None]
+            touches_support = np.count_nonzero(
+                (swings.trough_idx >= start_v[:, None]) & (np.abs(swings.trough_price - line_values) < touch_tolerance),
+                axis=1
+            )
+            
+            # Вычисляем score для выбора лучшего треугольника
+            score = _triangle_scores(touches_resistance, touches_support, height_v, width_v, ratio_v)
+            
+            # Выбираем лучший треугольник (с максимальным score) и собираем по нему фигуру;
+            # argmax берет первый максимум в порядке перебора (num_res_points, num_sup_points)
+            best = int(np.argmax(score))
+            row, col = int(rows[best]), int(cols[best])
+            num_res_points = row + 3
+            num_sup_points = col + 3
+            
+            pattern_type, direction, pattern_category = _TRIANGLE_KINDS[kind[row, col]]
+            score = float(score[best])
+            start_idx = int(start_v[best])
+            width = int(width_v[best])
+            res_start = float(res_start[row, col])
+            res_end = float(res_end[row, 0])
+            sup_start = float(sup_start[row, col])
+            sup_end = float(sup_end[0, col])
+            triangle_height = float(distance_start[row, col])
+            pattern_height_pct = float(height_v[best])
+            convergence_ratio = float(ratio_v[best])
+            touches_resistance = int(touches_resistance[best])
+            touches_support = int(touches_support[best])
+            swing_highs, swing_lows = self._extrema_records(candles, swings)
+            res_points = swing_highs[-num_res_points:]
+            sup_points = swing_lows[-num_sup_points:]
+            res_slope, res_intercept = res_fits[num_res_points]
+            sup_slope, sup_intercept = sup_fits[num_sup_points]
+            
+            # Вычисляем целевую цену
+            if pattern_type == 'ascending_triangle':
+                target_price = res_end + triangle_height
+            elif pattern_type == 'descending_triangle':
+                target_price = sup_end - triangle_height
+            else:  # симметричный
+                # По умолчанию вверх (можно улучшить на основе тренда)
+                target_price = res_end + triangle_height
+            
+            # Проверяем статус фигуры относительно текущей цены
+            current_resistance = res_slope * last_index + res_intercept
+            current_support = sup_slope * last_index + sup_intercept
+            
+            price_tolerance_pct = 0.003  # 0.3%
+            
+            is_active = False
+            is_confirmed = False
+            confirmation_time = None
+            
+            # Фигура активна, если текущая цена внутри треугольника
+            if current_support < last_close < current_resistance and last_index >= start_idx:
+                is_active = True
+            # Фигура пробита, если цена вышла за пределы
+            elif last_close > current_resistance * (1 + price_tolerance_pct):
+                is_confirmed = True
+                # В candles['time'] уже лежит timestamp в СЕКУНДАХ
+                confirmation_time = self._candle_datetime(candles, last_index)
+            elif last_close < current_support * (1 - price_tolerance_pct):
+                is_confirmed = True
+                confirmation_time = self._candle_datetime(candles, last_index)
+            
+            # Для активных фигур конец считаем по последней свече
+            if is_active:
+                end_time_dt = self._candle_datetime(candles, last_index)
+            else:
+                end_time_dt = self._candle_datetime(candles, end_idx)
+            
+            # Вычисляем надежность
+            symmetry = abs(1.0 - convergence_ratio)
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                symmetry,
+                width
+            )
+            
+            # Добавляем score в reliability для финального выбора
+            reliability = min(reliability + score, 1.0)
+            
+            best_candidate = {
+                'pattern_type': pattern_type,
+                'pattern_category': pattern_category,
+                'direction': direction,
+                'reliability': reliability,
+                'score': score,
+                # В candles['time'] уже секунды, поэтому не делим на 1000
+                'start_time': self._candle_datetime(candles, start_idx),
+                'end_time': end_time_dt,
+                'confirmation_time': confirmation_time,
+                'support_level': (sup_start + sup_end) / 2,
+                'resistance_level': (res_start + res_end) / 2,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': width,
+                'candles_count': width + 1,
+                'is_active': is_active,
+                'is_confirmed': is_confirmed,
+                'pattern_data': {
+                    'resistance_points': res_points,
+                    'support_points': sup_points,
+                    'resistance_slope': res_slope,
+                    'resistance_intercept': res_intercept,
+                    'support_slope': sup_slope,
+                    'support_intercept': sup_intercept,
+                    'start_index': start_idx,
+                    'end_index': end_idx,
+                    'current_support': current_support,
+                    'current_resistance': current_resistance,
+                    'last_close': last_close,
+                    'touches_resistance': touches_resistance,
+                    'touches_support': touches_support,
+                    'convergence_ratio': convergence_ratio
+                }
             }
-            min_width = min_width_map.get(timeframe, 50)
-            
-            # Ищем лучший треугольник: пробуем разные комбинации swing-экстремумов
-            candidates = []
-            
-            # Берем последние N swing-high и swing-low для анализа
-            # Увеличиваем количество проверяемых экстремумов для более широких треугольников
-            # Начинаем с самых последних и идем назад
-            max_swings_to_check = min(12, len(swing_highs), len(swing_lows))  # Увеличено с 8 до 12
-            
-            for num_res_points in range(3, max_swings_to_check + 1):
-                for num_sup_points in range(3, max_swings_to_check + 1):
-                    # Берем последние num_res_points swing-high для линии сопротивления
-                    res_points = swing_highs[-num_res_points:]
-                    # Берем последние num_sup_points swing-low для линии поддержки
-                    sup_points = swing_lows[-num_sup_points:]
-                    
-                    if len(res_points) < 3 or len(sup_points) < 3:
-                        continue
-                    
-                    # Строим линии тренда через линейную регрессию
-                    res_slope, res_intercept = self.linear_regression(res_points)
-                    sup_slope, sup_intercept = self.linear_regression(sup_points)
-                    
-                    # Определяем границы треугольника
-                    start_idx = min(res_points[0]['index'], sup_points[0]['index'])
-                    end_idx = max(res_points[-1]['index'], sup_points[-1]['index'])
-                    
-                    # Проверяем минимальную ширину
-                    if end_idx - start_idx < min_width:
-                        continue
-                    
-                    # Вычисляем значения линий на границах
-                    res_start = res_slope * start_idx + res_intercept
-                    res_end = res_slope * end_idx + res_intercept
-                    sup_start = sup_slope * start_idx + sup_intercept
-                    sup_end = sup_slope * end_idx + sup_intercept
-                    
-                    # Проверяем сходимость: расстояние между линиями должно уменьшаться
-                    distance_start = res_start - sup_start
-                    distance_end = res_end - sup_end
-                    
-                    if distance_start <= 0 or distance_end <= 0:
-                        continue
-                    
-                    # Линии должны сходиться (расстояние уменьшается минимум на 20%)
-                    convergence_ratio = distance_end / distance_start
-                    if convergence_ratio >= 0.8:  # Недостаточная сходимость
-                        continue
-                    
-                    # Определяем тип треугольника
-                    avg_price = (res_start + sup_start) / 2
-                    price_tolerance = avg_price * 0.001  # 0.1% толерантность для горизонтальности
-                    
-                    pattern_type = None
-                    direction = None
-                    pattern_category = None
-                    
-                    # Восходящий треугольник: горизонтальное сопротивление, восходящая поддержка
-                    if abs(res_slope) < price_tolerance and sup_slope > 0:
-                        pattern_type = 'ascending_triangle'
-                        direction = 'bullish'
-                        pattern_category = 'continuation'
-                    # Нисходящий треугольник: горизонтальная поддержка, нисходящее сопротивление
-                    elif abs(sup_slope) < price_tolerance and res_slope < 0:
-                        pattern_type = 'descending_triangle'
-                        direction = 'bearish'
-                        pattern_category = 'continuation'
-                    # Симметричный треугольник: обе линии сходятся
-                    elif res_slope < 0 and sup_slope > 0:
-                        pattern_type = 'symmetrical_triangle'
-                        direction = 'neutral'
-                        pattern_category = 'consolidation'
-                    else:
-                        continue
-                    
-                    # Вычисляем характеристики треугольника
-                    triangle_height = distance_start
-                    pattern_height_pct = triangle_height / avg_price
-                    
-                    if pattern_height_pct < self.min_pattern_height_pct:
-                        continue
-                    
-                    # Вычисляем целевую цену
-                    if pattern_type == 'ascending_triangle':
-                        target_price = res_end + triangle_height
-                    elif pattern_type == 'descending_triangle':
-                        target_price = sup_end - triangle_height
-                    else:  # симметричный
-                        # По умолчанию вверх (можно улучшить на основе тренда)
-                        target_price = res_end + triangle_height
-                    
-                    # Подсчитываем количество касаний линий (для скоринга)
-                    touches_resistance = 0
-                    touches_support = 0
-                    touch_tolerance = avg_price * 0.005  # 0.5% толерантность для касания
-                    
-                    for sh in swing_highs:
-                        if start_idx <= sh['index'] <= end_idx:
-                            line_value = res_slope * sh['index'] + res_intercept
-                            if abs(sh['price'] - line_value) < touch_tolerance:
-                                touches_resistance += 1
-                    
-                    for sl in swing_lows:
-                        if start_idx <= sl['index'] <= end_idx:
-                            line_value = sup_slope * sl['index'] + sup_intercept
-                            if abs(sl['price'] - line_value) < touch_tolerance:
-                                touches_support += 1
-                    
-                    # Вычисляем score для выбора лучшего треугольника
-                    # Больше касаний = лучше, больше высота = лучше, оптимальная ширина = лучше
-                    score = 0.0
-                    score += touches_resistance * 0.15
-                    score += touches_support * 0.15
-                    score += min(pattern_height_pct * 10, 0.3)  # Максимум 0.3 за высоту
-                    
-                    # Оптимальная ширина (обновлено под новые минимальные требования)
-                    width = end_idx - start_idx
-                    # Предпочитаем треугольники шириной 50-150 свечей
-                    if 50 <= width <= 150:
-                        score += 0.2
-                    elif 40 <= width < 50 or 150 < width <= 200:
-                        score += 0.1
-                    
-                    # Бонус за хорошую сходимость
-                    if convergence_ratio < 0.5:  # Сходимость более чем в 2 раза
-                        score += 0.2
-                    
-                    # Проверяем статус фигуры относительно текущей цены
-                    current_resistance = res_slope * last_index + res_intercept
-                    current_support = sup_slope * last_index + sup_intercept
-                    
-                    price_tolerance_pct = 0.003  # 0.3%
-                    
-                    is_active = False
-                    is_confirmed = False
-                    confirmation_time = None
-                    
-                    # Фигура активна, если текущая цена внутри треугольника
-                    if current_support < last_close < current_resistance and last_index >= start_idx:
-                        is_active = True
-                    # Фигура пробита, если цена вышла за пределы
-                    elif last_close > current_resistance * (1 + price_tolerance_pct):
-                        is_confirmed = True
-                        # В candles['time'] уже лежит timestamp в СЕКУНДАХ
-                        confirmation_time = datetime.fromtimestamp(
-                            candles[last_index]['time'], tz=timezone.utc
-                        )
-                    elif last_close < current_support * (1 - price_tolerance_pct):
-                        is_confirmed = True
-                        confirmation_time = datetime.fromtimestamp(
-                            candles[last_index]['time'], tz=timezone.utc
-                        )
-                    
-                    # Для активных фигур конец считаем по последней свече
-                    if is_active:
-                        end_time_dt = self._safe_timestamp_to_datetime(candles[last_index]['time'])
-                    else:
-                        end_time_dt = self._safe_timestamp_to_datetime(candles[end_idx]['time'])
-                    
-                    # Вычисляем надежность
-                    symmetry = abs(1.0 - convergence_ratio)
-                    reliability = self._calculate_reliability(
-                        pattern_height_pct,
-                        symmetry,
-                        width
-                    )
-                    
-                    # Добавляем score в reliability для финального выбора
-                    reliability = min(reliability + score, 1.0)
-                    
-                    candidates.append({
-                        'pattern_type': pattern_type,
-                        'pattern_category': pattern_category,
-                        'direction': direction,
-                        'reliability': reliability,
-                        'score': score,
-                        # В candles['time'] уже секунды, поэтому не делим на 1000
-                        'start_time': self._safe_timestamp_to_datetime(candles[start_idx]['time']),
-                        'end_time': end_time_dt,
-                        'confirmation_time': confirmation_time,
-                        'support_level': (sup_start + sup_end) / 2,
-                        'resistance_level': (res_start + res_end) / 2,
-                        'target_price': target_price,
-                        'pattern_height': pattern_height_pct,
-                        'pattern_width': width,
-                        'candles_count': width + 1,
-                        'is_active': is_active,
-                        'is_confirmed': is_confirmed,
-                        'pattern_data': {
-                            'resistance_points': res_points,
-                            'support_points': sup_points,
-                            'resistance_slope': res_slope,
-                            'resistance_intercept': res_intercept,
-                            'support_slope': sup_slope,
-                            'support_intercept': sup_intercept,
-                            'start_index': start_idx,
-                            'end_index': end_idx,
-                            'current_support': current_support,
-                            'current_resistance': current_resistance,
-                            'last_close': last_close,
-                            'touches_resistance': touches_resistance,
-                            'touches_support': touches_support,
-                            'convergence_ratio': convergence_ratio
-                        }
-                    })
-            
-            # Выбираем лучший треугольник (с максимальным score)
-            if candidates:
-                best_candidate = max(candidates, key=lambda x: x['score'])
-                patterns.append(best_candidate)
+            patterns.append(best_candidate)
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(
-                    f"✅ Найден треугольник {best_candidate['pattern_type']} для {symbol} {timeframe}: "
-                    f"score={best_candidate['score']:.2f}, reliability={best_candidate['reliability']:.2f}, "
-                    f"width={best_candidate['pattern_width']}, touches={best_candidate['pattern_data']['touches_resistance']}/{best_candidate['pattern_data']['touches_support']}"
+                    "✅ Найден треугольник %s для %s %s: score=%.2f, reliability=%.2f, width=%s, touches=%s/%s",
+                    best_candidate['pattern_type'], symbol, timeframe,
+                    best_candidate['score'], best_candidate['reliability'], best_candidate['pattern_width'],
+                    best_candidate['pattern_data']['touches_resistance'], best_candidate['pattern_data']['touches_support']
                 )
-        
-        except Exception as e:
-            logger.error(f"Ошибка детекции Triangles для {symbol} {timeframe}: {e}", exc_info=True)
-        
+    
         return patterns
     
     def detect_wedges(self, candles: List[Dict], symbol: str, timeframe: str) -> List[Dict]:
@@ -1112,114 +1533,113 @@ class ChartPatternDetector:
         3. Нисходящий клин: обе линии нисходящие, но сходятся (разворот вверх)
         """
         patterns = []
+        min_height = self.min_pattern_height_pct
         
-        try:
-            if len(candles) < 30:
-                return patterns
-            
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(peaks) < 3 or len(troughs) < 3:
-                return patterns
-            
-            # Ищем последовательные пики и впадины для построения клина
-            for i in range(len(peaks) - 2):
-                peak1 = peaks[i]
-                peak2 = peaks[i + 1]
-                peak3 = peaks[i + 2]
-                
-                # Находим соответствующие впадины
-                trough1 = None
-                trough2 = None
-                trough3 = None
-                
-                for trough in troughs:
-                    if trough['index'] < peak1['index']:
-                        if trough1 is None or trough['price'] < trough1['price']:
-                            trough1 = trough
-                    elif peak1['index'] < trough['index'] < peak2['index']:
-                        if trough2 is None or trough['price'] < trough2['price']:
-                            trough2 = trough
-                    elif peak2['index'] < trough['index'] < peak3['index']:
-                        if trough3 is None or trough['price'] < trough3['price']:
-                            trough3 = trough
-                
-                if not trough1 or not trough2 or not trough3:
-                    continue
-                
-                # Вычисляем наклоны линий
-                # Линия сопротивления: через peak1 и peak2
-                resistance_slope = (peak2['price'] - peak1['price']) / (peak2['index'] - peak1['index'])
-                # Линия поддержки: через trough1 и trough2
-                support_slope = (trough2['price'] - trough1['price']) / (trough2['index'] - trough1['index'])
-                
-                # Проверяем сходимость (линии должны сходиться)
-                if peak2['price'] >= peak1['price'] or trough2['price'] <= trough1['price']:
-                    continue
-                
-                # Определяем тип клина
-                # Восходящий клин: обе линии восходящие, но сходятся (медвежий)
-                if resistance_slope > 0.0001 and support_slope > 0.0001 and resistance_slope < support_slope:
-                    pattern_type = 'rising_wedge'
-                    direction = 'bearish'
-                    pattern_category = 'reversal'
-                # Нисходящий клин: обе линии нисходящие, но сходятся (бычий)
-                elif resistance_slope < -0.0001 and support_slope < -0.0001 and resistance_slope > support_slope:
-                    pattern_type = 'falling_wedge'
-                    direction = 'bullish'
-                    pattern_category = 'reversal'
-                else:
-                    continue
-                
-                # Вычисляем средние уровни
-                avg_resistance = (peak1['price'] + peak2['price']) / 2
-                avg_support = (trough1['price'] + trough2['price']) / 2
-                
-                # Вычисляем целевую цену (высота клина в начале)
-                wedge_height = peak1['price'] - trough1['price']
-                if pattern_type == 'rising_wedge':
-                    target_price = avg_support - wedge_height  # Разворот вниз
-                else:  # falling_wedge
-                    target_price = avg_resistance + wedge_height  # Разворот вверх
-                
-                pattern_height_pct = wedge_height / avg_support
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                # Симметричность клина
-                convergence_ratio = abs((peak2['price'] - peak1['price']) / (trough2['price'] - trough1['price']))
-                symmetry = abs(1.0 - convergence_ratio) if convergence_ratio > 0 else 1.0
-                
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    symmetry,
-                    peak3['index'] - peak1['index']
-                )
-                
-                patterns.append({
-                    'pattern_type': pattern_type,
-                    'pattern_category': pattern_category,
-                    'direction': direction,
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(candles[peak1['index']]['time']),
-                    'end_time': self._safe_timestamp_to_datetime(candles[peak3['index']]['time']),
-                    'support_level': avg_support,
-                    'resistance_level': avg_resistance,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': peak3['index'] - peak1['index'],
-                    'candles_count': peak3['index'] - peak1['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'peaks': [peak1, peak2, peak3],
-                        'troughs': [trough1, trough2, trough3],
-                        'resistance_slope': resistance_slope,
-                        'support_slope': support_slope
-                    }
-                })
+        if len(candles) < 30:
+            return patterns
         
-        except Exception as e:
-            logger.error(f"Ошибка детекции Wedges для {symbol}: {e}", exc_info=True)
+        peaks, troughs = self.find_local_extrema(candles, lookback=5)
+        
+        if len(peaks) < 3 or len(troughs) < 3:
+            return patterns
+        
+        # Наклоны линии сопротивления (через соседние пики) для всех троек сразу
+        extrema = self._find_extrema(candles, lookback=5)
+        resistance_slopes = np.diff(extrema.peak_price) / np.diff(extrema.peak_idx)
+        trough_idx, trough_price = extrema.trough_idx, extrema.trough_price
+        
+        # Сходимость требует peak2 < peak1, т.е. падающего сопротивления, а тип клина -
+        # наклона по модулю больше 0.0001: остальные тройки отсеиваются до цикла
+        candidates = np.flatnonzero(resistance_slopes[:len(peaks) - 2] < -0.0001)
+        
+        # Ищем последовательные пики и впадины для построения клина
+        for i in candidates.tolist():
+            peak1 = peaks[i]
+            peak2 = peaks[i + 1]
+            peak3 = peaks[i + 2]
+            
+            # Находим соответствующие впадины (самые низкие до первого пика и между пиками)
+            pos1 = _between(trough_idx, trough_price, -1, peak1['index'], lowest=True)
+            pos2 = _between(trough_idx, trough_price, peak1['index'], peak2['index'], lowest=True)
+            pos3 = _between(trough_idx, trough_price, peak2['index'], peak3['index'], lowest=True)
+            
+            if pos1 is None or pos2 is None or pos3 is None:
+                continue
+            
+            trough1 = troughs[pos1]
+            trough2 = troughs[pos2]
+            trough3 = troughs[pos3]
+            
+            # Вычисляем наклоны линий
+            # Линия сопротивления: через peak1 и peak2
+            resistance_slope = float(resistance_slopes[i])
+            # Линия поддержки: через trough1 и trough2
+            support_slope = (trough2['price'] - trough1['price']) / (trough2['index'] - trough1['index'])
+            
+            # Проверяем сходимость (линии должны сходиться)
+            if peak2['price'] >= peak1['price'] or trough2['price'] <= trough1['price']:
+                continue
+            
+            # Определяем тип клина
+            # Восходящий клин: обе линии восходящие, но сходятся (медвежий)
+            if resistance_slope > 0.0001 and support_slope > 0.0001 and resistance_slope < support_slope:
+                pattern_type = 'rising_wedge'
+                direction = 'bearish'
+                pattern_category = 'reversal'
+            # Нисходящий клин: обе линии нисходящие, но сходятся (бычий)
+            elif resistance_slope < -0.0001 and support_slope < -0.0001 and resistance_slope > support_slope:
+                pattern_type = 'falling_wedge'
+                direction = 'bullish'
+                pattern_category = 'reversal'
+            else:
+                continue
+            
+            # Вычисляем средние уровни
+            avg_resistance = (peak1['price'] + peak2['price']) / 2
+            avg_support = (trough1['price'] + trough2['price']) / 2
+            
+            # Вычисляем целевую цену (высота клина в начале)
+            wedge_height = peak1['price'] - trough1['price']
+            if pattern_type == 'rising_wedge':
+                target_price = avg_support - wedge_height  # Разворот вниз
+            else:  # falling_wedge
+                target_price = avg_resistance + wedge_height  # Разворот вверх
+            
+            pattern_height_pct = wedge_height / avg_support
+            if pattern_height_pct < min_height:
+                continue
+            
+            # Симметричность клина
+            convergence_ratio = abs((peak2['price'] - peak1['price']) / (trough2['price'] - trough1['price']))
+            symmetry = abs(1.0 - convergence_ratio) if convergence_ratio > 0 else 1.0
+            
+            reliability = self._calculate_reliability(
+                pattern_height_pct,
+                symmetry,
+                peak3['index'] - peak1['index']
+            )
+            
+            patterns.append({
+                'pattern_type': pattern_type,
+                'pattern_category': pattern_category,
+                'direction': direction,
+                'reliability': reliability,
+                'start_time': self._candle_datetime(candles, peak1['index']),
+                'end_time': self._candle_datetime(candles, peak3['index']),
+                'support_level': avg_support,
+                'resistance_level': avg_resistance,
+                'target_price': target_price,
+                'pattern_height': pattern_height_pct,
+                'pattern_width': peak3['index'] - peak1['index'],
+                'candles_count': peak3['index'] - peak1['index'] + 1,
+                'is_confirmed': False,
+                'pattern_data': {
+                    'peaks': [peak1, peak2, peak3],
+                    'troughs': [trough1, trough2, trough3],
+                    'resistance_slope': resistance_slope,
+                    'support_slope': support_slope
+                }
+            })
         
         return patterns
     
@@ -1233,124 +1653,139 @@ class ChartPatternDetector:
         3. Определить направление пробоя (на основе тренда до прямоугольника)
         """
         patterns = []
-        
-        try:
-            if len(candles) < 30:
-                return patterns
-            
-            peaks, troughs = self.find_local_extrema(candles, lookback=5)
-            
-            if len(peaks) < 3 or len(troughs) < 3:
-                return patterns
-            
-            # Ищем последовательные пики и впадины на примерно одинаковых уровнях
-            for i in range(len(peaks) - 2):
-                peak1 = peaks[i]
-                peak2 = peaks[i + 1]
-                peak3 = peaks[i + 2]
-                
-                # Проверяем, что пики примерно на одном уровне (разница < 1%)
-                peak_diff_12 = abs(peak1['price'] - peak2['price']) / peak1['price']
-                peak_diff_23 = abs(peak2['price'] - peak3['price']) / peak2['price']
-                
-                if peak_diff_12 > 0.01 or peak_diff_23 > 0.01:
-                    continue
-                
-                # Находим соответствующие впадины
-                trough1 = None
-                trough2 = None
-                trough3 = None
-                
-                for trough in troughs:
-                    if trough['index'] < peak1['index']:
-                        if trough1 is None or trough['price'] < trough1['price']:
-                            trough1 = trough
-                    elif peak1['index'] < trough['index'] < peak2['index']:
-                        if trough2 is None or trough['price'] < trough2['price']:
-                            trough2 = trough
-                    elif peak2['index'] < trough['index'] < peak3['index']:
-                        if trough3 is None or trough['price'] < trough3['price']:
-                            trough3 = trough
-                
-                if not trough1 or not trough2 or not trough3:
-                    continue
-                
-                # Проверяем, что впадины тоже примерно на одном уровне
-                trough_diff_12 = abs(trough1['price'] - trough2['price']) / trough1['price']
-                trough_diff_23 = abs(trough2['price'] - trough3['price']) / trough2['price']
-                
-                if trough_diff_12 > 0.01 or trough_diff_23 > 0.01:
-                    continue
-                
-                # Вычисляем средние уровни
-                avg_resistance = (peak1['price'] + peak2['price'] + peak3['price']) / 3
-                avg_support = (trough1['price'] + trough2['price'] + trough3['price']) / 3
-                
-                # Проверяем, что уровни горизонтальные (наклоны близки к нулю)
-                resistance_slope = (peak3['price'] - peak1['price']) / (peak3['index'] - peak1['index'])
-                support_slope = (trough3['price'] - trough1['price']) / (trough3['index'] - trough1['index'])
-                
-                avg_price = (avg_resistance + avg_support) / 2
-                
-                if abs(resistance_slope) / avg_price > 0.0005 or abs(support_slope) / avg_price > 0.0005:
-                    continue
-                
-                # Определяем направление на основе тренда до прямоугольника
-                # Смотрим на движение цены перед первым пиком
-                trend_start = max(0, peak1['index'] - 20)
-                trend_price = candles[trend_start]['close']
-                current_price = candles[peak1['index']]['close']
-                
-                if current_price > trend_price:
-                    direction = 'bullish'  # Восходящий тренд до прямоугольника
-                elif current_price < trend_price:
-                    direction = 'bearish'  # Нисходящий тренд до прямоугольника
-                else:
-                    direction = 'neutral'
-                
-                # Вычисляем целевую цену (высота прямоугольника)
-                rectangle_height = avg_resistance - avg_support
-                target_price = avg_resistance + rectangle_height if direction == 'bullish' else avg_support - rectangle_height
-                
-                pattern_height_pct = rectangle_height / avg_support
-                if pattern_height_pct < self.min_pattern_height_pct:
-                    continue
-                
-                # Симметричность прямоугольника
-                symmetry = max(peak_diff_12, peak_diff_23, trough_diff_12, trough_diff_23)
-                
-                reliability = self._calculate_reliability(
-                    pattern_height_pct,
-                    symmetry,
-                    peak3['index'] - peak1['index']
-                )
-                
-                patterns.append({
-                    'pattern_type': 'rectangle',
-                    'pattern_category': 'consolidation',
-                    'direction': direction,
-                    'reliability': reliability,
-                    'start_time': self._safe_timestamp_to_datetime(candles[peak1['index']]['time']),
-                    'end_time': self._safe_timestamp_to_datetime(candles[peak3['index']]['time']),
-                    'support_level': avg_support,
-                    'resistance_level': avg_resistance,
-                    'target_price': target_price,
-                    'pattern_height': pattern_height_pct,
-                    'pattern_width': peak3['index'] - peak1['index'],
-                    'candles_count': peak3['index'] - peak1['index'] + 1,
-                    'is_confirmed': False,
-                    'pattern_data': {
-                        'peaks': [peak1, peak2, peak3],
-                        'troughs': [trough1, trough2, trough3],
-                        'resistance_slope': resistance_slope,
-                        'support_slope': support_slope
-                    }
-                })
-        
-        except Exception as e:
-            logger.error(f"Ошибка детекции Rectangle для {symbol}: {e}", exc_info=True)
-        
-        return patterns
+        min_height = self.min_pattern_height_pct
+        
+        if len(candles) < 30:
+            return patterns
+        
+        extrema = self._find_extrema(candles, lookback=5)
+        peak_idx, peak_price = extrema.peak_idx, extrema.peak_price
+        trough_idx, trough_price = extrema.trough_idx, extrema.trough_price
+        
+        if len(peak_idx) < 3 or len(trough_idx) < 3:
+            return patterns
+        
+        closes = self._get_ctx(candles).series.close
+        
+        # Все тройки последовательных пиков (peak1, peak2, peak3) проверяются сразу:
+        # элемент k массивов ниже относится к тройке, начинающейся с пика k
+        idx1, idx2, idx3 = peak_idx[:-2], peak_idx[1:-1], peak_idx[2:]
+        price1, price2, price3 = peak_price[:-2], peak_price[1:-1], peak_price[2:]
+        
+        # Соответствующие впадины: самая низкая до первого пика и самые низкие между пиками
+        gaps = np.array(
+            [-1 if pos is None else pos for pos in _gap_lowest(peak_idx.tolist(), trough_idx.tolist(), trough_price.tolist())],
+            dtype=np.intp
+        )
+        before = np.searchsorted(trough_idx, idx1, side='left')
+        pos1 = np.where(before > 0, _prefix_lowest(trough_price)[np.maximum(before - 1, 0)], -1)
+        pos2, pos3 = gaps[:-1], gaps[1:]
+        has_troughs = (pos1 >= 0) & (pos2 >= 0) & (pos3 >= 0)
+        
+        # Для троек без впадин берется впадина 0 - они все равно отсекаются маской
+        trough1_idx, trough1_price = trough_idx[np.maximum(pos1, 0)], trough_price[np.maximum(pos1, 0)]
+        trough2_price = trough_price[np.maximum(pos2, 0)]
+        trough3_idx, trough3_price = trough_idx[np.maximum(pos3, 0)], trough_price[np.maximum(pos3, 0)]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Пики примерно на одном уровне (разница < 1%). Относительные разницы
+            # соседних пиков считаются один раз: пара (2, 3) тройки k - это пара (1, 2) тройки k + 1
+            peak_steps = np.abs(np.diff(peak_price)) / peak_price[:-1]
+            peak_diff_12, peak_diff_23 = peak_steps[:-1], peak_steps[1:]
+            
+            # Впадины тоже примерно на одном уровне. Впадины 2 и 3 - самые низкие
+            # в соседних промежутках между пиками, их разницы тоже общие для всех троек
+            gap_price = trough_price[np.maximum(gaps, 0)]
+            trough_diff_12 = np.abs(trough1_price - trough2_price) / trough1_price
+            trough_diff_23 = np.abs(np.diff(gap_price)) / gap_price[:-1]
+            
+            # Вычисляем средние уровни
+            avg_resistance = (price1 + price2 + price3) / 3
+            avg_support = (trough1_price + trough2_price + trough3_price) / 3
+            
+            # Уровни горизонтальные (наклоны близки к нулю)
+            resistance_slope = (price3 - price1) / (idx3 - idx1)
+            support_slope = (trough3_price - trough1_price) / (trough3_idx - trough1_idx)
+            avg_price = (avg_resistance + avg_support) / 2
+            
+            rectangle_height = avg_resistance - avg_support
+            pattern_height_pct = rectangle_height / avg_support
+        
+        # Определяем направление на основе тренда до прямоугольника:
+        # смотрим на движение цены за 20 свечей перед первым пиком
+        # (код - индекс в _RECTANGLE_DIRECTIONS: 2 - восходящий тренд, 0 - нисходящий, 1 - нет движения)
+        trend_start = np.maximum(idx1 - 20, 0)
+        direction_code = np.sign(closes[idx1] - closes[trend_start]).astype(np.int8) + 1
+        
+        # Вычисляем целевую цену (высота прямоугольника)
+        target_price = np.where(
+            direction_code == 2,
+            avg_resistance + rectangle_height,
+            avg_support - rectangle_height
+        )
+        
+        # Симметричность прямоугольника
+        symmetry = np.maximum.reduce([peak_diff_12, peak_diff_23, trough_diff_12, trough_diff_23])
+        
+        valid = (
+            has_troughs
+            & ~(peak_diff_12 > 0.01) & ~(peak_diff_23 > 0.01)
+            & ~(trough_diff_12 > 0.01) & ~(trough_diff_23 > 0.01)
+            & ~(np.abs(resistance_slope) / avg_price > 0.0005)
+            & ~(np.abs(support_slope) / avg_price > 0.0005)
+            & ~(pattern_height_pct < min_height)
+        )
+        
+        survivors = np.flatnonzero(valid)
+        found = np.empty(len(survivors), dtype=RECTANGLE_DTYPE)
+        found['triple'] = survivors
+        found['start_idx'] = idx1[survivors]
+        found['end_idx'] = idx3[survivors]
+        found['direction'] = direction_code[survivors]
+        found['reliability'] = self._calculate_reliability_vec(
+            pattern_height_pct[survivors],
+            symmetry[survivors],
+            idx3[survivors] - idx1[survivors]
+        )
+        found['support'] = avg_support[survivors]
+        found['resistance'] = avg_resistance[survivors]
+        found['target'] = target_price[survivors]
+        found['height_pct'] = pattern_height_pct[survivors]
+        found['resistance_slope'] = resistance_slope[survivors]
+        found['support_slope'] = support_slope[survivors]
+        found['trough1'] = pos1[survivors]
+        found['trough2'] = pos2[survivors]
+        found['trough3'] = pos3[survivors]
+        
+        # Словари строятся только на выходе; tolist() сразу дает питоновские числа
+        return [self._rectangle_to_dict(candles, extrema, row) for row in found.tolist()]
+    
+    def _rectangle_to_dict(self, candles: List[Dict], extrema: Extrema, row: Tuple) -> Dict:
+        """Собирает словарь фигуры из записи RECTANGLE_DTYPE (в виде кортежа из tolist())"""
+        (k, start_idx, end_idx, direction, reliability, support, resistance, target,
+         height_pct, resistance_slope, support_slope, trough1, trough2, trough3) = row
+        peaks, troughs = self._extrema_records(candles, extrema)
+        return {
+            'pattern_type': 'rectangle',
+            'pattern_category': 'consolidation',
+            'direction': _RECTANGLE_DIRECTIONS[direction],
+            'reliability': reliability,
+            'start_time': self._candle_datetime(candles, start_idx),
+            'end_time': self._candle_datetime(candles, end_idx),
+            'support_level': support,
+            'resistance_level': resistance,
+            'target_price': target,
+            'pattern_height': height_pct,
+            'pattern_width': end_idx - start_idx,
+            'candles_count': end_idx - start_idx + 1,
+            'is_confirmed': False,
+            'pattern_data': {
+                'peaks': peaks[k:k + 3],
+                'troughs': [troughs[trough1], troughs[trough2], troughs[trough3]],
+                'resistance_slope': resistance_slope,
+                'support_slope': support_slope
+            }
+        }
     
     def _calculate_reliability(
         self, 
@@ -1391,4 +1826,27 @@ class ChartPatternDetector:
             reliability += 0.1
         
         return min(reliability, 1.0)
+    
+    def _calculate_reliability_vec(
+        self,
+        pattern_height_pct: np.ndarray,
+        symmetry: np.ndarray,
+        width: np.ndarray
+    ) -> np.ndarray:
+        """
+        Надежность сразу для массива фигур (см. _calculate_reliability)
+        
+        Бонусы берутся из таблиц по номеру ступени, слагаемые складываются
+        в том же порядке, поэтому значения совпадают со скалярной версией.
+        """
+        height_bonus = self.RELIABILITY_HEIGHT_BONUS[
+            np.searchsorted(self.RELIABILITY_HEIGHT_STEPS, pattern_height_pct, side='left')
+        ]
+        symmetry_bonus = self.RELIABILITY_SYMMETRY_BONUS[
+            np.searchsorted(self.RELIABILITY_SYMMETRY_STEPS, symmetry, side='right')
+        ]
+        width_bonus = self.RELIABILITY_WIDTH_BONUS[
+            np.searchsorted(self.RELIABILITY_WIDTH_STEPS, width, side='right')
+        ]
+        return np.minimum(0.5 + height_bonus + symmetry_bonus + width_bonus, 1.0)
 
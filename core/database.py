@@ -2,11 +2,14 @@
 Модуль для работы с базой данных PostgreSQL
 """
 
+import io
+import json
 import os
+from typing import Any, Iterable, Sequence
 from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import NullPool, QueuePool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,16 +46,31 @@ def init_database():
     try:
         database_url = get_database_url()
         
+        if os.getenv('DB_USE_PGBOUNCER') == '1':
+            # Соединения переиспользует внешний pgbouncer (transaction pooling,
+            # обычно порт 6432 - задается через DB_PORT): свой пул не держим,
+            # потоки не ждут освобождения соединения в QueuePool
+            pool_options = {'poolclass': NullPool}
+        else:
+            # Уменьшаем pool_size чтобы избежать "too many clients"
+            pool_options = {
+                'poolclass': QueuePool,
+                'pool_size': 5,  # Уменьшено с 10 до 5
+                'max_overflow': 10,  # Уменьшено с 20 до 10
+                'pool_pre_ping': True,  # Проверка соединений перед использованием
+                'pool_recycle': 3600,  # Переиспользование соединений каждый час
+            }
+        
         # Создаем engine с пулом соединений
-        # Уменьшаем pool_size чтобы избежать "too many clients"
         engine = create_engine(
             database_url,
-            poolclass=QueuePool,
-            pool_size=5,  # Уменьшено с 10 до 5
-            max_overflow=10,  # Уменьшено с 20 до 10
-            pool_pre_ping=True,  # Проверка соединений перед использованием
-            pool_recycle=3600,  # Переиспользование соединений каждый час
+            **pool_options,
             echo=False,  # Логирование SQL запросов (False для production)
+            # Пакетные INSERT/UPDATE: multi-VALUES для вставок и execute_batch
+            # для остальных executemany - меньше roundtrip'ов к серверу
+            executemany_mode='values_plus_batch',
+            insertmanyvalues_page_size=1000,
+            executemany_batch_page_size=1000,
             connect_args={
                 "connect_timeout": 10,
                 "application_name": "OwnedCore"
@@ -76,12 +94,12 @@ def init_database():
         db_host = os.getenv('DB_HOST', 'localhost')
         db_port = os.getenv('DB_PORT', '5432')
         db_name = os.getenv('DB_NAME', 'ownedcore')
-        logger.info(f"База данных инициализирована: {db_host}:{db_port}/{db_name}")
+        logger.info("База данных инициализирована: %s:%s/%s", db_host, db_port, db_name)
         
         return True
         
     except Exception as e:
-        logger.error(f"Ошибка инициализации базы данных: {e}")
+        logger.error("Ошибка инициализации базы данных: %s", e)
         return False
 
 
@@ -96,7 +114,7 @@ def get_db():
         yield db
     except Exception as e:
         db.rollback()
-        logger.error(f"Ошибка в сессии БД: {e}")
+        logger.error("Ошибка в сессии БД: %s", e)
         raise
     finally:
         db.close()
@@ -104,6 +122,71 @@ def get_db():
         SessionLocal.remove()
 
 
+# Маркер NULL для COPY: COPY CSV считает NULL только незаключенное в кавычки поле,
+# поэтому все строки пишутся в кавычках и совпасть с маркером не могут
+COPY_NULL = '\\N'
+
+
+def _copy_value(value: Any) -> str:
+    """Кодирует значение в поле CSV для COPY: None - маркер NULL, строки - в кавычках"""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    elif not isinstance(value, str):
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _copy_row(row: Sequence[Any]) -> str:
+    """Строка данных COPY ... CSV"""
+    return ','.join(map(_copy_value, row)) + '\n'
+
+
+def bulk_copy(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """
+    Массовая вставка строк через COPY FROM STDIN (в обход ORM).
+
+    Для пакетов из сотен строк заметно быстрее executemany: данные уходят
+    одним потоком, без отдельного INSERT на каждую строку.
+    None записывается как NULL (маркер COPY_NULL), пустые строки остаются
+    пустыми строками, dict/list записываются как JSON.
+    Возвращает количество записанных строк.
+    """
+    if engine is None:
+        raise RuntimeError("Database not initialized")
+
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write(_copy_row(row))
+        count += 1
+    if count == 0:
+        return 0
+    buffer.seek(0)
+
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    sql = f'COPY "{table}" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL \'{COPY_NULL}\')'
+
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        logger.error("Ошибка COPY в таблицу %s: %s", table, e)
+        raise
+    finally:
+        connection.close()
+
+    return count
+
+
 def create_tables():
     """Создает все таблицы в базе данных"""
     try:
@@ -111,7 +194,7 @@ def create_tables():
         logger.info("Таблицы созданы успешно")
         return True
     except Exception as e:
-        logger.error(f"Ошибка создания таблиц: {e}")
+        logger.error("Ошибка создания таблиц: %s", e)
         return False
 
 
@@ -122,7 +205,7 @@ def drop_tables():
         logger.info("Таблицы удалены")
         return True
     except Exception as e:
-        logger.error(f"Ошибка удаления таблиц: {e}")
+        logger.error("Ошибка удаления таблиц: %s", e)
         return False
 
 
@@ -1,10 +1,16 @@
 """
 Утилита для настройки логирования с ротацией файлов
 """
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from pathlib import Path
+from typing import Optional
+
+# Фоновый поток, который пишет записи из очереди в файл и консоль
+_listener: Optional[QueueListener] = None
 
 
 def setup_logging_with_rotation(
@@ -16,6 +22,7 @@ def setup_logging_with_rotation(
     use_timed_rotation: bool = False,
     when: str = 'midnight',  # Для TimedRotatingFileHandler
     interval: int = 1,  # Для TimedRotatingFileHandler
+    use_queue: bool = False,
 ) -> logging.Logger:
     """
     Настраивает логирование с ротацией файлов
@@ -29,10 +36,17 @@ def setup_logging_with_rotation(
         use_timed_rotation: Использовать TimedRotatingFileHandler вместо RotatingFileHandler
         when: Когда делать ротацию ('midnight', 'H', 'D', 'W0' и т.д.)
         interval: Интервал ротации (в комбинации с when)
+        use_queue: Писать через QueueHandler + QueueListener: потоки только кладут
+            записи в очередь, файловый и консольный I/O выполняет отдельный поток
     
     Returns:
         Настроенный logger
     """
+    # ID процесса и потока собираются для каждой записи, только если они есть в формате
+    # (флаги общие для процесса, поэтому выставляются в обе стороны при каждой настройке)
+    logging.logProcesses = '%(process' in format_string
+    logging.logThreads = '%(thread' in format_string
+    
     # Создаем директорию для логов если её нет
     log_path = Path(log_file)
     log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -73,6 +87,16 @@ def setup_logging_with_rotation(
     
     # Удаляем существующие handlers чтобы избежать дублирования
     root_logger.handlers.clear()
+    stop_logging_listener()
+    
+    if use_queue:
+        # Handlers отдаются listener'у, на root остается только постановка в очередь
+        global _listener
+        log_queue = queue.Queue(-1)
+        root_logger.addHandler(QueueHandler(log_queue))
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        return root_logger
     
     # Добавляем новые handlers
     root_logger.addHandler(file_handler)
@@ -81,6 +105,18 @@ def setup_logging_with_rotation(
     return root_logger
 
 
+def stop_logging_listener():
+    """Останавливает фоновую запись логов, дописав все записи из очереди"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Записи, оставшиеся в очереди при выходе, не должны теряться
+atexit.register(stop_logging_listener)
+
+
 def setup_analysis_logging() -> logging.Logger:
     """
     Настраивает логирование для анализа с ротацией по размеру (10 MB, 5 копий)
@@ -101,7 +137,8 @@ def setup_server_logging() -> logging.Logger:
         log_file='logs/server_multithreaded.log',
         max_bytes=10 * 1024 * 1024,  # 10 MB
         backup_count=5,
-        level=logging.INFO
+        level=logging.INFO,
+        use_queue=True  # Четыре потока сервера не должны ждать друг друга на записи в файл
     )
 
 
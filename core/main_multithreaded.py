@@ -12,13 +12,15 @@ import asyncio
 import aiohttp
 from aiohttp import web
 import json
+import orjson
 from datetime import datetime, timedelta, timezone
 import logging
 import os
 import threading
-import queue
-import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
 from analysis_engine import analysis_engine, TRADING_PAIRS
 from signal_manager import signal_manager, SignalManager
 
@@ -32,52 +34,149 @@ logger = logging.getLogger(__name__)
 
 # Глобальные переменные для кэширования (потокобезопасные)
 class ThreadSafeCache:
+    """
+    Кэш со снимками: писатель публикует новый объект заменой ссылки,
+    читатель получает текущий снимок без копирования и без блокировки
+    (присваивание ссылки в CPython атомарно). Опубликованные данные не
+    изменяются - обработчики, которым нужно что-то добавить, строят новый dict.
+
+    Рядом со снимками хранятся готовые JSON-ответы (bytes): сериализация
+    делается один раз при обновлении, а не на каждый HTTP-запрос.
+    """
     def __init__(self):
         self._lock = threading.Lock()
-        self._analysis_cache = {}
-        self._last_analysis_time = None
-        self._signals_cache = []
+        # (данные, время обновления) - одной ссылкой, чтобы читать согласованную пару
+        self._analysis_snapshot = ({}, None)
+        self._signals_snapshot = ({}, None)
         self._levels_cache = {}
-        self._last_signals_update = None
+        # Готовые ответы API; None - сериализовать не удалось (отвечаем через json_response)
+        self._signals_json = None
+        self._levels_json = None
+        # Статус пар зависит от анализа и уровней, строится при первом запросе после обновления
+        self._pairs_status_json = None
+    
+    @staticmethod
+    def _to_json(data):
+        try:
+            return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except TypeError as e:
+            logger.warning(f"Не удалось заранее сериализовать данные кэша: {e}")
+            return None
         
     def update_analysis_cache(self, data):
         with self._lock:
-            self._analysis_cache = data
-            self._last_analysis_time = datetime.now()
+            self._analysis_snapshot = (data, datetime.now())
+            self._pairs_status_json = None
             
     def get_analysis_cache(self):
-        with self._lock:
-            return self._analysis_cache.copy(), self._last_analysis_time
+        return self._analysis_snapshot
             
     def update_signals_cache(self, data):
+        signals_json = self._to_json(data)
         with self._lock:
-            self._signals_cache = data
-            self._last_signals_update = datetime.now()
+            self._signals_snapshot = (data, datetime.now())
+            self._signals_json = signals_json
             
     def get_signals_cache(self):
-        with self._lock:
-            return self._signals_cache.copy(), self._last_signals_update
+        return self._signals_snapshot
+    
+    def get_signals_json(self):
+        return self._signals_json
             
     def update_levels_cache(self, data):
+        levels_json = self._to_json(data)
         with self._lock:
             self._levels_cache = data
+            self._levels_json = levels_json
+            self._pairs_status_json = None
             
     def get_levels_cache(self):
+        return self._levels_cache
+    
+    def get_levels_json(self):
+        return self._levels_json
+    
+    def get_pairs_status_json(self):
+        """Готовый ответ статуса пар (анализ + активные уровни) или None, если анализа еще нет"""
+        pairs_status_json = self._pairs_status_json
+        if pairs_status_json is not None:
+            return pairs_status_json
         with self._lock:
-            return self._levels_cache.copy()
+            analysis_data, _ = self._analysis_snapshot
+            if not analysis_data:
+                return None
+            if self._pairs_status_json is None:
+                self._pairs_status_json = self._to_json({**analysis_data, 'active_levels': self._levels_cache})
+            return self._pairs_status_json
+
+def cached_json_response(body):
+    """Ответ из заранее сериализованного JSON"""
+    return web.Response(body=body, content_type='application/json')
 
 # Создаем глобальный потокобезопасный кэш
 cache = ThreadSafeCache()
 
+class CommandQueue:
+    """
+    Очередь команд рабочему потоку: deque + Event вместо queue.Queue
+
+    Поток ждет следующего цикла через wait(), а не time.sleep(), поэтому
+    команда (STOP, FORCE_ANALYSIS) будит его сразу, а не после паузы.
+    append/popleft у deque атомарны, отдельная блокировка не нужна.
+    """
+    def __init__(self):
+        self._commands = deque()
+        self._event = threading.Event()
+    
+    def put(self, command):
+        self._commands.append(command)
+        self._event.set()
+    
+    def get_nowait(self):
+        """Следующая команда или None, если очередь пуста"""
+        # Сбрасываем флаг до извлечения: команда, добавленная после этого, снова его выставит
+        self._event.clear()
+        try:
+            return self._commands.popleft()
+        except IndexError:
+            return None
+    
+    def wait(self, timeout):
+        """Пауза до timeout секунд, прерываемая новой командой"""
+        if not self._commands:
+            self._event.wait(timeout)
+
 # Очереди для межпоточного взаимодействия
-analysis_queue = queue.Queue()
-signals_queue = queue.Queue()
-levels_queue = queue.Queue()
+analysis_queue = CommandQueue()
+signals_queue = CommandQueue()
+levels_queue = CommandQueue()
 
 # Флаги состояния потоков
 analysis_running = False
 signals_running = False
 
+@lru_cache(maxsize=32768)
+def _iso_to_epoch(timestamp):
+    """ISO-строка в секунды epoch (None, если не разбирается); одни и те же сигналы разбираются один раз"""
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+def signal_epoch(signal):
+    """Время сигнала в секундах epoch или None"""
+    timestamp = signal.get('timestamp')
+    return _iso_to_epoch(timestamp) if isinstance(timestamp, str) else None
+
+def summary_period_bounds():
+    """Начало сегодняшнего дня, неделя и месяц назад - в секундах epoch"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return (
+        today.timestamp(),
+        (today - timedelta(days=7)).timestamp(),
+        (today - timedelta(days=30)).timestamp()
+    )
+
 # ============================================================================
 # THREAD 1: ВЕБ-СЕРВЕР (обработка HTTP запросов)
 # ============================================================================
@@ -85,13 +184,16 @@ signals_running = False
 async def get_pairs_status(request):
     """Статус всех торговых пар"""
     try:
+        pairs_status_json = cache.get_pairs_status_json()
+        if pairs_status_json is not None:
+            return cached_json_response(pairs_status_json)
+        
         analysis_data, last_update = cache.get_analysis_cache()
         levels_data = cache.get_levels_cache()
         
         if analysis_data:
-            # Добавляем активные уровни к данным анализа
-            analysis_data['active_levels'] = levels_data
-            return web.json_response(analysis_data)
+            # Добавляем активные уровни к данным анализа (снимок кэша не изменяем)
+            return web.json_response({**analysis_data, 'active_levels': levels_data})
         else:
             return web.json_response({
                 'timestamp': datetime.now().isoformat(),
@@ -109,65 +211,66 @@ async def get_signals(request):
     """Получение всех сигналов с статистикой"""
     try:
         signals_data, last_update = cache.get_signals_cache()
+        signals_json = cache.get_signals_json()
+        if signals_json is not None and signals_data.get('success'):
+            return cached_json_response(signals_json)
         if signals_data:
-            # Добавляем поле success если его нет
+            # Добавляем поле success если его нет (снимок кэша не изменяем)
             if 'success' not in signals_data:
-                signals_data['success'] = True
+                signals_data = {**signals_data, 'success': True}
             return web.json_response(signals_data)
         else:
             # Если кэш пуст, загружаем напрямую
             all_signals = signal_manager.load_recent_signals(limit=1000)
             
             # Подготавливаем базовую статистику
-            now = datetime.now()
-            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            week_ago = today - timedelta(days=7)
-            month_ago = today - timedelta(days=30)
-            
-            summary = {
-                'total_count': len(all_signals),
-                'long_count': 0,
-                'short_count': 0,
-                'today_count': 0,
-                'week_count': 0,
-                'month_count': 0,
-                'profit_count': 0,
-                'loss_count': 0,
-                'in_progress_count': 0,
-                'today_result': 0.0,
-                'week_result': 0.0,
-                'month_result': 0.0
-            }
+            today, week_ago, month_ago = summary_period_bounds()
+            long_count = short_count = 0
+            today_count = week_count = month_count = 0
+            profit_count = loss_count = in_progress_count = 0
             
             # Подсчитываем статистику
             for signal in all_signals:
                 # Подсчет по типу сигнала
                 signal_type = (signal.get('signal_type') or signal.get('type') or '').upper()
                 if signal_type == 'LONG':
-                    summary['long_count'] += 1
+                    long_count += 1
                 elif signal_type == 'SHORT':
-                    summary['short_count'] += 1
+                    short_count += 1
                 
                 # Подсчет по времени
-                try:
-                    signal_time = datetime.fromisoformat(signal.get('timestamp', '').replace('Z', '+00:00'))
+                signal_time = signal_epoch(signal)
+                if signal_time is not None:
                     if signal_time >= today:
-                        summary['today_count'] += 1
+                        today_count += 1
                     if signal_time >= week_ago:
-                        summary['week_count'] += 1
+                        week_count += 1
                     if signal_time >= month_ago:
-                        summary['month_count'] += 1
-                except:
-                    pass
+                        month_count += 1
                 
                 # Подсчет по результату
                 result = signal.get('calculated_result', 0)
                 if result > 0:
-                    summary['profit_count'] += 1
+                    profit_count += 1
                 elif result < 0:
-                    summary['loss_count'] += 1
+                    loss_count += 1
                 else:
-                    summary['in_progress_count'] += 1
+                    in_progress_count += 1
+            
+            summary = {
+                'total_count': len(all_signals),
+                'long_count': long_count,
+                'short_count': short_count,
+                'today_count': today_count,
+                'week_count': week_count,
+                'month_count': month_count,
+                'profit_count': profit_count,
+                'loss_count': loss_count,
+                'in_progress_count': in_progress_count,
+                'today_result': 0.0,
+                'week_result': 0.0,
+                'month_result': 0.0
+            }
             
             return web.json_response({
                 'success': True,
@@ -181,6 +284,9 @@ async def get_signals(request):
 async def get_levels(request):
     """Получение активных уровней"""
     try:
+        levels_json = cache.get_levels_json()
+        if levels_json is not None:
+            return cached_json_response(levels_json)
         levels_data = cache.get_levels_cache()
         return web.json_response(levels_data)
     except Exception as e:
@@ -311,16 +417,13 @@ def analysis_worker():
     while True:
         try:
             # Проверяем очередь на наличие команд
-            try:
-                command = analysis_queue.get_nowait()
-                if command == 'STOP':
-                    logger.info("Получена команда остановки анализа")
-                    break
-            except queue.Empty:
-                pass
+            command = analysis_queue.get_nowait()
+            if command == 'STOP':
+                logger.info("Получена команда остановки анализа")
+                break
             
             if analysis_running:
-                time.sleep(10)  # Ждем если анализ уже запущен
+                analysis_queue.wait(10)  # Ждем если анализ уже запущен
                 continue
             
             analysis_running = True
@@ -355,19 +458,28 @@ def analysis_worker():
             analysis_running = False
             
             # Ждем 1 минуту до следующего анализа
-            time.sleep(60)
+            analysis_queue.wait(60)
             
         except Exception as e:
             logger.error(f"Критическая ошибка в потоке анализа: {e}")
             analysis_running = False
-            time.sleep(30)
+            analysis_queue.wait(30)
 
 # ============================================================================
 # THREAD 3: РАСЧЕТ СИГНАЛОВ (обновление P&L и статистики)
 # ============================================================================
 
-async def analyze_signal_price_movement(signal_data):
-    """Анализирует движение цены для сигнала и возвращает проценты движения."""
+# Свечи, по которым считается результат сигнала
+SIGNAL_CANDLES_TIMEFRAME = '15m'
+SIGNAL_CANDLES_LIMIT = 300
+
+async def analyze_signal_price_movement(signal_data, ohlcv_cache=None):
+    """
+    Анализирует движение цены для сигнала и возвращает проценты движения.
+
+    ohlcv_cache - свечи, уже загруженные за этот проход, по ключу (pair, timeframe);
+    недостающие загружаются и добавляются в него.
+    """
     try:
         pair = signal_data.get('pair')
         entry_price = signal_data.get('entry_price', 0)
@@ -382,7 +494,12 @@ async def analyze_signal_price_movement(signal_data):
         except Exception:
             entry_time = datetime.now()
         
-        candles = await analysis_engine.fetch_ohlcv(pair, '15m', 300)
+        cache_key = (pair, SIGNAL_CANDLES_TIMEFRAME)
+        candles = ohlcv_cache.get(cache_key) if ohlcv_cache is not None else None
+        if candles is None:
+            candles = await analysis_engine.fetch_ohlcv(pair, SIGNAL_CANDLES_TIMEFRAME, SIGNAL_CANDLES_LIMIT)
+            if ohlcv_cache is not None:
+                ohlcv_cache[cache_key] = candles
         
         if not candles:
             return 0, 0, 0
@@ -397,40 +514,68 @@ async def analyze_signal_price_movement(signal_data):
         if entry_index == -1:
             return 0, 0, 0
         
-        max_favorable_move = 0.0
-        max_adverse_move = 0.0
+        if signal_type not in ('LONG', 'SHORT'):
+            return 0, 0.0, 0.0
         
-        for candle in candles[entry_index:]:
-            high_price = candle.get('high', candle.get('close'))
-            low_price = candle.get('low', candle.get('close'))
-            
-            if signal_type == 'LONG':
-                favorable = max(0.0, ((high_price - entry_price) / entry_price) * 100)
-                adverse = max(0.0, ((entry_price - low_price) / entry_price) * 100)
-                max_favorable_move = max(max_favorable_move, favorable)
-                max_adverse_move = max(max_adverse_move, adverse)
-                
-                if max_adverse_move >= 0.5:
-                    return -0.5, max_favorable_move, max_adverse_move
-                if max_favorable_move >= 1.5:
-                    return 1.5, max_favorable_move, max_adverse_move
-            
-            elif signal_type == 'SHORT':
-                favorable = max(0.0, ((entry_price - low_price) / entry_price) * 100)
-                adverse = max(0.0, ((high_price - entry_price) / entry_price) * 100)
-                max_favorable_move = max(max_favorable_move, favorable)
-                max_adverse_move = max(max_adverse_move, adverse)
-                
-                if max_adverse_move >= 0.5:
-                    return -0.5, max_favorable_move, max_adverse_move
-                if max_favorable_move >= 1.5:
-                    return 1.5, max_favorable_move, max_adverse_move
+        after_entry = candles[entry_index:]
+        highs = np.fromiter((c.get('high', c.get('close')) for c in after_entry), dtype=np.float64, count=len(after_entry))
+        lows = np.fromiter((c.get('low', c.get('close')) for c in after_entry), dtype=np.float64, count=len(after_entry))
         
-        return 0, max_favorable_move, max_adverse_move
+        # Движение в процентах от входа по каждой свече
+        if signal_type == 'LONG':
+            favorable = ((highs - entry_price) / entry_price) * 100
+            adverse = ((entry_price - lows) / entry_price) * 100
+        else:
+            favorable = ((entry_price - lows) / entry_price) * 100
+            adverse = ((highs - entry_price) / entry_price) * 100
+        
+        # Максимальное движение к каждой свече (отрицательное движение считается нулем)
+        max_favorable = np.maximum.accumulate(np.where(favorable > 0.0, favorable, 0.0))
+        max_adverse = np.maximum.accumulate(np.where(adverse > 0.0, adverse, 0.0))
+        
+        # Первая свеча, на которой сработал стоп (-0.5%) или тейк (+1.5%);
+        # если на одной свече оба - приоритет у стопа
+        stop_hit = max_adverse >= 0.5
+        hit = stop_hit | (max_favorable >= 1.5)
+        if hit.any():
+            i = int(hit.argmax())
+            result = -0.5 if stop_hit[i] else 1.5
+            return result, float(max_favorable[i]), float(max_adverse[i])
+        
+        return 0, float(max_favorable[-1]), float(max_adverse[-1])
     except Exception as e:
         logger.error(f"Ошибка анализа движения цены: {e}")
         return 0, 0, 0
 
+# Сколько пар одновременно загружают свечи
+SIGNALS_ANALYSIS_CONCURRENCY = 50
+
+async def analyze_signals_price_movement(signals):
+    """
+    Анализирует движение цены сразу для списка сигналов
+
+    Свечи загружаются один раз на пару (сигналов по одной паре обычно много),
+    конкурентно - не больше SIGNALS_ANALYSIS_CONCURRENCY загрузок одновременно.
+    Дальше сигналы считаются по уже загруженным свечам. Результаты идут
+    в порядке сигналов.
+    """
+    semaphore = asyncio.Semaphore(SIGNALS_ANALYSIS_CONCURRENCY)
+    
+    async def fetch(pair):
+        async with semaphore:
+            return await analysis_engine.fetch_ohlcv(pair, SIGNAL_CANDLES_TIMEFRAME, SIGNAL_CANDLES_LIMIT)
+    
+    pairs = list(dict.fromkeys(signal.get('pair') for signal in signals if signal.get('pair')))
+    fetched = await asyncio.gather(*(fetch(pair) for pair in pairs), return_exceptions=True)
+    ohlcv_cache = {}
+    for pair, candles in zip(pairs, fetched):
+        if isinstance(candles, BaseException):
+            logger.error(f"Ошибка загрузки свечей {pair} для расчета сигналов: {candles}")
+            candles = []
+        ohlcv_cache[(pair, SIGNAL_CANDLES_TIMEFRAME)] = candles
+    
+    return [await analyze_signal_price_movement(signal, ohlcv_cache) for signal in signals]
+
 def signals_worker():
     """Рабочий поток для расчета сигналов"""
     global signals_running
@@ -440,16 +585,13 @@ def signals_worker():
     while True:
         try:
             # Проверяем очередь на наличие команд
-            try:
-                command = signals_queue.get_nowait()
-                if command == 'STOP':
-                    logger.info("Получена команда остановки расчета сигналов")
-                    break
-            except queue.Empty:
-                pass
+            command = signals_queue.get_nowait()
+            if command == 'STOP':
+                logger.info("Получена команда остановки расчета сигналов")
+                break
             
             if signals_running:
-                time.sleep(10)  # Ждем если расчет уже запущен
+                signals_queue.wait(10)  # Ждем если расчет уже запущен
                 continue
             
             signals_running = True
@@ -469,13 +611,21 @@ def signals_worker():
                 
                 logger.info(f"Найдено {len(all_signals)} сигналов для расчета результатов")
                 
-                # Рассчитываем результаты для каждого сигнала
+                # Анализируем движение цены по свечам от точки входа - для всех сигналов сразу
+                movements = loop.run_until_complete(analyze_signals_price_movement(all_signals))
+                
+                # Границы периодов для статистики
+                today, week_ago, month_ago = summary_period_bounds()
+                
+                # Счетчики статистики - локальные переменные, словарь собирается после цикла
+                long_count = short_count = 0
+                today_count = week_count = month_count = 0
+                profit_count = loss_count = in_progress_count = 0
+                today_result = week_result = month_result = 0.0
+                
+                # Рассчитываем результаты для каждого сигнала и за тот же проход - статистику
                 updated_signals = []
-                for signal in all_signals:
-                    # Анализируем движение цены по свечам от точки входа
-                    result, max_favorable, max_adverse = loop.run_until_complete(
-                        analyze_signal_price_movement(signal)
-                    )
+                for signal, (result, max_favorable, max_adverse) in zip(all_signals, movements):
                     signal['calculated_result'] = result
                     signal['max_favorable_move'] = round(max_favorable, 4)
                     signal['max_adverse_move'] = round(max_adverse, 4)
@@ -504,70 +654,60 @@ def signals_worker():
                         signal['exit_price'] = None
                         signal['exit_timestamp'] = None
                     updated_signals.append(signal)
-                
-                # Сохраняем обновленные сигналы
-                if updated_signals:
-                    signal_manager.save_signals_batch(updated_signals)
-                    logger.info(f"Обновлено {len(updated_signals)} сигналов с результатами")
-                
-                # Подготавливаем данные для кэша
-                now = datetime.now()
-                today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                week_ago = today - timedelta(days=7)
-                month_ago = today - timedelta(days=30)
-                
-                summary = {
-                    'total_count': len(updated_signals),
-                    'long_count': 0,
-                    'short_count': 0,
-                    'today_count': 0,
-                    'week_count': 0,
-                    'month_count': 0,
-                    'profit_count': 0,
-                    'loss_count': 0,
-                    'in_progress_count': 0,
-                    'today_result': 0.0,
-                    'week_result': 0.0,
-                    'month_result': 0.0
-                }
-                
-                for signal in updated_signals:
+                    
                     # Подсчет по типу сигнала
-                    signal_type = (signal.get('signal_type') or signal.get('type') or '').upper()
-                    if signal_type == 'LONG':
-                        summary['long_count'] += 1
-                    elif signal_type == 'SHORT':
-                        summary['short_count'] += 1
+                    summary_type = (signal.get('signal_type') or signal.get('type') or '').upper()
+                    if summary_type == 'LONG':
+                        long_count += 1
+                    elif summary_type == 'SHORT':
+                        short_count += 1
                     
-                    # Подсчет по времени
-                    signal_time = datetime.fromisoformat(signal.get('timestamp', '').replace('Z', '+00:00'))
+                    # Подсчет по времени (сигналы без разбираемого времени в периоды не попадают)
+                    signal_time = signal_epoch(signal)
+                    if signal_time is None:
+                        signal_time = float('-inf')
                     if signal_time >= today:
-                        summary['today_count'] += 1
+                        today_count += 1
                     if signal_time >= week_ago:
-                        summary['week_count'] += 1
+                        week_count += 1
                     if signal_time >= month_ago:
-                        summary['month_count'] += 1
+                        month_count += 1
                     
                     # Подсчет по результату
-                    result = signal.get('calculated_result', 0)
                     if result > 0:
-                        summary['profit_count'] += 1
-                        if signal_time >= today:
-                            summary['today_result'] += result
-                        if signal_time >= week_ago:
-                            summary['week_result'] += result
-                        if signal_time >= month_ago:
-                            summary['month_result'] += result
+                        profit_count += 1
                     elif result < 0:
-                        summary['loss_count'] += 1
+                        loss_count += 1
+                    else:
+                        in_progress_count += 1
+                    if result:
                         if signal_time >= today:
-                            summary['today_result'] += result
+                            today_result += result
                         if signal_time >= week_ago:
-                            summary['week_result'] += result
+                            week_result += result
                         if signal_time >= month_ago:
-                            summary['month_result'] += result
-                    else:
-                        summary['in_progress_count'] += 1
+                            month_result += result
+                
+                # Сохраняем обновленные сигналы
+                if updated_signals:
+                    signal_manager.save_signals_batch(updated_signals)
+                    logger.info(f"Обновлено {len(updated_signals)} сигналов с результатами")
+                
+                # Подготавливаем данные для кэша
+                summary = {
+                    'total_count': len(updated_signals),
+                    'long_count': long_count,
+                    'short_count': short_count,
+                    'today_count': today_count,
+                    'week_count': week_count,
+                    'month_count': month_count,
+                    'profit_count': profit_count,
+                    'loss_count': loss_count,
+                    'in_progress_count': in_progress_count,
+                    'today_result': today_result,
+                    'week_result': week_result,
+                    'month_result': month_result
+                }
                 
                 # Обновляем кэш сигналов
                 cache.update_signals_cache({
@@ -586,12 +726,12 @@ def signals_worker():
             signals_running = False
             
             # Ждем 5 минут до следующего расчета
-            time.sleep(300)
+            signals_queue.wait(300)
             
         except Exception as e:
             logger.error(f"Критическая ошибка в потоке сигналов: {e}")
             signals_running = False
-            time.sleep(30)
+            signals_queue.wait(30)
 
 # ============================================================================
 # THREAD 4: КЭШИРОВАНИЕ (управление общим кэшем)
@@ -604,13 +744,10 @@ def cache_worker():
     while True:
         try:
             # Проверяем очередь на наличие команд
-            try:
-                command = levels_queue.get_nowait()
-                if command == 'STOP':
-                    logger.info("Получена команда остановки кэширования")
-                    break
-            except queue.Empty:
-                pass
+            command = levels_queue.get_nowait()
+            if command == 'STOP':
+                logger.info("Получена команда остановки кэширования")
+                break
             
             # Обновляем кэш уровней
             try:
@@ -622,11 +759,11 @@ def cache_worker():
                 logger.error(f"Ошибка обновления кэша уровней: {e}")
             
             # Ждем 30 секунд до следующего обновления
-            time.sleep(30)
+            levels_queue.wait(30)
             
         except Exception as e:
             logger.error(f"Критическая ошибка в потоке кэширования: {e}")
-            time.sleep(30)
+            levels_queue.wait(30)
 
 # ============================================================================
 # ОСНОВНАЯ ФУНКЦИЯ ЗАПУСКА
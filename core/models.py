@@ -110,6 +110,7 @@ class Signal(Base):
     # Индексы для быстрого поиска
     __table_args__ = (
         Index('idx_signals_pair_timestamp', 'pair_id', 'timestamp'),
+        Index('idx_signals_pair_level_price', 'pair_id', 'level_price'),
         Index('idx_signals_status', 'status'),
         Index('idx_signals_type', 'signal_type'),
     )
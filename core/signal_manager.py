@@ -96,8 +96,13 @@ class SignalManager:
         os.makedirs(self.levels_dir, exist_ok=True)
         os.makedirs("logs", exist_ok=True)
     
-    def save_signal(self, signal_data: Dict[str, Any]) -> bool:
-        """Сохраняет новый сигнал в файл и в базу данных"""
+    def save_signal(self, signal_data: Dict[str, Any]) -> Optional[int]:
+        """
+        Сохраняет новый сигнал в файл и в базу данных.
+        Возвращает ID сигнала в БД (нового или уже существующего актуального),
+        None - если сигнал не удалось записать в БД.
+        """
+        signal_id = None
         try:
             # Нормализуем данные сигнала
             normalized_signal = self._prepare_signal_for_storage(signal_data)
@@ -159,7 +164,7 @@ class SignalManager:
                                     signal_age = (dt.now(timezone.utc) - existing_signal.timestamp.replace(tzinfo=timezone.utc)).total_seconds()
                                     logger.warning(f"⚠️ Актуальный сигнал для уровня {level_price} уже существует (ID: {existing_signal.id}, создан: {existing_signal.timestamp}, возраст: {signal_age/60:.1f} мин, статус: {existing_signal.status}). Пропускаем создание дубликата.")
                                     session.close()
-                                    return True  # Возвращаем True, так как актуальный сигнал уже существует
+                                    return existing_signal.id  # Актуальный сигнал уже существует
                             
                             # Парсим timestamp
                             timestamp_str = signal_data.get('timestamp', dt.now().isoformat())
@@ -242,7 +247,8 @@ class SignalManager:
                             session.add(signal)
                             session.commit()
                             logger.info(f"✅ Сигнал сохранен в БД синхронно: {signal_data.get('pair')} {signal_data.get('signal_type')} @ {signal_data.get('level_price')} (ID: {signal.id})")
-                            self._enqueue_demo_trade(signal.id)
+                            signal_id = signal.id
+                            self._enqueue_demo_trade(signal_id)
                     except Exception as db_error:
                         session.rollback()
                         logger.error(f"❌ Ошибка синхронного сохранения сигнала в БД: {db_error}")
@@ -271,11 +277,11 @@ class SignalManager:
                 traceback.print_exc()
             
             logger.info(f"СИГНАЛ: {signal_data.get('pair')} {signal_data.get('signal_type')} на уровне {signal_data.get('level_price')}")
-            return True
+            return signal_id
             
         except Exception as e:
             logger.error(f"Ошибка сохранения сигнала: {e}")
-            return False
+            return None
 
     def _enqueue_demo_trade(self, signal_id: int) -> None:
         """Отправляет сигнал в Celery для автоматической live-торговли."""
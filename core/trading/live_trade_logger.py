@@ -4,7 +4,9 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import insert
 
 from core import database
 from core.models import Signal, SignalLiveLog
@@ -83,3 +85,52 @@ def log_signal_event(
 
     return log_entry
 
+
+def log_signal_events(
+    session,
+    signal_id: int,
+    events: List[Dict[str, Any]],
+    commit: bool = False,
+) -> int:
+    """
+    Пакетно записывает несколько событий по одному сигналу одним INSERT (executemany).
+
+    Каждое событие - словарь с ключами message, event_type, status, details.
+    Возвращает количество записанных строк.
+    """
+    rows = [
+        {
+            "signal_id": int(signal_id),
+            "event_type": event.get("event_type"),
+            "status": event.get("status"),
+            "message": event["message"][:500],
+            "details": event.get("details") or {},
+        }
+        for event in events
+        if event.get("message")
+    ]
+    if not rows:
+        return 0
+
+    own_session = False
+    try:
+        session, own_session = _ensure_session(session)
+    except RuntimeError as err:
+        logger.warning("Не удалось создать логи по сигналу: %s", err)
+        return 0
+
+    try:
+        session.execute(insert(SignalLiveLog), rows)
+        if commit:
+            session.commit()
+        else:
+            session.flush()
+    except Exception as err:
+        session.rollback()
+        logger.exception("Ошибка пакетной записи логов сигнала %s: %s", signal_id, err)
+        return 0
+    finally:
+        if own_session:
+            session.close()
+
+    return len(rows)
@@ -0,0 +1,25 @@
+"""add_signals_pair_level_price_index
+
+Revision ID: b7d2e4a19c3f
+Revises: f04cecdee35b
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4a19c3f'
+down_revision = 'f04cecdee35b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Индекс для проверки дубликатов сигналов по диапазону цены уровня
+    op.create_index('idx_signals_pair_level_price', 'signals', ['pair_id', 'level_price'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_signals_pair_level_price', table_name='signals')
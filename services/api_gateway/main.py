@@ -15,6 +15,7 @@ import logging
 from pathlib import Path
 import sys
 import math
+import time
 from typing import Literal, Optional
 
 # Добавляем корневую директорию в путь
@@ -151,7 +152,7 @@ async def get_pairs_status(db=Depends(get_db)):
     """Получает статус всех торговых пар"""
     try:
         # Пытаемся получить из кэша
-        cached_data = cache.get('analysis:all_pairs')
+        cached_data = cache.get('analysis:all_pairs', local=True)
         if cached_data and cached_data.get('status') == 'success':
             return JSONResponse(content=cached_data)
         
@@ -871,6 +872,7 @@ async def get_potential_signals(db=Depends(get_db)):
                                 updated_meta['metadata'] = {}
                             updated_meta['metadata']['elder_screens'] = screens_details
                             updated_meta['metadata']['elder_screens_checked_at'] = datetime.now().isoformat()
+                            updated_meta['metadata']['elder_screens_checked_at_ts'] = time.time()
                             updated_meta['metadata']['elder_screens_passed'] = screens_passed
                             
                             # Обновляем в БД
@@ -1453,7 +1455,7 @@ async def get_chart_data(pair: str, timeframe: str = "15m", db=Depends(get_db)):
         
         # Пытаемся получить из кэша сначала
         cache_key = f"chart_data:{pair}:{timeframe}"
-        cached_data = cache.get(cache_key)
+        cached_data = cache.get(cache_key, local=True)
         
         candles_list = None
         cache_hit = False
@@ -1702,7 +1704,7 @@ async def get_signal_chart_data(signal_id: int, timeframe: str = "15m", db=Depen
         
         # Получаем данные графика
         cache_key = f"signal_chart_data:{signal_id}:{timeframe}"
-        cached_data = cache.get(cache_key)
+        cached_data = cache.get(cache_key, local=True)
         
         candles_list = None
         cache_hit = False
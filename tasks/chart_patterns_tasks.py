@@ -236,35 +236,33 @@ def detect_chart_patterns_periodic():
             '4h': 200    # ~33 дня
         }
         
-        total_patterns = 0
-        total_pairs = 0
+        # Пары независимы, поэтому каждая пара/таймфрейм уходит отдельной задачей:
+        # детекция параллелится по процессам воркеров, а не идет последовательно в одном.
+        # Результаты (число фигур) логирует сама задача пары.
+        tasks_dispatched = 0
         
         for pair in TRADING_PAIRS:
             for timeframe in timeframes:
                 try:
-                    result = detect_chart_patterns_for_pair(
+                    detect_chart_patterns_for_pair.delay(
                         pair,
                         timeframe,
                         lookback_candles.get(timeframe, 200)
                     )
-                    
-                    if result.get('success'):
-                        total_patterns += result.get('patterns_found', 0)
-                        total_pairs += 1
+                    tasks_dispatched += 1
                     
                 except Exception as e:
-                    logger.error(f"❌ Ошибка детекции фигур для {pair} {timeframe}: {e}", exc_info=True)
+                    logger.error(f"❌ Ошибка постановки детекции фигур для {pair} {timeframe}: {e}", exc_info=True)
                     continue
         
         logger.info(
-            f"✅ Периодическая детекция ценовых фигур завершена: "
-            f"обработано {total_pairs} пар, обнаружено {total_patterns} фигур"
+            f"✅ Периодическая детекция ценовых фигур запущена: "
+            f"поставлено {tasks_dispatched} задач ({len(TRADING_PAIRS)} пар x {len(timeframes)} таймфреймов)"
         )
         
         return {
             'success': True,
-            'patterns_found': total_patterns,
-            'pairs_processed': total_pairs
+            'tasks_dispatched': tasks_dispatched
         }
         
     except Exception as e:
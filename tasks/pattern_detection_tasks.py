@@ -72,14 +72,14 @@ def detect_patterns_for_pair(pair: str, timeframe: str, lookback_candles: int =
                 existing = db.query(CandlestickPattern).filter(
                     CandlestickPattern.symbol == pair,
                     CandlestickPattern.timeframe == timeframe,
-                    CandlestickPattern.pattern_type == pattern_data['pattern_type'],
-                    CandlestickPattern.timestamp == pattern_data['timestamp']
+                    CandlestickPattern.pattern_type == pattern_data.pattern_type,
+                    CandlestickPattern.timestamp == pattern_data.timestamp
                 ).first()
                 
                 if existing:
                     # Обновляем существующий паттерн (помечаем как активный)
                     existing.is_active = True
-                    existing.reliability = pattern_data['reliability']
+                    existing.reliability = pattern_data.reliability
                     existing.updated_at = datetime.now(timezone.utc)
                     skipped_count += 1
                 else:
@@ -87,13 +87,13 @@ def detect_patterns_for_pair(pair: str, timeframe: str, lookback_candles: int =
                     pattern = CandlestickPattern(
                         symbol=pair,
                         timeframe=timeframe,
-                        pattern_type=pattern_data['pattern_type'],
-                        direction=pattern_data['direction'],
-                        reliability=pattern_data['reliability'],
-                        candles_indices=pattern_data['candles_indices'],
-                        timestamp=pattern_data['timestamp'],
-                        price=pattern_data['price'],
-                        pattern_zone=pattern_data.get('pattern_zone', 'neutral'),
+                        pattern_type=pattern_data.pattern_type,
+                        direction=pattern_data.direction,
+                        reliability=pattern_data.reliability,
+                        candles_indices=list(pattern_data.candles_indices),
+                        timestamp=pattern_data.timestamp,
+                        price=pattern_data.price,
+                        pattern_zone=pattern_data.pattern_zone,
                         is_active=True
                     )
                     db.add(pattern)
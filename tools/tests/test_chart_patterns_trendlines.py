@@ -0,0 +1,73 @@
+"""
+Регрессионная проверка линий тренда треугольников на горизонтальных уровнях
+
+Линии по последним k swing-точкам (_suffix_linreg) должны совпадать с
+linear_regression по тем же точкам до последнего бита: на горизонтальном
+уровне другой порядок сложения дает наклон ~1e-14 другого знака, и
+нисходящий треугольник превращается в восходящий.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from core.chart_patterns_detector import ChartPatternDetector, _suffix_linreg
+
+
+def flat_bottom_candles(bottom: float, n: int = 260, period: int = 20):
+    """Свечи с ровной поддержкой на уровне bottom и снижающимся сопротивлением"""
+    candles = []
+    for i in range(n):
+        phase = i % period
+        top = round(bottom * 1.06 - bottom * 0.003 * (i // period), 2)
+        frac = abs(phase - period / 2) / (period / 2)
+        mid = bottom + (top - bottom) * (1 - frac)
+        high = top if phase == period // 2 else round(mid + 0.05, 2)
+        low = bottom if phase == 0 else round(mid - 0.05, 2)
+        price = round(mid, 2)
+        candles.append({
+            'time': 1700000000 + i * 14400,
+            'open': price,
+            'high': max(high, price),
+            'low': min(low, price),
+            'close': price,
+            'volume': 1.0
+        })
+    return candles
+
+
+def test_suffix_fits_match_linear_regression_on_flat_lines():
+    """Регрессии по суффиксам совпадают с linear_regression на горизонтальных линиях"""
+    detector = ChartPatternDetector()
+    rng = random.Random(20)
+    for _ in range(500):
+        k = rng.randint(0, 12)
+        x = sorted(rng.sample(range(300), k))
+        level = round(rng.uniform(0.1, 50000), rng.choice([0, 1, 2, 4]))
+        y = [level] * k
+        fits = _suffix_linreg(x, y, k)
+        assert len(fits) == k + 1
+        for n in range(2, k + 1):
+            points = [{'index': i, 'price': p} for i, p in zip(x[-n:], y[-n:])]
+            assert fits[n] == detector.linear_regression(points), (x, level, n)
+
+
+def test_flat_support_triangle_uses_reference_slope():
+    """Наклон поддержки треугольника - тот же, что у linear_regression по его точкам"""
+    detector = ChartPatternDetector()
+    for bottom in (17696.03, 40160.94, 35783.81):
+        patterns = detector.detect_triangles(flat_bottom_candles(bottom), 'TEST/USDT', '4h')
+        assert patterns, bottom
+        pattern_data = patterns[0]['pattern_data']
+        support_slope, _ = detector.linear_regression(pattern_data['support_points'])
+        resistance_slope, _ = detector.linear_regression(pattern_data['resistance_points'])
+        assert pattern_data['support_slope'] == support_slope, bottom
+        assert pattern_data['resistance_slope'] == resistance_slope, bottom
+
+
+if __name__ == '__main__':
+    test_suffix_fits_match_linear_regression_on_flat_lines()
+    test_flat_support_triangle_uses_reference_slope()
+    print("✅ Линии тренда треугольников совпадают с linear_regression")
@@ -0,0 +1,32 @@
+"""
+Проверка кодирования строк для COPY ... CSV в core.database.bulk_copy
+
+NULL - только незаключенный в кавычки маркер COPY_NULL: None, пустая строка
+и строка '\\N' должны кодироваться по-разному.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from core.database import COPY_NULL, _copy_row, _copy_value
+
+
+def test_null_empty_and_marker_string_are_distinct():
+    """None - голый маркер NULL, строки (включая '' и '\\N') - в кавычках"""
+    assert _copy_value(None) == COPY_NULL == '\\N'
+    assert _copy_value('') == '""'
+    assert _copy_value('\\N') == '"\\N"'
+
+
+def test_row_encoding():
+    """Кавычки внутри строк удваиваются, dict - JSON, bool - t/f, числа без кавычек"""
+    row = _copy_row([None, '', '\\N', 'a"b', {'x': 1}, True, 1.5, 3])
+    assert row == '\\N,"","\\N","a""b","{""x"": 1}",t,1.5,3\n'
+
+
+if __name__ == '__main__':
+    test_null_empty_and_marker_string_are_distinct()
+    test_row_encoding()
+    print("✅ Кодирование COPY CSV корректно")